@@ -0,0 +1,83 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+
+Compare the compiled single-pass ExtractionPlan against the per-field findall extraction.
+
+    PYTHONPATH=src python benchmarks/bench_plan.py [-n repeat] [files ...]
+'''
+
+from argparse import ArgumentParser
+import pathlib
+import time
+import xml.etree.ElementTree as ET
+
+from irs990v2.mapping import Mapping
+from irs990v2.plan import ExtractionPlan
+
+NAMESPACE = {'':'http://www.irs.gov/efile'}
+FORMS = ['990', 'BondIssue']
+TEST_DIR = pathlib.Path(__file__).parent.parent.joinpath('test')
+
+def per_field(root: ET.Element, forms: list[str]):
+    """Extraction as done before the plan: one findall per field, keeping element [0]."""
+    def find(tree, field):
+        if field != '':
+            elem = tree.findall(field, NAMESPACE)
+            if len(elem) > 0:
+                return elem[0].text
+        return None
+
+    mapping = Mapping(root.get('returnVersion'))
+    base_row = {'ein': find(root, mapping.ein),
+                'name': find(root, mapping.name),
+                'returntype': find(root, mapping.return_type),
+                'taxyear': find(root, mapping.tax_year),
+                'taxperiodstart': find(root, mapping.tax_period_start_date),
+                'taxperiodend': find(root, mapping.tax_period_end_date)}
+    rows = dict()
+    for form in forms:
+        fields = mapping.fields(form)
+        rows[form] = [base_row | {name: find(f, field) for name, field in fields}
+                      for f in root.iterfind(mapping.base_path(form), NAMESPACE)]
+    return rows
+
+def compiled(root: ET.Element, forms: list[str]):
+    """Extraction with the compiled single-pass plan."""
+    base_row, details = ExtractionPlan.for_schema(root.get('returnVersion')).extract(root, forms)
+    return {form: [base_row | fields for fields in details[form]] for form in forms}
+
+def bench(name: str, extract, roots: list[ET.Element], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for root in roots:
+            extract(root, FORMS)
+    elapsed = time.perf_counter() - start
+    rate = len(roots) * repeat / elapsed
+    print(f'{name:12} {rate:10.1f} filings/sec')
+    return rate
+
+def main(args: list[str] = None):
+    argparser = ArgumentParser(description='Benchmark compiled extraction plan against per-field findall')
+    argparser.add_argument('-n', '--repeat', dest='repeat', type=int, default=200, help='passes over the filings')
+    argparser.add_argument('files', nargs='*', help='990 xml filings (default = test filings)')
+
+    args = argparser.parse_args(args=args)
+
+    files = args.files or sorted(TEST_DIR.glob('042103545*.txt'))
+    roots = list()
+    for file in files:
+        with open(file, 'r', encoding='utf-8-sig', newline='') as f:
+            roots.append(ET.parse(f).getroot())
+
+    for root in roots:
+        if per_field(root, FORMS) != compiled(root, FORMS):
+            raise RuntimeError(f'extraction mismatch for {root.get("returnVersion")}')
+
+    baseline = bench('per-field', per_field, roots, args.repeat)
+    plan = bench('compiled', compiled, roots, args.repeat)
+    print(f'speedup      {plan / baseline:10.2f}x')
+
+if __name__ == "__main__":
+    main()
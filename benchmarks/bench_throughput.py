@@ -0,0 +1,205 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+
+Measure the throughput of each stage on a synthetic corpus, writing the results as JSON so runs can be
+compared over time.
+
+    PYTHONPATH=src python benchmarks/bench_throughput.py [-c corpus] [-n filings] [-o results.json] [targets ...]
+
+Each target runs in its own process, so the peak RSS reported is that of the target alone.  The corpus
+is generated with benchmarks/corpus.py when the corpus directory does not have one yet.
+'''
+
+from argparse import ArgumentParser, SUPPRESS
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src')
+FORMS = ['990', 'BondIssue']
+
+def parser(corpus: str, options: dict) -> int:
+    """Parser.parse over every filing of the corpus"""
+    from irs990v2.parse import Parser
+
+    p = Parser(options['streaming'])
+    filings = 0
+    for dirpath, _, files in os.walk(os.path.join(corpus, 'xml')):
+        for name in files:
+            with open(os.path.join(dirpath, name), 'r', newline='', encoding='utf-8-sig') as f:
+                filings += _consume(p.parse(f, FORMS))
+    return filings
+
+def process(corpus: str, options: dict) -> int:
+    """Index.process over the year/subdir filings directory"""
+    from irs990v2.index import Index
+
+    with open(os.path.join(corpus, 'index.csv'), 'r', newline='') as index:
+        return sum(_consume(filing) for filing in Index.process(index, os.path.join(corpus, 'xml'), FORMS,
+                                                                  options['streaming'], options['cache_dir']))
+
+def processZip(corpus: str, options: dict) -> int:
+    """Index.processZip over the zip archives"""
+    from irs990v2.index import Index
+
+    with open(os.path.join(corpus, 'index.csv'), 'r', newline='') as index:
+        return sum(_consume(filing) for filing in Index.processZip(index, os.path.join(corpus, 'zip'), None, FORMS,
+                                                                     options['streaming'], options['cache_dir']))
+
+def parse990(corpus: str, options: dict) -> int:
+    """The parse990 command line"""
+    import parse990
+
+    args = ['-d', os.path.join(corpus, 'xml'), '-i', os.path.join(corpus, 'index.csv'), '-o', options['out'],
+            '-c', options['cache_dir'], '-f'] + FORMS
+    parse990.main(args + (['-s'] if options['streaming'] else []))
+    return options['filings']
+
+def parse990AllZip(corpus: str, options: dict) -> int:
+    """The parse990AllZip command line"""
+    import parse990AllZip
+
+    # The command line writes next to the zips, so run it on links to them in the output directory
+    for name in os.listdir(os.path.join(corpus, 'zip')):
+        os.symlink(os.path.join(corpus, 'zip', name), os.path.join(options['out'], name))
+    args = ['-d', options['out'], '-p', 'bench', '-c', options['cache_dir'], '-w', str(options['workers']), '-f'] + FORMS
+    parse990AllZip.main(args + (['-s'] if options['streaming'] else []))
+    return options['filings']
+
+TARGETS = {f.__name__: f for f in (parser, process, processZip, parse990, parse990AllZip)}
+
+def run(target: str, corpus: str, options: dict) -> dict:
+    """Run one target in this process and return its measurements"""
+    with open(os.path.join(corpus, 'corpus.json'), 'r') as f:
+        manifest = json.load(f)
+    options = options | {'filings': manifest['filings']}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        options['out'] = os.path.join(tmp, 'out')
+        options['cache_dir'] = os.path.join(tmp, 'cache')
+        os.makedirs(options['out'])
+        os.makedirs(options['cache_dir'])
+        if options['warm']:
+            # Build the catalogs first, so only the steady state is measured
+            _warm(corpus, options['cache_dir'])
+
+        start = time.perf_counter()
+        filings = TARGETS[target](corpus, options)
+        seconds = time.perf_counter() - start
+
+    megabytes = manifest['bytes'] / 1e6 * filings / manifest['filings']
+    return {'target': target,
+            'filings': filings,
+            'megabytes': round(megabytes, 3),
+            'seconds': round(seconds, 3),
+            'filings_per_sec': round(filings / seconds, 1),
+            'mb_per_sec': round(megabytes / seconds, 2),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'peak_worker_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)}
+
+def _warm(corpus: str, cache_dir: str):
+    from irs990v2.catalog import DirectoryCatalog, ZipCatalog
+    from irs990v2.index import Index
+
+    ZipCatalog.from_dirs([os.path.join(corpus, 'zip')], cache_dir)
+    filings_dir = os.path.join(corpus, 'xml')
+    DirectoryCatalog(filings_dir, Index._expandFilingsDir(filings_dir), cache_dir)
+
+def _consume(filing: dict) -> int:
+    if filing is None:
+        return 0
+    for rows in filing.values():
+        for _ in rows:
+            pass
+    return 1
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(args: list[str] = None):
+    argparser = ArgumentParser(description='Benchmark parsing throughput on a synthetic corpus')
+    argparser.add_argument('-c', '--corpus', dest='corpus', help='corpus directory (default = a temporary directory)')
+    argparser.add_argument('-n', '--filings', dest='filings', type=int, default=1000,
+                           help='filings to generate when there is no corpus yet (default = 1000)')
+    argparser.add_argument('--deflate64', dest='deflate64', action='store_true',
+                           help='generate every other zip with deflate64 (needs 7z)')
+    argparser.add_argument('-s', '--streaming', dest='streaming', action='store_true', help='use the streaming parser')
+    argparser.add_argument('-w', '--workers', dest='workers', type=int, default=1,
+                           help='worker processes for parse990AllZip (default = 1)')
+    argparser.add_argument('-r', '--repeat', dest='repeat', type=int, default=1,
+                           help='runs of each target, keeping the fastest (default = 1)')
+    argparser.add_argument('--cold', dest='warm', action='store_false', help='include building the catalogs')
+    argparser.add_argument('-o', '--output', dest='output', help='file to write the JSON results to (default = stdout)')
+    argparser.add_argument('--run', dest='run', help=SUPPRESS)
+    argparser.add_argument('targets', nargs='*', help=f'targets to run: {" ".join(TARGETS)} (default = all)')
+
+    args = argparser.parse_args(args=args)
+    for target in args.targets:
+        if target not in TARGETS:
+            argparser.error(f'unknown target {target}')
+    options = {'streaming': args.streaming, 'workers': args.workers, 'warm': args.warm}
+
+    if args.run is not None:
+        print(json.dumps(run(args.run, args.corpus, options)))
+        return
+
+    tmp = None
+    corpus = args.corpus
+    if corpus is None:
+        tmp = tempfile.mkdtemp()
+        corpus = tmp
+    try:
+        if not os.path.exists(os.path.join(corpus, 'corpus.json')):
+            sys.path.insert(0, BENCH_DIR)
+            import corpus as generator
+            generator.main(['-n', str(args.filings), corpus] + (['--deflate64'] if args.deflate64 else []))
+        with open(os.path.join(corpus, 'corpus.json'), 'r') as f:
+            manifest = json.load(f)
+
+        env = os.environ | {'PYTHONPATH': os.pathsep.join(filter(None, [SRC_DIR, os.environ.get('PYTHONPATH')]))}
+        results = list()
+        for target in args.targets or TARGETS:
+            runs = list()
+            for _ in range(args.repeat):
+                child = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', target, '-c', corpus,
+                                        '-w', str(args.workers)] + (['-s'] if args.streaming else [])
+                                       + ([] if args.warm else ['--cold']),
+                                       env=env, capture_output=True, text=True, check=True)
+                runs.append(json.loads(child.stdout.splitlines()[-1]))
+            best = max(runs, key=lambda r: r['filings_per_sec'])
+            print(f'{target:16} {best["filings_per_sec"]:10.1f} filings/sec {best["mb_per_sec"]:8.2f} MB/sec '
+                  f'{best["peak_rss_mb"]:8.1f} MB peak', file=sys.stderr)
+            results.append(best)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+
+    report = {'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+              'commit': _git_commit(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'options': options,
+              'corpus': {k: manifest[k] for k in ('seed', 'filings', 'bytes', 'bond_issues', 'zips')},
+              'results': results}
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
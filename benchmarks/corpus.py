@@ -0,0 +1,190 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+
+Generate a synthetic corpus of 990 filings from the mapping ini files, laid out as the IRS publishes it:
+an index file, the filings in year/subdir directories and the same filings in zip archives.
+
+    PYTHONPATH=src python benchmarks/corpus.py [-n filings] [--seed seed] [--deflate64] directory
+
+Every mapped field of a filing's schema year is filled in with a plausible value for its column type,
+a share of the filings carry several Schedule K bond issues, and filing sizes follow a log-normal
+distribution padded out with Schedule O text, as the real filings do.  Python can only write deflate
+zips, so deflate64 archives are made with 7z when it is installed.
+'''
+
+from argparse import ArgumentParser
+import csv
+import importlib.resources
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+import zipfile
+
+from irs990v2.mapping import Mapping
+
+NAMESPACE = 'http://www.irs.gov/efile'
+YEARS = sorted(int(f.name[:4]) for f in importlib.resources.files('irs990v2').iterdir()
+               if f.name.endswith('.ini') and f.name[:4].isdigit())
+INDEX_FIELDS = ['RETURN_ID', 'FILING_TYPE', 'EIN', 'TAX_PERIOD', 'SUB_DATE', 'TAXPAYER_NAME', 'RETURN_TYPE', 'DLN', 'OBJECT_ID']
+
+# Filing sizes: median 40 KB with a long tail of multi-MB filings
+MEDIAN_SIZE = 40000
+SIZE_SIGMA = 1.0
+MIN_SIZE = 8000
+MAX_SIZE = 8000000
+# Share of filings with a Schedule K, and the mean number of bond issues on one
+BOND_SHARE = 0.15
+MEAN_BONDS = 4
+# Share of the mapped fields present in a filing
+FIELD_SHARE = 0.7
+
+WORDS = ('organization program services community support education grants members public charitable '
+         'activities funds operations schedule described purpose revenue expenses board policy').split()
+
+def filing(year: int, rng: random.Random) -> bytes:
+    """Generate one filing of a schema year"""
+    mappings = Mapping.load_mappings(str(year))
+    types = {f: Mapping.column_types(f) for f in ('990', 'BondIssue')}
+    tag = lambda name: f'{{{NAMESPACE}}}{name}'
+
+    root = ET.Element(tag('Return'), returnVersion=f'{year}v{rng.randint(1, 4)}.0')
+    start = rng.choice([1, 1, 1, 7, 10])
+    header = {'EIN': f'{rng.randint(10000000, 999999999):09d}',
+              'Name': _text(rng, 3).upper(),
+              'ReturnType': '990',
+              'TaxYear': str(year),
+              'TaxPeriodStartDate': f'{year}-{start:02d}-01',
+              'TaxPeriodEndDate': f'{year + (start > 1)}-{(start + 10) % 12 + 1:02d}-28'}
+    for name, value in header.items():
+        _element(root, mappings.get('Common', name), tag).text = value
+
+    form = _element(root, mappings.get('Common', '990'), tag)
+    for name, path in mappings.items('990'):
+        if path and rng.random() < FIELD_SHARE:
+            _element(form, path, tag).text = _value(types['990'].get(name, 'string'), year, rng)
+
+    if rng.random() < BOND_SHARE:
+        parent, _, group = mappings.get('Common', 'BondIssue').rpartition('/')
+        parent = _element(root, parent, tag)
+        for _ in range(1 + min(int(rng.expovariate(1 / MEAN_BONDS)), 40)):
+            issue = ET.SubElement(parent, tag(group))
+            for name, path in mappings.items('BondIssue'):
+                if path:
+                    _element(issue, path, tag).text = _value(types['BondIssue'].get(name, 'string'), year, rng)
+
+    # Pad the filing out to its size with supplemental information
+    size = min(max(int(rng.lognormvariate(math.log(MEDIAN_SIZE), SIZE_SIGMA)), MIN_SIZE), MAX_SIZE)
+    data = _serialize(root)
+    if len(data) < size:
+        schedule = _element(root, 'ReturnData/IRS990ScheduleO', tag)
+        detail_size = 0
+        while len(data) + detail_size < size:
+            detail = ET.SubElement(schedule, tag('SupplementalInformationDetail'))
+            ET.SubElement(detail, tag('FormAndLineReferenceDesc')).text = f'Part {rng.randint(1, 12)}, Line {rng.randint(1, 30)}'
+            ET.SubElement(detail, tag('ExplanationTxt')).text = _text(rng, rng.randint(20, 400))
+            detail_size += len(detail[1].text) + 220
+        data = _serialize(root)
+    return data
+
+def generate(directory: str, count: int, seed: int = 0, per_zip: int = 1000, deflate64: bool = False) -> dict:
+    """Write a corpus of count filings spread over the schema years and return its manifest"""
+    rng = random.Random(seed)
+    xml_dir = os.path.join(directory, 'xml')
+    zip_dir = os.path.join(directory, 'zip')
+    os.makedirs(zip_dir, exist_ok=True)
+
+    sevenzip = shutil.which('7z') or shutil.which('7za')
+    if deflate64 and sevenzip is None:
+        print('7z is not installed, writing deflate zips only')
+
+    manifest = {'seed': seed, 'filings': count, 'bytes': 0, 'bond_issues': 0, 'years': dict(), 'zips': dict()}
+    members = list()
+    with open(os.path.join(directory, 'index.csv'), 'w', newline='') as f:
+        index = csv.writer(f)
+        index.writerow(INDEX_FIELDS)
+        for i in range(count):
+            year = YEARS[i % len(YEARS)]
+            objectid = f'{year + 1}{i:014d}'
+            data = filing(year, rng)
+            header = ET.fromstring(data)
+
+            path = os.path.join(xml_dir, str(year + 1), f'{i // per_zip:02d}', f'{objectid}_public.xml')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as xml:
+                xml.write(data)
+            members.append(path)
+
+            ein = header.find(f'.//{{{NAMESPACE}}}EIN').text
+            index.writerow([str(10000000 + i), 'EFILE', ein, f'{year}12', f'1/3/{year + 1} 8:55:06 AM',
+                            f'ORGANIZATION {i}', '990', f'9349{i:010d}', objectid])
+            manifest['bytes'] += len(data)
+            manifest['bond_issues'] += len(header.findall(f'.//{{{NAMESPACE}}}IRS990ScheduleK/*'))
+            manifest['years'][year] = manifest['years'].get(year, 0) + 1
+
+            if len(members) == per_zip or i == count - 1:
+                archive = os.path.join(zip_dir, f'SYNTHETIC_TEOS_XML_{i // per_zip:02d}A.zip')
+                use64 = deflate64 and sevenzip is not None and (i // per_zip) % 2 == 1
+                _zip(archive, members, sevenzip if use64 else None)
+                manifest['zips'][os.path.basename(archive)] = 'deflate64' if use64 else 'deflate'
+                members = list()
+
+    with open(os.path.join(directory, 'corpus.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def _zip(archive: str, members: list[str], sevenzip: str = None):
+    if os.path.exists(archive):
+        os.remove(archive)
+    if sevenzip is None:
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            for member in members:
+                z.write(member, os.path.basename(member))
+    else:
+        # 7z stores files given by absolute path under their base name
+        subprocess.run([sevenzip, 'a', '-tzip', '-mm=Deflate64', '-bd', '-bso0', os.path.abspath(archive)]
+                       + [os.path.abspath(member) for member in members], check=True)
+
+def _element(parent: ET.Element, path: str, tag) -> ET.Element:
+    """Find or create the element at a simple path below parent"""
+    for name in path.split('/'):
+        child = parent.find(tag(name))
+        parent = child if child is not None else ET.SubElement(parent, tag(name))
+    return parent
+
+def _value(column_type: str, year: int, rng: random.Random) -> str:
+    if column_type == 'int':
+        return str(int(rng.lognormvariate(12, 2.5)) * rng.choice([1, 1, 1, 1, -1]))
+    if column_type == 'date':
+        return f'{year - rng.randint(0, 30)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}'
+    if column_type == 'bool':
+        return rng.choice(['X', 'true', '1', 'false', '0'] if year >= 2013 else ['X'])
+    return _text(rng, rng.randint(1, 4)).upper()
+
+def _text(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def _serialize(root: ET.Element) -> bytes:
+    return ET.tostring(root, encoding='utf-8', xml_declaration=True)
+
+def main(args: list[str] = None):
+    argparser = ArgumentParser(description='Generate a synthetic 990 corpus')
+    argparser.add_argument('-n', '--filings', dest='filings', type=int, default=1000, help='number of filings (default = 1000)')
+    argparser.add_argument('--seed', dest='seed', type=int, default=0, help='random seed (default = 0)')
+    argparser.add_argument('--per-zip', dest='per_zip', type=int, default=1000, help='filings per zip file (default = 1000)')
+    argparser.add_argument('--deflate64', dest='deflate64', action='store_true',
+                           help='write every other zip with deflate64 (needs 7z)')
+    argparser.add_argument('directory', help='directory to write the corpus to')
+
+    args = argparser.parse_args(args=args)
+    ET.register_namespace('', NAMESPACE)
+    manifest = generate(args.directory, args.filings, args.seed, args.per_zip, args.deflate64)
+    print(f'{manifest["filings"]} filings, {manifest["bytes"] / 1e6:.1f} MB, {manifest["bond_issues"]} bond issues')
+
+if __name__ == "__main__":
+    main()
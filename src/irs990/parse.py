@@ -19,14 +19,20 @@ It defines classes_and_methods
 
 import sys
 import os
+import re
+import multiprocessing
 import xml.etree.ElementTree as ET
 
+from functools import cache
+
 from os.path import join
 
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
 import csv
 
+from irs990v2.errors import ErrorSink, Failure
+
 __all__ = []
 __version__ = 0.1
 __date__ = '2023-12-19'
@@ -188,66 +194,145 @@ class Irs990Parser():
     
     
     
-    def __init__(self):
-        pass
+    def __init__(self, errors=None):
+        self.errors = errors
     
-    def walk(self, path, writer, cusipwriter):
-        for dirpath, _, filenames in os.walk(path):
-            print(dirpath)
-            for filename in filenames:
-                self.parse(join(dirpath, filename), writer, cusipwriter)
+    def walk(self, path, writer, cusipwriter, workers=1):
+        if workers <= 1:
+            for dirpath, _, filenames in os.walk(path):
+                print(dirpath)
+                for filename in filenames:
+                    self.parse(join(dirpath, filename), writer, cusipwriter)
+            return
+        
+        # Filings are parsed on a pool of processes and written here in walk order, so the output is unchanged
+        with multiprocessing.Pool(workers, _init_worker, (type(self),)) as pool:
+            for row, cusip_rows, failure in pool.imap(_extract, self._files(path), chunksize=16):
+                self._write(row, cusip_rows, failure, writer, cusipwriter)
     
     def parse(self, path, writer, cusipwriter):
+        self._write(*self.extract(path), writer, cusipwriter)
+    
+    def extract(self, path):
+        """Extract the row and bond rows of a filing, and the failure if it could not be parsed.
+        
+        The children of each element on the way to a field are indexed by tag the first time they are
+        needed, so every path, and every Schedule K group, is resolved by walking the filing once
+        instead of searching it from the root for every field of every bond.
+        """
         row = dict()
         cusip_rows = list()
-
+        common, fields, schedulek, bond_issue, cusip = self._paths()
+        
         try:
-            root = ET.parse(path)
+            root = ET.parse(path).getroot()
+            children = _Children()
             
-            for field in self.common_fields:
+            for field, alternatives in common:
                 row[field] = ''
-                for val in self._findall(root, self.common_fields[field], {'':'http://www.irs.gov/efile'}):
+                for val in self._select(children, root, alternatives):
                     row[field] = val.text
-    
-            for field in self.fields:
+            
+            for field, alternatives in fields:
                 row[field] = 0
-                for val in self._findall(root, self.fields[field], {'':'http://www.irs.gov/efile'}):
+                for val in self._select(children, root, alternatives):
                     row[field] = val.text
             
-            schedks = self._findall(root, [self.schedulek], {'b':'http://www.irs.gov/efile'})
-            
-            kk = 0
-            for _ in schedks:
-                kk += 1
-                bonds = self._findall(root, [self.schedulek + f'[{str(kk)}]/' + b for b in self.bond_issue], {'b':'http://www.irs.gov/efile'})
+            for schedk in self._select(children, root, [schedulek]):
+                groups = {tag: children[schedk].get(tag, []) for tag in bond_issue}
+                bonds = next((groups[tag] for tag in bond_issue if groups[tag]), [])
                 
-                ii = 0
-                for _ in bonds:
+                for ii in range(len(bonds)):
                     cusip_row = dict()
                     
-                    ii+=1
                     for field in self.common_fields:
                         cusip_row[field] = row[field]
-                    for field in self.cusip_fields:
+                    for field, alternatives in cusip:
                         cusip_row[field] = ''
-                        for val in self._findall(root, self.cusip_fields[field], {'b':'http://www.irs.gov/efile'}, kk, ii):
-                            cusip_row[field] = val.text
+                        for tag, steps in alternatives:
+                            if ii < len(groups[tag]):
+                                values = self._select(children, groups[tag][ii], [steps])
+                                if len(values) > 0:
+                                    cusip_row[field] = values[-1].text
+                                    break
                     
                     cusip_rows.append(cusip_row)
         except Exception as e:
-            print(f"Error processing {path}:")
-            print(repr(e))
+            stage = 'parse' if isinstance(e, ET.ParseError) else 'read' if isinstance(e, OSError) else 'extract'
+            return row, cusip_rows, (Failure(path, stage, type(e).__name__, str(e)), repr(e))
+        
+        return row, cusip_rows, None
+    
+    def _write(self, row, cusip_rows, failure, writer, cusipwriter):
+        if failure is not None:
+            failure, text = failure
+            if self.errors is None:
+                print(f"Error processing {failure.member}:")
+                print(text)
+            else:
+                self.errors.record(failure, failure.member)
         
         writer.writerow(row)
         cusipwriter.writerows(cusip_rows)
-
-    def _findall(self, tree, fields, namespaces, *args):
-        for field in fields:
-            result = tree.findall(field.format(*args), namespaces)
+    
+    def _files(self, path):
+        for dirpath, _, filenames in os.walk(path):
+            print(dirpath)
+            for filename in filenames:
+                yield join(dirpath, filename)
+    
+    @classmethod
+    @cache
+    def _paths(cls):
+        """Compile the field paths to tuples of namespaced tags, once per class"""
+        common = [(field, [cls._steps(path) for path in paths]) for field, paths in cls.common_fields.items()]
+        fields = [(field, [cls._steps(path) for path in paths]) for field, paths in cls.fields.items()]
+        bond_issue = [cls._steps(path)[0] for path in cls.bond_issue]
+        
+        # Bond fields are paths below the {1}th bond issue group of the {0}th Schedule K
+        cusip = list()
+        for field, paths in cls.cusip_fields.items():
+            alternatives = list()
+            for path in paths:
+                _, group, rest = re.fullmatch(r'(.*)\[\{0\}\]/(.*)\[\{1\}\]/(.*)', path).groups()
+                alternatives.append((cls._steps(group)[0], cls._steps(rest)))
+            cusip.append((field, alternatives))
+        
+        return common, fields, cls._steps(cls.schedulek), bond_issue, cusip
+    
+    @staticmethod
+    def _steps(path):
+        return tuple('{http://www.irs.gov/efile}' + step.rpartition(':')[2] for step in path.split('/'))
+    
+    @staticmethod
+    def _select(children, elem, alternatives):
+        """Return the elements at the first of the alternative paths below elem that has any, as findall would"""
+        for steps in alternatives:
+            result = [elem]
+            for tag in steps:
+                result = [child for e in result for child in children[e].get(tag, ())]
             if len(result) > 0:
                 return result
         return list()
-          
+
+
+class _Children(dict):
+    '''Children of each element of a filing by tag, indexed when first needed'''
+    def __missing__(self, elem):
+        index = self[elem] = dict()
+        for child in elem:
+            index.setdefault(child.tag, []).append(child)
+        return index
+
+
+_worker_parser = None
+
+def _init_worker(parser_class):
+    global _worker_parser
+    _worker_parser = parser_class()
+
+def _extract(path):
+    return _worker_parser.extract(path)
 
 
 def main(argv=None): # IGNORE:C0111
@@ -285,6 +370,9 @@ USAGE
         parser.add_argument('-c', '--cusip-output', dest='cusip_output', help="CUSIP output file", metavar='cusip out')
         parser.add_argument('-d', '--dir', dest="paths", action='extend', default=[], help="paths to folder(s) with source file(s) [default: %(default)s]", metavar="path", nargs='+')
         parser.add_argument('-f', '--file', dest="files", action='extend', default=[], help="paths to source file", metavar="file", nargs="+")
+        parser.add_argument('-w', '--workers', dest='workers', type=int, default=1, help="worker processes for the directories [default: %(default)s]", metavar='n')
+        parser.add_argument('-e', '--errors', dest='errors', help="file to write a JSON line per failed filing to", metavar='file')
+        parser.add_argument('-q', '--quarantine', dest='quarantine', help="directory to copy failed filings to", metavar='dir')
 
         # Process arguments
         args = parser.parse_args()
@@ -294,7 +382,8 @@ USAGE
         output = args.output or 'output.csv'
         cusip_output = args.cusip_output or 'output-cusip.csv'
 
-        parser = Irs990Parser()
+        errors = ErrorSink(args.errors or 'output-errors.jsonl', args.quarantine) if args.errors or args.quarantine else None
+        parser = Irs990Parser(errors)
         
         with open(output, 'w', newline='') as csvfile, open(cusip_output, 'w', newline='') as cusipcsvfile:
             fieldnames = list(parser.common_fields.keys())
@@ -312,12 +401,14 @@ USAGE
             for inpath in paths:
                 ### do something with inpath ###
                 #print(f"parser.walk('{inpath}')")
-                parser.walk(inpath, writer, cusipwriter)
+                parser.walk(inpath, writer, cusipwriter, args.workers)
             
             for infile in files:
                 #print(f"parser.parse('{infile}')")
                 parser.parse(infile, writer, cusipwriter)
         
+        if errors is not None:
+            errors.close()
         return 0
     except KeyboardInterrupt:
         ### handle keyboard interrupt ###
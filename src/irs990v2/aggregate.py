@@ -0,0 +1,329 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import math
+import typing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class QuantileSketch():
+    '''
+    Mergeable sketch of the distribution of a column, answering quantiles to within a relative accuracy.
+
+    Values are counted in logarithmic buckets, bucket i holding the magnitudes between gamma ** (i - 1)
+    and gamma ** i, with negative values and zeros counted apart, so any quantile is estimated to within
+    the accuracy of its true value whatever the range of the amounts.  The buckets of two sketches of the
+    same accuracy simply add up, so sketches built by separate runs merge into exactly the sketch of
+    all their values, in any order.
+    '''
+    ACCURACY = 0.01
+
+    accuracy: float
+    count: int
+    zeros: int
+    positive: dict[int, int]
+    negative: dict[int, int]
+
+    def __init__(self, accuracy: float = ACCURACY):
+        '''
+        Constructor
+        '''
+        if not 0 < accuracy < 1:
+            raise ValueError(f'Invalid sketch accuracy {accuracy}, expected a fraction between 0 and 1')
+        self.accuracy = accuracy
+        self.count = 0
+        self.zeros = 0
+        self.positive = dict()
+        self.negative = dict()
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self._gamma)
+
+    def add(self, values):
+        """Count an array of values"""
+        values = numpy.asarray(values, dtype=numpy.float64)
+        signs = numpy.sign(values).astype(numpy.int64)
+        indexes = self.indexes(values)
+        order = numpy.lexsort((indexes, signs))
+        for sign, i, n in zip(*_runs(signs[order], indexes[order])):
+            self.add_bucket(sign, i, n)
+
+    def indexes(self, values):
+        """Return the bucket of the magnitude of each value of an array, 0 for zeros"""
+        magnitudes = numpy.abs(numpy.asarray(values, dtype=numpy.float64))
+        nonzero = magnitudes > 0
+        return numpy.where(nonzero, numpy.ceil(numpy.log(numpy.where(nonzero, magnitudes, 1)) / self._log_gamma),
+                           0).astype(numpy.int64)
+
+    def add_bucket(self, sign: int, i: int, n: int):
+        """Count n values of the sign whose magnitudes are in bucket i"""
+        self.count += n
+        if sign > 0:
+            self.positive[i] = self.positive.get(i, 0) + n
+        elif sign < 0:
+            self.negative[i] = self.negative.get(i, 0) + n
+        else:
+            self.zeros += n
+
+    def merge(self, other: 'QuantileSketch'):
+        """Add in the values counted by another sketch of the same accuracy"""
+        if other.accuracy != self.accuracy:
+            raise ValueError(f'Cannot merge a sketch of accuracy {other.accuracy} into one of accuracy {self.accuracy}')
+        self.count += other.count
+        self.zeros += other.zeros
+        for buckets, others in ((self.positive, other.positive), (self.negative, other.negative)):
+            for i, n in others.items():
+                buckets[i] = buckets.get(i, 0) + n
+
+    def quantile(self, q: float) -> typing.Optional[float]:
+        """Return an estimate of the q quantile, or None when nothing was counted"""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: typing.Sequence[float]) -> list[typing.Optional[float]]:
+        """Return an estimate of each quantile, walking the buckets once from the lowest value
+
+        The quantile q is the value of nearest rank, the ceil(q * count)-th lowest, so the upper quantiles of
+        a small group are not pulled down to a lower value.
+        """
+        if self.count == 0:
+            return [None for _ in qs]
+        buckets = ([(-self._value(i), n) for i, n in sorted(self.negative.items(), reverse=True)]
+                   + ([(0.0, self.zeros)] if self.zeros else [])
+                   + [(self._value(i), n) for i, n in sorted(self.positive.items())])
+        # Rounded first, so a rank such as 0.07 * 100 that comes out a hair over a whole number is not raised by one
+        ranks = sorted((max(math.ceil(round(q * self.count, 9)) - 1, 0), j) for j, q in enumerate(qs))
+        results = [None for _ in qs]
+        seen = 0
+        buckets = iter(buckets)
+        value, n = next(buckets)
+        for rank, j in ranks:
+            while seen + n <= rank:
+                seen += n
+                value, n = next(buckets)
+            results[j] = value
+        return results
+
+    def to_dict(self) -> dict:
+        return {'accuracy': self.accuracy, 'count': self.count, 'zeros': self.zeros,
+                'positive': sorted(self.positive.items()), 'negative': sorted(self.negative.items())}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'QuantileSketch':
+        sketch = cls(data['accuracy'])
+        sketch.count = data['count']
+        sketch.zeros = data['zeros']
+        sketch.positive = {i: n for i, n in data['positive']}
+        sketch.negative = {i: n for i, n in data['negative']}
+        return sketch
+
+    def _value(self, i: int) -> float:
+        # The middle of the bucket in relative terms, within the accuracy of every value in it
+        return 2 * self._gamma ** i / (self._gamma + 1)
+
+
+class ColumnSummary():
+    '''
+    Running count, sum, minimum, maximum and quantile sketch of the values of one column in one group
+    '''
+    __slots__ = ('count', 'sum', 'min', 'max', 'sketch')
+
+    count: int
+    sum: int
+    min: typing.Optional[int]
+    max: typing.Optional[int]
+    sketch: QuantileSketch
+
+    def __init__(self, accuracy: float = QuantileSketch.ACCURACY):
+        '''
+        Constructor
+        '''
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch(accuracy)
+
+    def add(self, count: int, total: int, low: int, high: int):
+        """Count values whose sum, minimum and maximum are already known, their buckets being added to the sketch apart"""
+        self.count += count
+        self.sum += total
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def merge(self, other: 'ColumnSummary'):
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def quantiles(self, qs: typing.Sequence[float]) -> list[typing.Optional[int]]:
+        """Return the estimated quantiles, kept within the minimum and maximum and rounded like the values"""
+        return [None if value is None else round(min(max(value, self.min), self.max))
+                for value in self.sketch.quantiles(qs)]
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+                'sketch': self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ColumnSummary':
+        summary = cls.__new__(cls)
+        summary.count = data['count']
+        summary.sum = data['sum']
+        summary.min = data['min']
+        summary.max = data['max']
+        summary.sketch = QuantileSketch.from_dict(data['sketch'])
+        return summary
+
+
+class Aggregate():
+    '''
+    Summary of the amount columns of one form's rows, by group, such as tax year and return type.
+
+    Rows are added a column batch at a time: the group of each row and the per-group sums, minimums and
+    maximums of each column are computed with NumPy over the whole batch, and only the summaries are
+    kept, so the row-level data is never held beyond a batch.  Aggregates of the same columns and groups
+    merge exactly, so the aggregates of shards run apart add up to the aggregate of the whole run.
+    '''
+    GROUP_BY = ('taxyear', 'returntype')
+    QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+    form: str
+    group_by: tuple[str, ...]
+    columns: tuple[str, ...]
+    quantiles: tuple[float, ...]
+    accuracy: float
+    groups: dict[tuple[str, ...], list]
+
+    def __init__(self, form: str, group_by: typing.Iterable[str], columns: typing.Iterable[str],
+                 quantiles: typing.Iterable[float] = QUANTILES, accuracy: float = QuantileSketch.ACCURACY):
+        '''
+        Constructor
+        '''
+        if numpy is None:
+            raise ImportError('numpy is required for aggregation')
+        self.form = form
+        self.group_by = tuple(group_by)
+        self.columns = tuple(columns)
+        self.quantiles = tuple(quantiles)
+        self.accuracy = accuracy
+        if not self.columns:
+            raise ValueError(f'No columns of {form} to aggregate')
+        for q in self.quantiles:
+            if not 0 <= q <= 1:
+                raise ValueError(f'Invalid quantile {q}, expected a fraction between 0 and 1')
+        # Each group's number of rows and the summary of each column
+        self.groups = dict()
+
+    def add(self, keys: list[typing.Sequence[str]], values: list):
+        """Add a batch of rows given by the text of each group column and the masked integer array of each column"""
+        if not len(values[0]):
+            return
+        groups, ids = self._group(keys, len(values[0]))
+        rows = numpy.bincount(ids, minlength=len(groups))
+        summaries = list()
+        for key, n in zip(groups, rows.tolist()):
+            if key not in self.groups:
+                self.groups[key] = [0, [ColumnSummary(self.accuracy) for _ in self.columns]]
+            self.groups[key][0] += n
+            summaries.append(self.groups[key][1])
+
+        for c, column in enumerate(values):
+            valid = ~numpy.ma.getmaskarray(column)
+            data = numpy.ma.getdata(column)[valid]
+            if not len(data):
+                continue
+            # Sorted by group, then by the bucket of each value, so both are counted a run at a time
+            group_ids = ids[valid]
+            signs = numpy.sign(data)
+            indexes = summaries[0][c].sketch.indexes(data)
+            order = numpy.lexsort((indexes, signs, group_ids))
+            group_ids, signs, indexes, data = group_ids[order], signs[order], indexes[order], data[order]
+
+            starts = numpy.flatnonzero(numpy.diff(group_ids, prepend=-1))
+            counts = numpy.diff(numpy.append(starts, len(data))).tolist()
+            totals = numpy.add.reduceat(data, starts).tolist()
+            lows = numpy.minimum.reduceat(data, starts).tolist()
+            highs = numpy.maximum.reduceat(data, starts).tolist()
+            for g, count, total, low, high in zip(group_ids[starts].tolist(), counts, totals, lows, highs):
+                summaries[g][c].add(count, total, low, high)
+            for g, sign, i, n in zip(*_runs(group_ids, signs, indexes)):
+                summaries[g][c].sketch.add_bucket(sign, i, n)
+
+    def merge(self, other: 'Aggregate'):
+        """Add in another aggregate of the same columns and groups"""
+        if (other.group_by, other.columns, other.accuracy) != (self.group_by, self.columns, self.accuracy):
+            raise ValueError(f'Cannot merge an aggregate of other columns or groups into the {self.form} aggregate')
+        for key, (n, summaries) in other.groups.items():
+            if key not in self.groups:
+                self.groups[key] = [0, [ColumnSummary(self.accuracy) for _ in self.columns]]
+            self.groups[key][0] += n
+            for summary, others in zip(self.groups[key][1], summaries):
+                summary.merge(others)
+
+    @property
+    def fieldnames(self) -> list[str]:
+        """Fields of the summary table: the group columns, the column summarized, then its statistics"""
+        return (list(self.group_by) + ['column', 'rows', 'count', 'sum', 'mean', 'min', 'max']
+                + [f'p{q * 100:g}' for q in self.quantiles])
+
+    def summary(self) -> list[tuple]:
+        """Return a row of the summary table per group and column, ordered by group"""
+        table = list()
+        for key in sorted(self.groups):
+            n, summaries = self.groups[key]
+            for column, summary in zip(self.columns, summaries):
+                mean = round(summary.sum / summary.count, 2) if summary.count else None
+                table.append(key + (column, n, summary.count, summary.sum if summary.count else None, mean,
+                                    summary.min, summary.max, *summary.quantiles(self.quantiles)))
+        return table
+
+    def to_dict(self) -> dict:
+        return {'form': self.form, 'group_by': self.group_by, 'columns': self.columns, 'quantiles': self.quantiles,
+                'accuracy': self.accuracy,
+                'groups': [{'key': key, 'rows': n, 'columns': [summary.to_dict() for summary in summaries]}
+                           for key, (n, summaries) in self.groups.items()]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Aggregate':
+        aggregate = cls(data['form'], data['group_by'], data['columns'], data['quantiles'], data['accuracy'])
+        for group in data['groups']:
+            aggregate.groups[tuple(group['key'])] = [group['rows'],
+                                                     [ColumnSummary.from_dict(summary) for summary in group['columns']]]
+        return aggregate
+
+    def _group(self, keys: list[typing.Sequence[str]], n: int) -> tuple[list[tuple[str, ...]], typing.Any]:
+        """Return the distinct groups of a batch and the group of each row, as an index into them"""
+        if not keys:
+            return [()], numpy.zeros(n, dtype=numpy.int64)
+        uniques = list()
+        codes = list()
+        for column in keys:
+            text = numpy.array(['' if value is None else value.strip() for value in column], dtype=str)
+            unique, code = numpy.unique(text, return_inverse=True)
+            uniques.append(unique.tolist())
+            codes.append(code.reshape(-1))
+        combined = numpy.ravel_multi_index(codes, [len(unique) for unique in uniques])
+        groups, ids = numpy.unique(combined, return_inverse=True)
+        indexes = numpy.unravel_index(groups, [len(unique) for unique in uniques])
+        return ([tuple(unique[i] for unique, i in zip(uniques, index)) for index in zip(*(i.tolist() for i in indexes))],
+                ids.reshape(-1))
+
+
+def _runs(*keys) -> tuple[list, ...]:
+    """Return the keys of each run of equal keys in sorted arrays, followed by the length of each run"""
+    n = len(keys[0])
+    if not n:
+        return tuple([] for _ in range(len(keys) + 1))
+    starts = numpy.ones(n, dtype=bool)
+    for key in keys:
+        starts[1:] |= key[1:] != key[:-1]
+    starts = numpy.flatnonzero(starts)
+    return tuple(key[starts].tolist() for key in keys) + (numpy.diff(numpy.append(starts, n)).tolist(),)
@@ -0,0 +1,109 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import typing
+from typing import Generator
+
+from .mapping import Mapping, MappingSnapshot
+from .plan import ExtractionPlan
+
+class RowSchema():
+    '''
+    Field order of the output rows of a form: the filing header, then the form's columns in template order.
+
+    One schema is shared by every batch of a form, so a row is a plain tuple of values in this order
+    rather than a dict carrying its own keys.  The columns a schema version maps are laid out in the same
+    order as the template, so a filing's rows are its header values followed by the extracted values;
+    a mapping ordered otherwise is rearranged through a layout computed once per schema version.
+    '''
+    _schemas: dict[tuple[str, str], 'RowSchema'] = dict()
+
+    form: str
+    fieldnames: tuple[str, ...]
+
+    def __init__(self, form: str, fieldnames: typing.Iterable[str]):
+        '''
+        Constructor
+        '''
+        self.form = form
+        self.fieldnames = tuple(fieldnames)
+        self._layouts = dict()
+
+    @classmethod
+    def for_form(cls, form: str) -> 'RowSchema':
+        """Return the schema of a form's output under the current mappings"""
+        key = (MappingSnapshot.current().digest, form)
+        if key not in cls._schemas:
+            cls._schemas[key] = cls(form, ExtractionPlan.HEADER + tuple(Mapping.all_mappings(form)))
+        return cls._schemas[key]
+
+    def __reduce__(self):
+        # Sent to and from worker processes by form, as the workers have the same mappings
+        return (RowSchema.for_form, (self.form,))
+
+    def rows(self, plan: ExtractionPlan, header: tuple, details: list[tuple]) -> list[tuple]:
+        """Return the rows of a filing from its header values and the values extracted for each row"""
+        layout = self._layout(plan)
+        if layout is None:
+            return [header + values for values in details]
+        return [header + tuple([None if i is None else values[i] for i in layout]) for values in details]
+
+    def _layout(self, plan: ExtractionPlan) -> tuple[int, ...]:
+        """Return where each column of the schema is in the plan's values, or None when they are in the same order"""
+        if plan.schema not in self._layouts:
+            columns = plan.columns.get(self.form, ())
+            fields = self.fieldnames[len(ExtractionPlan.HEADER):]
+            if tuple(columns) == fields:
+                self._layouts[plan.schema] = None
+            else:
+                positions = {column: i for i, column in enumerate(columns)}
+                self._layouts[plan.schema] = tuple(positions.get(field) for field in fields)
+        return self._layouts[plan.schema]
+
+
+class RowBatch():
+    '''
+    Rows of one form, each a tuple in the order of the form's schema, and the header of each filing
+    the rows were extracted from with how many of the rows are its, kept even for a filing with no rows
+    of the form.  The rows of a filing are together, in the order of the filings.
+    '''
+    __slots__ = ('schema', 'rows', 'filings')
+
+    schema: RowSchema
+    rows: list[tuple]
+    filings: list[tuple[tuple, int]]
+
+    def __init__(self, schema: RowSchema, rows: list[tuple] = None, filings: list[tuple[tuple, int]] = None):
+        '''
+        Constructor
+        '''
+        self.schema = schema
+        self.rows = rows if rows is not None else list()
+        self.filings = filings if filings is not None else list()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> typing.Iterator[tuple]:
+        return iter(self.rows)
+
+    def extend(self, other: 'RowBatch'):
+        """Append the rows of another batch of the same form"""
+        if other.schema.fieldnames != self.schema.fieldnames:
+            raise ValueError(f'Cannot add {other.schema.form} rows to a batch of {self.schema.form} rows')
+        self.rows.extend(other.rows)
+        self.filings.extend(other.filings)
+
+    def columns(self) -> list[tuple]:
+        """Return the values of each field, in the order of the schema"""
+        if not self.rows:
+            return [() for _ in self.schema.fieldnames]
+        return list(zip(*self.rows))
+
+    def dicts(self) -> Generator[dict[str, str], None, None]:
+        """Generate each row as a dict keyed by field name"""
+        fieldnames = self.schema.fieldnames
+        for row in self.rows:
+            yield dict(zip(fieldnames, row))
@@ -0,0 +1,343 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import collections
+import hashlib
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+import typing
+from pathlib import Path
+from typing import NamedTuple
+from zipfile import ZipFile, ZipInfo, ZipExtFile, BadZipFile
+import zipfile_deflate64
+
+SUFFIX = '_public.xml'
+
+def object_id(name: str) -> str:
+    """Return the OBJECT_ID of a filing from its file or member name"""
+    return os.path.basename(name).removesuffix(SUFFIX)
+
+
+class CatalogEntry(NamedTuple):
+    '''
+    Location of a filing inside a zip archive
+    '''
+    archive: str
+    name: str
+    header_offset: int
+    compress_size: int
+    file_size: int
+    crc: int
+    compress_type: int
+    flag_bits: int
+
+
+class ZipCatalog():
+    '''
+    Catalog mapping OBJECT_ID to the zip member holding the filing.
+
+    The members of each archive are listed once and saved to a sidecar file in the cache directory, which
+    is reused for as long as the archive's mtime and size are unchanged.  Entries record where the member's local header is, so
+    a filing can be read with a single seek instead of opening the archive and its central directory.
+    '''
+    VERSION = 1
+    EXTENSION = '.catalog.json'
+
+    entries: dict[str, CatalogEntry]
+    archives: dict[str, list[CatalogEntry]]
+    rebuilt: list[str]
+
+    def __init__(self, archives: typing.Iterable[typing.Union[str, os.PathLike]], cache_dir: typing.Union[str, os.PathLike] = None):
+        '''
+        Constructor
+        '''
+        # The sidecars are kept out of the filings tree, which may be read only or shared
+        self.cache_dir = cache_dir if cache_dir is not None else cache_home().joinpath('catalogs')
+        self.entries = dict()
+        self.archives = dict()
+        self.rebuilt = list()
+
+        for archive in archives:
+            archive = os.fspath(archive)
+            self.archives[archive] = self._load(archive)
+            for entry in self.archives[archive]:
+                # Archives listed first take precedence, as with the current and prior year directories
+                self.entries.setdefault(object_id(entry.name), entry)
+
+    @classmethod
+    def from_dirs(cls, dirs: typing.Iterable[typing.Union[str, os.PathLike]], cache_dir: typing.Union[str, os.PathLike] = None) -> 'ZipCatalog':
+        """Build the catalog for every zip file in the directories, in order"""
+        archives = list()
+        for d in dirs:
+            if d is None:
+                continue
+            for file in os.scandir(d):
+                if file.is_file() and re.fullmatch(r'.*\.zip', file.name):
+                    archives.append(file.path)
+        return cls(archives, cache_dir)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, objectid: str) -> bool:
+        return objectid in self.entries
+
+    def get(self, objectid: str) -> CatalogEntry:
+        return self.entries.get(objectid)
+
+    def members(self) -> typing.Generator[CatalogEntry, None, None]:
+        """Generate every member of every archive, in archive and central directory order"""
+        for entries in self.archives.values():
+            yield from entries
+
+    @classmethod
+    def open(cls, entry: CatalogEntry, pool: 'ArchivePool' = None) -> typing.BinaryIO:
+        """Open a cataloged member by seeking directly to its local header, through the pool's handle if given"""
+        f = open(entry.archive, 'rb') if pool is None else pool.open(entry.archive)
+        try:
+            f.seek(entry.header_offset)
+            header = f.read(30)
+            if len(header) != 30 or header[:4] != b'PK\x03\x04':
+                raise BadZipFile(f'Bad local header for {entry.name} in {entry.archive}')
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            f.seek(name_length + extra_length, os.SEEK_CUR)
+
+            info = ZipInfo(entry.name)
+            info.header_offset = entry.header_offset
+            info.compress_size = entry.compress_size
+            info.file_size = entry.file_size
+            info.CRC = entry.crc
+            info.compress_type = entry.compress_type
+            info.flag_bits = entry.flag_bits
+            return ZipExtFile(f, 'r', info, None, True)
+        except:
+            f.close()
+            raise
+
+    def _sidecar(self, archive: str) -> Path:
+        key = hashlib.sha1(os.path.abspath(archive).encode()).hexdigest()[:12]
+        return Path(self.cache_dir).joinpath(f'{os.path.basename(archive)}.{key}{self.EXTENSION}')
+
+    def _load(self, archive: str) -> list[CatalogEntry]:
+        stat = os.stat(archive)
+        sidecar = self._sidecar(archive)
+
+        try:
+            with open(sidecar, 'r') as f:
+                cached = json.load(f)
+            if (cached['version'] == self.VERSION and cached['mtime_ns'] == stat.st_mtime_ns
+                    and cached['size'] == stat.st_size):
+                return [CatalogEntry(archive, name, *fields) for name, *fields in cached['entries']]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        with ZipFile(archive) as z:
+            entries = [CatalogEntry(archive, i.filename, i.header_offset, i.compress_size, i.file_size,
+                                    i.CRC, i.compress_type, i.flag_bits) for i in z.infolist()]
+        self.rebuilt.append(archive)
+
+        try:
+            _write_json(sidecar, {'version': self.VERSION,
+                                  'mtime_ns': stat.st_mtime_ns,
+                                  'size': stat.st_size,
+                                  'entries': [entry[1:] for entry in entries]})
+        except OSError:
+            # A read-only archive directory only costs the rebuild on the next run
+            pass
+
+        return entries
+
+
+class ArchivePool():
+    '''
+    Open handles on zip archives, at most max_open of them, the least recently used closed first.
+
+    Reading the members of an archive one after another reuses its handle instead of opening the
+    archive for every member, while the cap keeps a run over many archives within the file descriptor
+    limit.  A closed handle is reopened lazily when its archive is read again.  Members read on several
+    threads share the handle, each seeking to its own position under the handle's lock.
+    '''
+    MAX_OPEN = 16
+
+    max_open: int
+    opened: int
+
+    def __init__(self, max_open: int = MAX_OPEN):
+        '''
+        Constructor
+        '''
+        if max_open < 1:
+            raise ValueError(f'Invalid max_open {max_open}, at least one archive must be kept open')
+        self.max_open = max_open
+        self.opened = 0
+        self._handles = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, archive: str) -> typing.BinaryIO:
+        """Return a file on the archive, sharing the pooled handle, to be closed once the member is read"""
+        with self._lock:
+            handle = self._handles.get(archive)
+            if handle is None:
+                handle = _Handle(open(archive, 'rb'))
+                self.opened += 1
+                self._handles[archive] = handle
+                while len(self._handles) > self.max_open:
+                    self._evict(self._handles.popitem(last=False)[1])
+            else:
+                self._handles.move_to_end(archive)
+            handle.users += 1
+        return _PooledFile(self, handle)
+
+    def close(self):
+        with self._lock:
+            for handle in self._handles.values():
+                self._evict(handle)
+            self._handles.clear()
+
+    def _release(self, handle: '_Handle'):
+        with self._lock:
+            handle.users -= 1
+            if handle.evicted and handle.users == 0:
+                handle.file.close()
+
+    @staticmethod
+    def _evict(handle: '_Handle'):
+        # A handle still being read from is closed when its last reader is done
+        handle.evicted = True
+        if handle.users == 0:
+            handle.file.close()
+
+
+class _Handle():
+    '''
+    Pooled handle on an archive
+    '''
+    __slots__ = ('file', 'lock', 'users', 'evicted')
+
+    def __init__(self, file: typing.BinaryIO):
+        self.file = file
+        self.lock = threading.Lock()
+        self.users = 0
+        self.evicted = False
+
+
+class _PooledFile():
+    '''
+    File on a pooled archive handle, with its own position
+    '''
+
+    def __init__(self, pool: ArchivePool, handle: _Handle):
+        self._pool = pool
+        self._handle = handle
+        self._pos = 0
+        self.closed = False
+
+    def read(self, n: int = -1) -> bytes:
+        with self._handle.lock:
+            self._handle.file.seek(self._pos)
+            data = self._handle.file.read(n)
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            self._pos = offset
+        elif whence == os.SEEK_CUR:
+            self._pos += offset
+        else:
+            with self._handle.lock:
+                self._pos = self._handle.file.seek(offset, whence)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._pool._release(self._handle)
+
+
+class DirectoryCatalog():
+    '''
+    Catalog mapping OBJECT_ID to the filing's path in a year/subdir directory layout.
+
+    The catalog is saved to a sidecar file in the cache directory and reused for as long as the mtimes
+    of the year directories and their subdirectories are unchanged.
+    '''
+    VERSION = 1
+    EXTENSION = '.catalog.json'
+
+    paths: dict[str, Path]
+    rebuilt: bool
+
+    def __init__(self, filings_dir: typing.Union[str, os.PathLike], dirs: dict[str, list[Path]],
+                 cache_dir: typing.Union[str, os.PathLike] = None):
+        '''
+        Constructor
+        '''
+        self.paths = dict()
+        self.rebuilt = False
+
+        stamps = {os.fspath(d): os.stat(d).st_mtime_ns for year in dirs for d in dirs[year]}
+        key = hashlib.sha1(os.path.abspath(filings_dir).encode()).hexdigest()[:12]
+        cache_dir = cache_dir if cache_dir is not None else cache_home().joinpath('catalogs')
+        sidecar = Path(cache_dir).joinpath(f'filings.{key}{self.EXTENSION}')
+
+        try:
+            with open(sidecar, 'r') as f:
+                cached = json.load(f)
+            if cached['version'] == self.VERSION and cached['dirs'] == stamps:
+                self.paths = {objectid: Path(path) for objectid, path in cached['paths'].items()}
+                return
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        for year, subdirs in dirs.items():
+            for d in subdirs:
+                for file in os.scandir(d):
+                    if file.name.endswith(SUFFIX) and file.name.startswith(year) and file.is_file():
+                        self.paths.setdefault(object_id(file.name), Path(file.path))
+        self.rebuilt = True
+
+        try:
+            _write_json(sidecar, {'version': self.VERSION,
+                                  'dirs': stamps,
+                                  'paths': {objectid: os.fspath(path) for objectid, path in self.paths.items()}})
+        except OSError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def get(self, objectid: str) -> Path:
+        return self.paths.get(objectid)
+
+
+def cache_home() -> Path:
+    """Return the directory parse990 caches catalogs and mappings in, PARSE990_CACHE_DIR or parse990 under the user cache"""
+    return Path(os.environ.get('PARSE990_CACHE_DIR') or
+                Path(os.environ.get('XDG_CACHE_HOME') or Path.home().joinpath('.cache')).joinpath('parse990'))
+
+
+def _write_json(path: Path, data: dict):
+    """Write the file atomically so an interrupted run never leaves a truncated sidecar behind"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A file of its own, as the processes of a run, or of several runs, share the cache
+    fd, tmp = tempfile.mkstemp(prefix=f'{path.name}.', suffix='.tmp', dir=path.parent)
+    try:
+        with open(fd, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
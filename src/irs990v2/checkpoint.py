@@ -0,0 +1,103 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import json
+import os
+import typing
+
+class Checkpoint():
+    '''
+    Manifest of the filings whose rows have been durably written to the output files.
+
+    Each line of the manifest lists a group of filings, identified by (archive, member, CRC), together
+    with the position of every output sink once their rows were synced.  A resumed run cuts the outputs
+    back to the positions of the last complete line and skips the filings already recorded, so rows
+    written after the last checkpoint are neither lost nor duplicated.
+    '''
+
+    path: str
+    every: int
+    completed: set[tuple[str, str, int]]
+    offsets: dict[str, int]
+
+    def __init__(self, path: typing.Union[str, os.PathLike], resume: bool = False, every: int = 100):
+        '''
+        Constructor
+        '''
+        self.path = os.fspath(path)
+        self.every = every
+        self.completed = set()
+        self.offsets = dict()
+        self._pending = list()
+
+        if resume and os.path.exists(self.path):
+            end = 0
+            for record, length in self._records(self.path):
+                self.completed.update(tuple(filing) for filing in record['filings'])
+                self.offsets = record['offsets']
+                end += length
+            self._manifest = open(self.path, 'a')
+            self._manifest.truncate(end)
+        else:
+            self._manifest = open(self.path, 'w')
+
+    @classmethod
+    def committed(cls, path: typing.Union[str, os.PathLike]) -> typing.Generator[tuple[str, str, int], None, None]:
+        """Generate the (archive, member, crc) of every filing committed to a manifest, without opening it for a run"""
+        for record, _ in cls._records(os.fspath(path)):
+            for filing in record['filings']:
+                yield tuple(filing)
+
+    @property
+    def resuming(self) -> bool:
+        return len(self.offsets) > 0
+
+    def offset(self, form: str) -> int:
+        """Return where the output of a form should resume from, or None to start it afresh"""
+        return self.offsets.get(form)
+
+    def done(self, archive: str, member: str, crc: int = None) -> bool:
+        """Check whether the rows of a filing were written by an earlier run"""
+        return (archive, member, crc) in self.completed
+
+    def add(self, outputs: dict[str, typing.Any], *filings: tuple[str, str, int]):
+        """Record that the rows of the (archive, member, crc) filings have been written.
+
+        Every so many filings the outputs are synced and the manifest is committed, so all filings whose
+        rows are already in the outputs must be added together.
+        """
+        self._pending.extend(filings)
+        if len(self._pending) >= self.every:
+            self.commit(outputs)
+
+    def commit(self, outputs: dict[str, typing.Any]):
+        """Sync the output files and append the pending filings to the manifest"""
+        self.offsets = {form: output.sync() for form, output in outputs.items()}
+        self._manifest.write(json.dumps({'filings': self._pending, 'offsets': self.offsets}) + '\n')
+        self._manifest.flush()
+        os.fsync(self._manifest.fileno())
+
+        self.completed.update(self._pending)
+        self._pending = list()
+
+    def close(self, outputs: dict[str, typing.Any]):
+        """Commit the remaining filings and close the manifest"""
+        if self._pending or not self.offsets:
+            self.commit(outputs)
+        self._manifest.close()
+
+    @staticmethod
+    def _records(path: str) -> typing.Generator[tuple[dict, int], None, None]:
+        """Generate each complete line of a manifest with its length in bytes"""
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line may have been cut short by the crash; it was never committed
+                    break
+                yield record, len(line)
@@ -0,0 +1,131 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import datetime
+import typing
+from typing import Any, Iterable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Converter():
+    '''
+    Conversion of the extracted text values to typed values, a column at a time.
+
+    Amounts become integers, dates become dates and indicators become booleans, as declared by the
+    column types of the mapping.  Missing or malformed values become None.  With NumPy a whole column of
+    a batch is converted in a few array operations and returned as a masked array; without it each value
+    is converted on its own.
+    '''
+    TYPES = ('string', 'int', 'date', 'bool')
+    TRUE = ('x', 'true', '1')
+    FALSE = ('false', '0')
+
+    types: dict[str, str]
+
+    def __init__(self, types: dict[str, str]):
+        '''
+        Constructor
+        '''
+        for name, column_type in types.items():
+            if column_type not in self.TYPES:
+                raise ValueError(f'Unknown type {column_type} for column {name}')
+        self.types = {name: column_type for name, column_type in types.items() if column_type != 'string'}
+
+    def convert_columns(self, columns: dict[str, list[str]]) -> dict[str, Any]:
+        """Convert every typed column of a batch, leaving the string columns as they are"""
+        return {name: self.convert_column(self.types[name], values) if name in self.types else values
+                for name, values in columns.items()}
+
+    def convert_rows(self, rows: Iterable[dict[str, str]], fieldnames: list[str]) -> list[dict[str, Any]]:
+        """Convert a batch of rows, returning new rows holding Python values"""
+        rows = list(rows)
+        if not rows or not self.types:
+            return rows
+
+        columns = {name: [row.get(name) for row in rows] for name in self.types if name in fieldnames}
+        converted = {name: values.tolist() if numpy is not None else values
+                     for name, values in self.convert_columns(columns).items()}
+        return [row | {name: values[i] for name, values in converted.items()} for i, row in enumerate(rows)]
+
+    def convert_tuples(self, rows: list[tuple], fieldnames: typing.Sequence[str]) -> list[tuple]:
+        """Convert a batch of rows given as tuples in the order of fieldnames, returning new tuples"""
+        if not rows or not self.types:
+            return rows
+
+        columns = list(zip(*rows))
+        for i, name in enumerate(fieldnames):
+            if name in self.types:
+                values = self.convert_column(self.types[name], columns[i])
+                columns[i] = values.tolist() if numpy is not None else values
+        return list(zip(*columns))
+
+    @classmethod
+    def convert_column(cls, column_type: str, values: list[str]):
+        """Convert one column, returning a masked array with NumPy or a list otherwise"""
+        if column_type == 'string':
+            return values
+        if numpy is None:
+            return [cls.convert_value(column_type, value) for value in values]
+
+        text = numpy.array(['' if value is None else value for value in values], dtype=str)
+        text = numpy.char.strip(text)
+        try:
+            return getattr(cls, f'_array_{column_type}')(text)
+        except ValueError:
+            # A malformed value somewhere in the batch, so fall back to converting one value at a time
+            converted = [cls.convert_value(column_type, value) for value in values]
+            mask = [value is None for value in converted]
+            return numpy.ma.masked_array([cls._fill(column_type) if value is None else value for value in converted],
+                                         mask=mask, dtype=cls._dtype(column_type))
+
+    @classmethod
+    def convert_value(cls, column_type: str, value: str) -> Any:
+        """Convert a single value, returning None when it is missing or malformed"""
+        if value is None or column_type == 'string':
+            return value
+        value = value.strip()
+        try:
+            if column_type == 'int':
+                return int(value)
+            if column_type == 'date':
+                return datetime.date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+
+        value = value.lower()
+        if value in cls.TRUE:
+            return True
+        if value in cls.FALSE:
+            return False
+        return None
+
+    @staticmethod
+    def _array_int(text):
+        missing = text == ''
+        return numpy.ma.masked_array(numpy.where(missing, '0', text).astype(numpy.int64), mask=missing)
+
+    @staticmethod
+    def _array_date(text):
+        missing = text == ''
+        # Dates may carry a time zone offset, which the day does not depend on
+        days = numpy.where(missing, 'NaT', text.astype('U10')).astype('datetime64[D]')
+        return numpy.ma.masked_array(days, mask=missing)
+
+    @classmethod
+    def _array_bool(cls, text):
+        text = numpy.char.lower(text)
+        true = numpy.isin(text, cls.TRUE)
+        return numpy.ma.masked_array(true, mask=~(true | numpy.isin(text, cls.FALSE)))
+
+    @staticmethod
+    def _dtype(column_type: str):
+        return {'int': numpy.int64, 'date': 'datetime64[D]', 'bool': bool}[column_type]
+
+    @staticmethod
+    def _fill(column_type: str):
+        return {'int': 0, 'date': numpy.datetime64('NaT'), 'bool': False}[column_type]
@@ -0,0 +1,165 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import collections
+import datetime
+import json
+import os
+import shutil
+import typing
+from pathlib import Path
+from typing import NamedTuple
+
+from .catalog import CatalogEntry, ZipCatalog, object_id
+
+class Failure(NamedTuple):
+    '''
+    A filing that could not be parsed, and the stage it failed in
+    '''
+    member: str
+    stage: str
+    error: str
+    message: str
+
+
+class ErrorBudgetExceeded(RuntimeError):
+    '''
+    Raised when so many filings fail that the run should stop, as when a mapping is broken
+    '''
+
+
+class ErrorSink():
+    '''
+    Record of the filings that failed to parse, written as one JSON line per failure.
+
+    With a quarantine directory the payload of each failed filing is saved there too, with its
+    failure record next to it, so the failures can be inspected and re-run on their own.  A filing
+    retried from the quarantine is recorded with the record it was quarantined with as its source, so
+    a failure on retry still names the archive, member and CRC it was first read from.  The error
+    budget stops the run once more than max_errors filings have failed, or once more than max_rate
+    of the last window filings have, so a systemic problem does not go on for hours.  Without a
+    path the failures are only kept in the failures list, as in worker processes.
+    '''
+    SUFFIX = '.failure.json'
+
+    path: str
+    quarantine: str
+    max_errors: int
+    max_rate: float
+    window: int
+    seen: int
+    failed: int
+    failures: list[tuple[Failure, typing.Any]]
+
+    def __init__(self, path: typing.Union[str, os.PathLike] = None, quarantine: typing.Union[str, os.PathLike] = None,
+                 max_errors: int = None, max_rate: float = None, window: int = 100, append: bool = False):
+        '''
+        Constructor
+        '''
+        self.path = os.fspath(path) if path is not None else None
+        self.quarantine = os.fspath(quarantine) if quarantine is not None else None
+        self.max_errors = max_errors
+        self.max_rate = max_rate
+        self.window = window
+        self.seen = 0
+        self.failed = 0
+        self.failures = list()
+        self._recent = collections.deque(maxlen=window)
+
+        self._file = open(self.path, 'a' if append else 'w') if self.path is not None else None
+        if self.quarantine is not None:
+            os.makedirs(self.quarantine, exist_ok=True)
+
+    def parsed(self, n: int = 1):
+        """Count filings parsed without failing"""
+        self.seen += n
+        self._recent.extend([False] * min(n, self.window))
+
+    def record(self, failure: Failure, source: typing.Union[CatalogEntry, dict, str, os.PathLike] = None):
+        """Record a failed filing, given where it was read from, and check the error budget"""
+        self.seen += 1
+        self.failed += 1
+        self._recent.append(True)
+
+        if self._file is None:
+            self.failures.append((failure, source))
+        else:
+            record = self._record(failure, source)
+            if self.quarantine is not None:
+                record['payload'] = self._quarantine(source, failure.member)
+                with open(os.path.join(self.quarantine, object_id(record['member']) + self.SUFFIX), 'w') as f:
+                    json.dump(record, f)
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+        self.check()
+
+    def check(self):
+        """Raise ErrorBudgetExceeded if the failures are over budget"""
+        if self.max_errors is not None and self.failed > self.max_errors:
+            raise ErrorBudgetExceeded(f'{self.failed} filings failed, more than the {self.max_errors} allowed')
+        if self.max_rate is not None and len(self._recent) == self.window:
+            rate = sum(self._recent) / self.window
+            if rate > self.max_rate:
+                raise ErrorBudgetExceeded(f'{rate:.0%} of the last {self.window} filings failed, '
+                                          f'more than the {self.max_rate:.0%} allowed')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    @classmethod
+    def quarantined(cls, quarantine: typing.Union[str, os.PathLike]) -> typing.Generator[tuple[dict, Path], None, None]:
+        """Generate the failure record and payload path of every filing in a quarantine directory"""
+        for record_path in sorted(Path(quarantine).glob('*' + cls.SUFFIX)):
+            with open(record_path, 'r') as f:
+                record = json.load(f)
+            if record.get('payload') is not None:
+                yield record, Path(quarantine).joinpath(record['payload'])
+
+    @classmethod
+    def release(cls, quarantine: typing.Union[str, os.PathLike], record: dict):
+        """Remove a filing that now parses from the quarantine directory"""
+        for name in (record['payload'], object_id(record['member']) + cls.SUFFIX):
+            try:
+                os.remove(os.path.join(quarantine, name))
+            except FileNotFoundError:
+                pass
+
+    def _record(self, failure: Failure, source) -> dict:
+        record = {'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                  'archive': None,
+                  'member': failure.member,
+                  'crc': None}
+        if isinstance(source, CatalogEntry):
+            record |= {'archive': os.path.abspath(source.archive), 'member': source.name, 'crc': source.crc}
+        elif isinstance(source, dict):
+            # The quarantine record of a filing that failed again on retry
+            record |= {'archive': source['archive'], 'member': source['member'], 'crc': source['crc']}
+        elif source is not None:
+            record['member'] = os.path.abspath(source)
+        return record | {'stage': failure.stage, 'error': failure.error, 'message': failure.message}
+
+    def _quarantine(self, source, member: str) -> str:
+        """Copy the payload of a failed filing to the quarantine directory, returning its name there"""
+        name = os.path.basename(member)
+        target = os.path.join(self.quarantine, name)
+        try:
+            if isinstance(source, CatalogEntry):
+                with ZipCatalog.open(source) as f, open(target, 'wb') as out:
+                    shutil.copyfileobj(f, out)
+            elif isinstance(source, dict):
+                # A quarantined filing that failed again on retry, whose payload is already there
+                return source.get('payload')
+            elif source is not None:
+                shutil.copyfile(source, target)
+            else:
+                return None
+        except Exception:
+            # The payload itself cannot be read, as with a corrupt zip member; the record still points to it
+            if os.path.exists(target):
+                os.remove(target)
+            return None
+        return name
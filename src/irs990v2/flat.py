@@ -0,0 +1,84 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import json
+import typing
+import xml.etree.ElementTree as ET
+import zlib
+
+class FlatFiling():
+    '''
+    A parsed filing flattened into (size, tag, text) records, one per element in document order.
+
+    size is the number of elements below the element, so a walk can step over a subtree it has no use
+    for in one jump, and each tag is an index into the filing's list of distinct qualified tags.  The
+    text of an element with children is only kept when it is more than whitespace.  Saved as compressed
+    JSON this is smaller than the zipped XML, and decoding it is several times faster than inflating and
+    parsing the XML again.
+    '''
+    __slots__ = ('attrib', 'tags', 'nodes')
+
+    attrib: dict[str, str]
+    tags: list[str]
+    nodes: list
+
+    def __init__(self, attrib: dict[str, str], tags: list[str], nodes: list):
+        '''
+        Constructor
+        '''
+        self.attrib = attrib
+        self.tags = tags
+        self.nodes = nodes
+
+    @classmethod
+    def from_element(cls, root: ET.Element) -> 'FlatFiling':
+        """Flatten the tree of a parsed filing"""
+        tags = dict()
+        nodes = list()
+
+        def flatten(elem: ET.Element):
+            i = len(nodes)
+            text = elem.text
+            if len(elem) and text is not None and not text.strip():
+                text = None
+            nodes.extend((0, tags.setdefault(elem.tag, len(tags)), text))
+            for child in elem:
+                flatten(child)
+            nodes[i] = (len(nodes) - i) // 3 - 1
+
+        flatten(root)
+        return cls(dict(root.attrib), list(tags), nodes)
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'FlatFiling':
+        return cls(*json.loads(zlib.decompress(data)))
+
+    def dumps(self) -> bytes:
+        return zlib.compress(json.dumps([self.attrib, self.tags, self.nodes], separators=(',', ':')).encode())
+
+    def element(self, i: int = 0) -> ET.Element:
+        """Rebuild the subtree of the element at record i, the whole filing by default"""
+        nodes, tags = self.nodes, self.tags
+        root = ET.Element(tags[nodes[i + 1]], self.attrib if i == 0 else {})
+        root.text = nodes[i + 2]
+        stack = [(root, i + 3 * (nodes[i] + 1))]
+        i += 3
+        while i < stack[0][1]:
+            while i >= stack[-1][1]:
+                stack.pop()
+            elem = ET.SubElement(stack[-1][0], tags[nodes[i + 1]])
+            elem.text = nodes[i + 2]
+            stack.append((elem, i + 3 * (nodes[i] + 1)))
+            i += 3
+        return root
+
+    def children(self, i: int = 0) -> typing.Generator[int, None, None]:
+        """Generate the record index of each child of the element at record i"""
+        nodes = self.nodes
+        end = i + 3 * (nodes[i] + 1)
+        i += 3
+        while i < end:
+            yield i
+            i += 3 * (nodes[i] + 1)
@@ -5,106 +5,324 @@ Created on Dec 22, 2023
 '''
 import typing
 import csv
+import datetime
 import re
 import os
+import time
+from array import array
 from pathlib import Path
 from collections.abc import Sequence
+from itertools import islice
 from typing import Generator
-from zipfile import ZipFile
-import zipfile_deflate64
 
+from .catalog import ArchivePool, CatalogEntry, DirectoryCatalog, ZipCatalog
+from .errors import ErrorSink
+from .metrics import Metrics
 from .parse import Parser
+from .predicate import FilingPredicate, normalize_ein
+from .prefetch import Prefetcher
+from .shard import Shard
 
 class Index(Sequence):
     '''
-    Class for reading and accessing 990 index files
+    Class for reading and accessing 990 index files.
+
+    Records are held by column instead of as one dict per row.  Columns with few distinct values, such
+    as RETURN_TYPE, FILING_TYPE and TAX_PERIOD, are stored as integer codes into a table of their values
+    and the other columns as lists of strings.  A record is only turned into a dict when it is accessed.
+    Rows can be filtered on return type and tax period while the file is read, and records looked up by
+    OBJECT_ID or EIN through hash indexes built on first use.
+
+    An index often lists several returns for the same EIN and TAX_PERIOD: the original, amendments and
+    re-submissions.  A dedup policy picks among them by submission, ordered by SUB_DATE and then OBJECT_ID,
+    so the filings it drops are never inflated or parsed.  The index does not flag amended returns, so
+    every submission after the first for a period counts as an amendment.
     '''
+    INTERNED = ('FILING_TYPE', 'TAX_PERIOD', 'RETURN_TYPE')
+    # Return types parsed from the index: 990 and 990O (alias for 990)
+    RETURN_TYPES = ('990', '990O')
+    CHUNK = 10000
+    # latest: the last submission for each period; original: the first; amended: every one after the first
+    DEDUP = ('latest', 'original', 'amended')
+    SUB_DATE_FORMATS = ('%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y',
+                        '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%Y')
     
-    records: list[dict[str, str]]
+    fieldnames: list[str]
 
-    def __init__(self, csvdata: typing.TextIO, fieldnames: Sequence = None) -> None:
+    def __init__(self, csvdata: typing.TextIO, fieldnames: Sequence = None,
+                 return_types: typing.Iterable[str] = None, tax_periods: typing.Iterable[str] = None,
+                 predicate: FilingPredicate = None) -> None:
         '''
         Constructor
         '''
-        reader = csv.DictReader(csvdata, fieldnames=fieldnames)
+        self.fieldnames, rows = self._read(csvdata, fieldnames, return_types, tax_periods, predicate)
+        
+        self._columns = [array('I') if name in self.INTERNED else list() for name in self.fieldnames]
+        codes = [dict() if name in self.INTERNED else None for name in self.fieldnames]
+        self._by_object_id = None
+        self._by_ein = None
         
-        self.records = list()
-        for record in reader:
-            self.records.append(record)
+        # Transpose the rows a chunk at a time, so each column is extended in one call
+        while chunk := list(islice(rows, self.CHUNK)):
+            for column, code, values in zip(self._columns, codes, zip(*chunk)):
+                if code is None:
+                    column.extend(values)
+                else:
+                    column.extend(map(self._coder(code), values))
+        
+        self._length = len(self._columns[0]) if self._columns else 0
+        self._values = [None if code is None else list(code) for code in codes]
+    
+    @classmethod
+    def stream(cls, csvdata: typing.TextIO, fieldnames: Sequence = None,
+               return_types: typing.Iterable[str] = None, tax_periods: typing.Iterable[str] = None,
+               predicate: FilingPredicate = None) -> Generator[dict[str, str], None, None]:
+        """Generate the records of an index file one at a time, without holding the index in memory"""
+        fieldnames, rows = cls._read(csvdata, fieldnames, return_types, tax_periods, predicate)
+        for row in rows:
+            yield dict(zip(fieldnames, row))
+    
+    @property
+    def records(self) -> Sequence:
+        """The records as a sequence of dicts"""
+        return self
     
     def __len__(self) -> int:
-        return len(self.records)
+        return self._length
     
     def __getitem__(self, key):
-        return self.records[key]
+        if isinstance(key, slice):
+            return [self._record(i) for i in range(*key.indices(self._length))]
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError('index record out of range')
+        return self._record(key)
         
     def __iter__(self) -> iter:
-        return iter(self.records)
+        return (self._record(i) for i in range(self._length))
+    
+    def column(self, name: str) -> list[str]:
+        """Return the values of one column for every record"""
+        pos = self.fieldnames.index(name)
+        if self._values[pos] is None:
+            return list(self._columns[pos])
+        return [self._values[pos][code] for code in self._columns[pos]]
+    
+    def get(self, objectid: str) -> dict[str, str]:
+        """Return the record of a filing by OBJECT_ID, or None if it is not indexed"""
+        if self._by_object_id is None:
+            self._by_object_id = {o: i for i, o in enumerate(self.column('OBJECT_ID'))}
+        i = self._by_object_id.get(objectid)
+        return None if i is None else self._record(i)
+    
+    def for_ein(self, ein: str) -> list[dict[str, str]]:
+        """Return the records of every filing of an organization"""
+        if self._by_ein is None:
+            self._by_ein = dict()
+            for i, e in enumerate(self.column('EIN')):
+                self._by_ein.setdefault(normalize_ein(e), list()).append(i)
+        return [self._record(i) for i in self._by_ein.get(normalize_ein(ein), ())]
+    
+    def dedup(self, policy: str = 'latest') -> list[int]:
+        """Return the positions of the records a dedup policy keeps, in index order"""
+        if policy not in self.DEDUP:
+            raise ValueError(f'Unknown dedup policy {policy}')
+        
+        # One pass to group the records by filer and period; only groups of several need their dates
+        groups = dict()
+        periods = self._columns[self.fieldnames.index('TAX_PERIOD')]
+        for i, (ein, period) in enumerate(zip(self.column('EIN'), periods)):
+            groups.setdefault((normalize_ein(ein), period), list()).append(i)
+        
+        kept = list()
+        sub_dates = self._columns[self.fieldnames.index('SUB_DATE')]
+        object_ids = self._columns[self.fieldnames.index('OBJECT_ID')]
+        for group in groups.values():
+            if len(group) == 1:
+                if policy != 'amended':
+                    kept.append(group[0])
+                continue
+            group.sort(key=lambda i: (self._submitted(sub_dates[i]), object_ids[i]))
+            if policy == 'latest':
+                kept.append(group[-1])
+            elif policy == 'original':
+                kept.append(group[0])
+            else:
+                kept.extend(group[1:])
+        return sorted(kept)
     
     @classmethod
-    def process(cls, index: typing.TextIO, filings_dir: str, forms: list[str] = ['990']) -> Generator[dict[str, Generator[dict[str, str], None, None]], None, None]:
-        idx = Index(index)
-        parser = Parser()
-
-        dirs = cls._expandFilingsDir(filings_dir)
+    def _submitted(cls, sub_date: str) -> datetime.datetime:
+        for date_format in cls.SUB_DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(sub_date.strip(), date_format)
+            except (ValueError, AttributeError):
+                pass
+        # Undated submissions sort first, ordered by OBJECT_ID alone
+        return datetime.datetime.min
+    
+    @staticmethod
+    def _coder(code: dict[str, int]) -> typing.Callable[[str], int]:
+        """Return a function giving the code of a value of an interned column, coding new values as they come"""
+        setdefault = code.setdefault
+        return lambda value: setdefault(value, len(code))
+    
+    def _record(self, i: int) -> dict[str, str]:
+        return {name: column[i] if values is None else values[column[i]]
+                for name, column, values in zip(self.fieldnames, self._columns, self._values)}
+    
+    @classmethod
+    def _read(cls, csvdata: typing.TextIO, fieldnames: Sequence, return_types: typing.Iterable[str],
+              tax_periods: typing.Iterable[str], predicate: FilingPredicate) -> tuple[list[str], typing.Iterator[list[str]]]:
+        reader = csv.reader(csvdata)
+        if fieldnames is None:
+            fieldnames = next(reader, [])
+        fieldnames = list(fieldnames)
+        
+        filters = list()
+        if return_types is not None:
+            filters.append((fieldnames.index('RETURN_TYPE'), frozenset(return_types)))
+        if tax_periods is not None:
+            filters.append((fieldnames.index('TAX_PERIOD'), frozenset(str(p) for p in tax_periods)))
+        
+        def rows():
+            width = len(fieldnames)
+            for row in reader:
+                if len(row) != width:
+                    if not row:
+                        continue
+                    row = (row + [None] * width)[:width]
+                for pos, accepted in filters:
+                    if row[pos] not in accepted:
+                        break
+                else:
+                    if predicate is None or predicate.accepts_index(dict(zip(fieldnames, row))):
+                        yield row
         
-        for filing in idx:
-            # Ignore 990EZ, 990EO (alias for 990EZ), and 990PF filings.
-            # Accept only 990 and 990O (alias for 990)
-            if filing['RETURN_TYPE'] == '990' or filing['RETURN_TYPE'] == '990O':
-                objectid = filing['OBJECT_ID']
-                year = objectid[:4]
+        return fieldnames, rows()
+    
+    @classmethod
+    def process(cls, index: typing.TextIO, filings_dir: str, forms: list[str] = ['990'],
+                streaming: bool = False,
+                cache_dir: typing.Union[str, bytes, os.PathLike] = None,
+                predicate: FilingPredicate = None,
+                metrics: Metrics = None,
+                errors: ErrorSink = None,
+                dedup: str = None,
+                shard: Shard = None) -> Generator[dict[str, Generator[dict[str, str], None, None]], None, None]:
+        parser = Parser(streaming, predicate, metrics, errors)
 
-                if year not in dirs:
-                    continue
-                for d in dirs[year]:
-                    file = d.joinpath(f'{objectid}_public.xml')
-                    if file.is_file():
-                        with open(file, 'r', newline='', encoding='utf-8-sig') as f:
-                            yield parser.parse(f, forms)
-                            break
+        for file in cls.filings(index, filings_dir, cache_dir, predicate, metrics, dedup, shard):
+            with open(file, 'r', newline='', encoding='utf-8-sig') as f:
+                yield parser.parse(f, forms, file)
     
     @classmethod
     def processZip(cls, 
                    index: typing.TextIO, 
                    index_dir: typing.Union[str, bytes, os.PathLike], 
                    prior_index_dir: typing.Union[str, bytes, os.PathLike],
-                   forms: list[str] = ['990']) -> Generator[dict[str, Generator[dict[str, str], None, None]], None, None]:
-        
-        idx = Index(index)
-        parser = Parser()
+                   forms: list[str] = ['990'],
+                   streaming: bool = False,
+                   cache_dir: typing.Union[str, bytes, os.PathLike] = None,
+                   predicate: FilingPredicate = None,
+                   metrics: Metrics = None,
+                   errors: ErrorSink = None,
+                   prefetch: Prefetcher = None,
+                   dedup: str = None,
+                   shard: Shard = None,
+                   max_open: int = ArchivePool.MAX_OPEN,
+                   index_order: bool = False) -> Generator[dict[str, Generator[dict[str, str], None, None]], None, None]:
+        """Parse the indexed filings, grouped by archive and in the order they are stored unless index_order is set.
 
-        zip_files = list()
-        zip_entries = dict()
+        Reading each archive's members together and front to back keeps disk access sequential, and with
+        at most max_open archives open at a time the run stays within the file descriptor limit.
+        """
+        parser = Parser(streaming, predicate, metrics, errors)
+        pool = None
+        if prefetch is None:
+            pool = ArchivePool(max_open)
+            prefetch = Prefetcher(metrics=metrics, pool=pool)
 
-        for file in os.scandir(index_dir):
-            if file.is_file() and re.match('.*\.zip', file.name):
-                archive = ZipFile(file.path)
-                zip_files.append(archive)
-                for name in archive.namelist():
-                    zip_entries.setdefault(name, archive)
+        entries = cls.zipFilings(index, index_dir, prior_index_dir, cache_dir, predicate, metrics, dedup, shard)
+        if not index_order:
+            entries = sorted(entries, key=lambda entry: (entry.archive, entry.header_offset))
+        try:
+            for entry, f, e in prefetch.members(entries):
+                if f is None:
+                    parser.failed(entry.name, e, entry, 'read')
+                    yield None
+                    continue
+                with f:
+                    yield parser.parse(f, forms, entry)
+        finally:
+            if pool is not None:
+                pool.close()
+    
+    @classmethod
+    def filings(cls, index: typing.TextIO, filings_dir: str,
+                cache_dir: typing.Union[str, bytes, os.PathLike] = None,
+                predicate: FilingPredicate = None,
+                metrics: Metrics = None,
+                dedup: str = None,
+                shard: Shard = None) -> Generator[Path, None, None]:
+        """Generate the paths of the indexed filings found in the year/subdir filings directory"""
+        start = time.perf_counter()
+        catalog = DirectoryCatalog(filings_dir, cls._expandFilingsDir(filings_dir), cache_dir)
+        if metrics is not None:
+            metrics.add_time('catalog', time.perf_counter() - start)
         
-        if prior_index_dir is not None:
-            for file in os.scandir(prior_index_dir):
-                if file.is_file() and re.match('.*\.zip', file.name):
-                    archive = ZipFile(file.path)
-                    zip_files.append(archive)
-                    for name in archive.namelist():
-                        zip_entries.setdefault(name, archive)
+        for filing in cls.indexed(index, predicate, metrics, dedup, shard):
+            file = catalog.get(filing['OBJECT_ID'])
+            if metrics is not None:
+                metrics.count('index_records')
+                metrics.count('index_missing', file is None)
+            if file is not None:
+                yield file
+    
+    @classmethod
+    def zipFilings(cls, 
+                   index: typing.TextIO, 
+                   index_dir: typing.Union[str, bytes, os.PathLike], 
+                   prior_index_dir: typing.Union[str, bytes, os.PathLike],
+                   cache_dir: typing.Union[str, bytes, os.PathLike] = None,
+                   predicate: FilingPredicate = None,
+                   metrics: Metrics = None,
+                   dedup: str = None,
+                   shard: Shard = None) -> Generator[CatalogEntry, None, None]:
+        """Generate the zip members holding the indexed filings"""
+        start = time.perf_counter()
+        catalog = ZipCatalog.from_dirs([index_dir, prior_index_dir], cache_dir)
+        if metrics is not None:
+            metrics.add_time('catalog', time.perf_counter() - start)
 
-        for filing in idx:
-            # Ignore 990EZ, 990EO (alias for 990EZ), and 990PF filings.
-            # Accept only 990 and 990O (alias for 990)
-            if filing['RETURN_TYPE'] == '990' or filing['RETURN_TYPE'] == '990O':
-                objectid = filing['OBJECT_ID']
-                file = f'{objectid}_public.xml'
-                archive = zip_entries[file]
-                with archive.open(file, mode='r') as f:
-                    yield parser.parse(f, forms)
-                    break
+        for filing in cls.indexed(index, predicate, metrics, dedup, shard):
+            entry = catalog.get(filing['OBJECT_ID'])
+            if metrics is not None:
+                metrics.count('index_records')
+                metrics.count('index_missing', entry is None)
+            if entry is not None:
+                yield entry
+    
+    @classmethod
+    def indexed(cls, index: typing.TextIO, predicate: FilingPredicate = None, metrics: Metrics = None,
+                dedup: str = None, shard: Shard = None) -> typing.Iterator[dict[str, str]]:
+        """Return the records of the filings to parse, streamed unless a dedup policy needs the whole index.
 
-        for archive in zip_files:
-            archive.close()
+        Duplicates are resolved over the whole index before the shard's filings are picked out, so every
+        shard agrees on which return of a period is kept.
+        """
+        if dedup is None:
+            records = cls.stream(index, return_types=cls.RETURN_TYPES, predicate=predicate)
+        else:
+            idx = cls(index, return_types=cls.RETURN_TYPES, predicate=predicate)
+            kept = idx.dedup(dedup)
+            if metrics is not None:
+                metrics.count('index_dedup_skipped', len(idx) - len(kept))
+            records = (idx[i] for i in kept)
+        if shard is not None:
+            records = (record for record in records if shard.owns(record['OBJECT_ID']))
+        return records
     
     @classmethod
     def _expandFilingsDir(cls, filings_dir:str) -> dict[str, list[Path]]:
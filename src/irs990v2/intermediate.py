@@ -0,0 +1,258 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import hashlib
+import json
+import os
+import sqlite3
+import typing
+import xml.etree.ElementTree as ET
+import zlib
+from typing import Callable, Generator
+
+from .batch import RowBatch, RowSchema
+from .catalog import CatalogEntry
+from .errors import ErrorSink, Failure
+from .flat import FlatFiling
+from .mapping import SchemaMapping
+from .metrics import Metrics
+from .plan import ExtractionPlan
+from .predicate import FilingPredicate
+
+class IntermediateStore():
+    '''
+    Flattened filings kept from a parse, so the corpus can be extracted again after a mapping change
+    without inflating and parsing the XML.
+
+    Each filing is stored under its member name and CRC, with its archive, its returnVersion, its FlatFiling records and
+    the rows extracted when it was stored, along with a hash of the mapping of every column those rows
+    came from.  Extracting from the store compares those hashes with the current mappings: a filing whose
+    columns all map as before is answered from its stored rows without decoding its records, and otherwise
+    only the changed columns are extracted from the records, or a whole form when its base path changed.
+    The stored rows are then brought up to date, so the next run reuses them.
+    '''
+    BATCH_SIZE = 1000
+
+    path: str
+
+    def __init__(self, path: typing.Union[str, os.PathLike], batch_size: int = BATCH_SIZE):
+        '''
+        Constructor
+        '''
+        self.path = os.fspath(path)
+        self.batch_size = batch_size
+        # Worker processes of a run share the store, each with its own connection
+        self._connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS filings (member TEXT, crc INTEGER, archive TEXT, '
+                                 'version TEXT, records BLOB, mappings INTEGER, rows BLOB, PRIMARY KEY (member, crc))')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS mappings (id INTEGER PRIMARY KEY, hashes TEXT UNIQUE)')
+        self._pending = list()
+        self._updates = list()
+        self._hashes = dict()
+        self._mapping_ids = dict()
+        self._stored = dict()
+        self._plans = dict()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT count(*) FROM filings').fetchone()[0]
+
+    def add(self, entry: CatalogEntry, root: ET.Element, plan: ExtractionPlan, header: tuple,
+            details: dict[str, list[tuple]]):
+        """Store a parsed filing with the rows extracted from it, replacing any earlier copy"""
+        hashes = self._hashed(plan, tuple(details))
+        self._pending.append((entry.name, entry.crc, os.path.abspath(entry.archive), root.get('returnVersion'),
+                              FlatFiling.from_element(root).dumps(), self._mapping_id(hashes),
+                              self._rows(header, details)))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    def sync(self) -> int:
+        """Commit the filings stored so far and return how many the store holds"""
+        self._flush()
+        return len(self)
+
+    def close(self):
+        self._flush()
+        self._connection.close()
+
+    def extract(self, forms: list[str], predicate: FilingPredicate = None,
+                accept: Callable[[str, str, int], bool] = None, metrics: Metrics = None,
+                errors: ErrorSink = None) -> Generator[tuple[tuple[str, str, int], dict[str, RowBatch]], None, None]:
+        """Extract the stored filings with the current mappings, yielding the (archive, member, crc) of each with its rows.
+
+        accept filters the filings on their key before anything of theirs is decoded.  A filing that fails
+        to extract is yielded with None, and recorded in errors if given.
+        """
+        last = 0
+        while True:
+            batch = self._connection.execute('SELECT rowid, archive, member, crc, version, mappings, rows FROM filings '
+                                             'WHERE rowid > ? ORDER BY rowid LIMIT ?', (last, self.batch_size)).fetchall()
+            if not batch:
+                break
+            last = batch[-1][0]
+            for rowid, archive, member, crc, version, mappings, rows in batch:
+                key = (archive, member, crc)
+                if accept is not None and not accept(*key):
+                    continue
+                if predicate is not None and not predicate.accepts_version(version):
+                    continue
+                try:
+                    header, details = self._extract(rowid, version, forms, mappings, rows, metrics)
+                except Exception as e:
+                    failure = Failure(member, 'extract', type(e).__name__, str(e))
+                    if errors is None:
+                        print(f'Error processing {member}:')
+                        print(repr(e))
+                    else:
+                        errors.record(failure)
+                    yield key, None
+                    continue
+                if errors is not None:
+                    errors.parsed()
+
+                plan = ExtractionPlan.for_schema(version)
+                if predicate is not None and not predicate.accepts_header(dict(zip(plan.HEADER, header))):
+                    continue
+                batches = dict()
+                for form in forms:
+                    schema = RowSchema.for_form(form)
+                    rows = schema.rows(plan, header, details[form])
+                    batches[form] = RowBatch(schema, rows, [(header, len(rows))])
+                yield key, batches
+            self._flush()
+        self._flush()
+
+    def _extract(self, rowid: int, version: str, forms: list[str], mapping_id: int, rows: bytes,
+                 metrics: Metrics = None) -> tuple[tuple, dict[str, list[tuple]]]:
+        """Return the header and rows of a stored filing under the current mappings, extracting only what changed"""
+        plan = ExtractionPlan.for_schema(version)
+        current = self._hashed(plan, tuple(forms))
+        stored = self._stored_hashes(mapping_id)
+        stored_rows = json.loads(zlib.decompress(rows))
+
+        header_changed = [column for column in plan.HEADER if current['header'][column] != stored['header'].get(column)]
+        changed = dict()
+        for form in forms:
+            old = stored['forms'].get(form)
+            new = current['forms'][form]
+            if old is None or old['base'] != new['base']:
+                changed[form] = None
+            else:
+                columns = [column for column in new['columns'] if new['columns'][column] != old['columns'].get(column)]
+                if columns:
+                    changed[form] = columns
+
+        if not header_changed and not changed:
+            if metrics is not None:
+                metrics.count('store_reused')
+            return tuple(stored_rows['header']), {form: self._reorder(stored_rows['forms'][form], stored['forms'][form],
+                                                                      plan.columns[form]) for form in forms}
+
+        if metrics is not None:
+            metrics.count('store_reextracted')
+        filing = FlatFiling.loads(self._connection.execute('SELECT records FROM filings WHERE rowid = ?',
+                                                           (rowid,)).fetchone()[0])
+        subplan = self._subplan(plan, tuple(header_changed), tuple((form, None if columns is None else tuple(columns))
+                                                                 for form, columns in changed.items()))
+        sub_header, sub_details = subplan.extract_records(filing, list(changed))
+
+        header = tuple(sub_header[i] if column in header_changed else stored_rows['header'][i]
+                       for i, column in enumerate(plan.HEADER))
+        details = dict()
+        for form in forms:
+            if form not in changed:
+                details[form] = self._reorder(stored_rows['forms'][form], stored['forms'][form], plan.columns[form])
+            elif changed[form] is None:
+                details[form] = sub_details[form]
+            else:
+                old = self._reorder(stored_rows['forms'][form], stored['forms'][form], plan.columns[form])
+                positions = {column: i for i, column in enumerate(subplan.columns[form])}
+                details[form] = [tuple(new[positions[column]] if column in positions else value
+                                       for column, value in zip(plan.columns[form], values))
+                                 for values, new in zip(old, sub_details[form])]
+
+        # The stored rows of forms not asked for keep their own mappings
+        hashes = {'header': current['header'], 'forms': stored['forms'] | current['forms']}
+        kept = {form: rows for form, rows in stored_rows['forms'].items() if form not in forms}
+        self._updates.append((self._mapping_id(hashes), self._rows(header, details | kept), rowid))
+        return header, details
+
+    @staticmethod
+    def _reorder(rows: list[list], stored: dict, columns: tuple[str, ...]) -> list[tuple]:
+        """Return stored rows with their values in the order of the plan's columns"""
+        order = tuple(stored['columns'])
+        if order == columns:
+            return [tuple(values) for values in rows]
+        # A column mapped since the rows were stored has no value yet
+        positions = {column: i for i, column in enumerate(order)}
+        layout = [positions.get(column) for column in columns]
+        return [tuple(None if i is None else values[i] for i in layout) for values in rows]
+
+    def _subplan(self, plan: ExtractionPlan, header: tuple[str, ...],
+                 forms: tuple[tuple[str, tuple[str, ...]], ...]) -> ExtractionPlan:
+        """Return a plan extracting only the changed header columns and form columns, all of a form given None"""
+        # Plans are compiled once per snapshot, so a plan stands for the mappings it was compiled from
+        key = (plan, header, forms)
+        if key not in self._plans:
+            mapping = plan.mapping
+            columns = dict(forms)
+            self._plans[key] = ExtractionPlan(SchemaMapping(
+                mapping.schema,
+                tuple(path if column in header else '' for column, path in zip(plan.HEADER, mapping.header)),
+                tuple((form, base_path, tuple((column, path) for column, path in fields
+                                              if columns[form] is None or column in columns[form]))
+                      for form, base_path, fields in mapping.forms if form in columns)))
+        return self._plans[key]
+
+    def _hashed(self, plan: ExtractionPlan, forms: tuple[str, ...]) -> dict:
+        """Return the hash of the mapping of each header column, and of each form's base path and columns"""
+        key = (plan, forms)
+        if key not in self._hashes:
+            mapping = plan.mapping
+            self._hashes[key] = {
+                'header': {column: _hash(path) for column, path in zip(plan.HEADER, mapping.header)},
+                'forms': {form: {'base': _hash(mapping.base_path(form)),
+                                 'columns': {column: _hash(path) for column, path in mapping.fields(form)}}
+                          for form in forms}}
+        return self._hashes[key]
+
+    def _mapping_id(self, hashes: dict) -> int:
+        # The columns are kept in the order of the stored rows' values
+        text = json.dumps(hashes)
+        if text not in self._mapping_ids:
+            self._connection.execute('INSERT OR IGNORE INTO mappings (hashes) VALUES (?)', (text,))
+            self._mapping_ids[text] = self._connection.execute('SELECT id FROM mappings WHERE hashes = ?',
+                                                               (text,)).fetchone()[0]
+        return self._mapping_ids[text]
+
+    def _stored_hashes(self, mapping_id: int) -> dict:
+        if mapping_id not in self._stored:
+            text = self._connection.execute('SELECT hashes FROM mappings WHERE id = ?', (mapping_id,)).fetchone()[0]
+            self._stored[mapping_id] = json.loads(text)
+        return self._stored[mapping_id]
+
+    @staticmethod
+    def _rows(header: tuple, details: dict[str, list[tuple]]) -> bytes:
+        return zlib.compress(json.dumps({'header': header, 'forms': details}, separators=(',', ':')).encode())
+
+    def _flush(self):
+        if not self._pending and not self._updates:
+            return
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._connection.executemany('INSERT OR REPLACE INTO filings VALUES (?, ?, ?, ?, ?, ?, ?)', self._pending)
+            self._connection.executemany('UPDATE filings SET mappings = ?, rows = ? WHERE rowid = ?', self._updates)
+            self._connection.execute('COMMIT')
+        except:
+            self._connection.execute('ROLLBACK')
+            raise
+        self._pending = list()
+        self._updates = list()
+
+
+def _hash(path: str) -> str:
+    return hashlib.sha1(path.encode()).hexdigest()[:12]
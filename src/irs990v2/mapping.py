@@ -5,7 +5,16 @@ Created on Dec 22, 2023
 '''
 import configparser
 from functools import cache
+import hashlib
 import importlib.resources
+import json
+import os
+import re
+import typing
+from pathlib import Path
+from typing import NamedTuple
+
+from .catalog import cache_home
 
 class Mapping():
     '''
@@ -71,13 +80,185 @@ class Mapping():
             return config_parser
     
     @classmethod
-    def all_mappings(cls, form: str) -> set[str]:
-        mappings = set()
+    def forms(cls) -> list[str]:
+        """Return the forms that can be extracted, in the order of the template."""
+        return list(MappingSnapshot.current().forms())
+
+    @classmethod
+    def all_mappings(cls, form: str) -> list[str]:
+        """Return the output columns of the form, in the order of the template."""
+        return list(MappingSnapshot.current().form_columns(form))
+
+    @classmethod
+    def column_types(cls, form: str) -> dict[str, str]:
+        """Return the types of the typed output columns of the form; all other columns are strings."""
+        return MappingSnapshot.current().column_types(form)
+
+
+class SchemaMapping(NamedTuple):
+    '''
+    Mappings of one schema: the header paths, and the base path and ordered fields of each form
+    '''
+    schema: str
+    header: tuple[str, ...]
+    forms: tuple[tuple[str, str, tuple[tuple[str, str], ...]], ...]
+
+    def base_path(self, form: str) -> str:
+        return self._form(form)[1]
+
+    def fields(self, form: str) -> tuple[tuple[str, str], ...]:
+        return self._form(form)[2]
+
+    def _form(self, form: str) -> tuple[str, str, tuple[tuple[str, str], ...]]:
+        for f in self.forms:
+            if f[0] == form:
+                return f
+        raise KeyError(form)
+
+
+class MappingSnapshot(NamedTuple):
+    '''
+    Immutable, picklable compilation of all the mapping files.
+
+    The snapshot is compiled once and cached on disk as JSON under a hash of the ini files, so later runs
+    load it with a single JSON parse instead of parsing every ini file again, and worker processes are
+    handed it when they start.  Editing a mapping file changes the hash, which compiles a new snapshot.
+    The cache is JSON rather than a pickle so that loading a file from a shared cache directory cannot
+    run code.
+    '''
+    digest: str
+    schemas: tuple[SchemaMapping, ...]
+    columns: tuple[tuple[str, tuple[str, ...]], ...]
+    types: tuple[tuple[str, tuple[tuple[str, str], ...]], ...]
+
+    VERSION = 1
+    HEADER = ('EIN', 'Name', 'ReturnType', 'TaxYear', 'TaxPeriodStartDate', 'TaxPeriodEndDate')
+    # The output columns of the header, which every row of every form starts with
+    COLUMNS = ('ein', 'name', 'returntype', 'taxyear', 'taxperiodstart', 'taxperiodend')
+
+    def schema(self, schema_version: str) -> SchemaMapping:
+        """Return the mappings for a filing's returnVersion"""
+        schema = schema_version[:schema_version.rindex('v')]
+        for mapping in self.schemas:
+            if mapping.schema == schema:
+                return mapping
+        raise KeyError(f'No mapping for schema {schema_version}')
+
+    def forms(self) -> tuple[str, ...]:
+        """Return the forms of the template that are mapped for at least one schema"""
+        mapped = {form for mapping in self.schemas for form, _, _ in mapping.forms}
+        return tuple(form for form, columns in self.columns if columns and form in mapped)
+
+    def form_columns(self, form: str) -> tuple[str, ...]:
+        return dict(self.columns)[form]
+
+    def column_types(self, form: str) -> dict[str, str]:
+        types = dict(self.types)
+        return dict(types.get('Common', ())) | dict(types.get(form, ()))
+
+    @classmethod
+    def compile(cls, digest: str = None) -> 'MappingSnapshot':
+        """Compile the snapshot from the ini files"""
+        schemas = list()
+        for schema in cls._schemas():
+            config = Mapping.load_mappings(schema)
+            header = tuple(config.get('Common', name) for name in cls.HEADER)
+            forms = tuple((form, config.get('Common', form), tuple(config.items(form)))
+                          for form in config.sections()
+                          if form != 'Common' and config.has_option('Common', form))
+            for form, _, fields in forms:
+                cls._check_columns(f'{schema}.ini', form, [name for name, _ in fields])
+            schemas.append(SchemaMapping(schema, header, forms))
+
+        template = configparser.ConfigParser()
+        template.read_string(importlib.resources.files('irs990v2').joinpath('template.ini').read_text())
+        columns = tuple((form, tuple(name for name, _ in template.items(form)))
+                        for form in template.sections() if not form.endswith(' Types') and form != 'Common')
+        for form, names in columns:
+            cls._check_columns('template.ini', form, names)
+        types = tuple((form.removesuffix(' Types'), tuple(template.items(form)))
+                      for form in template.sections() if form.endswith(' Types'))
+
+        return cls(digest or cls._digest(), tuple(schemas), columns, types)
+
+    @classmethod
+    @cache
+    def load(cls, cache_dir: typing.Union[str, os.PathLike] = None) -> 'MappingSnapshot':
+        """Load the snapshot cached for the current ini files, compiling and caching it if there is none"""
+        digest = cls._digest()
+        path = Path(cache_dir) if cache_dir else cache_home()
+        path = path.joinpath(f'mappings-{digest[:16]}.json')
+
+        try:
+            with open(path, 'r') as f:
+                snapshot = cls.from_dict(json.load(f))
+            if snapshot.digest == digest:
+                return snapshot
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        snapshot = cls.compile(digest)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+            with open(tmp, 'w') as f:
+                f.write(json.dumps(snapshot.to_dict(), separators=(',', ':')))
+            os.replace(tmp, path)
+        except OSError:
+            # Without a writable cache the snapshot is compiled by every process
+            pass
+        return snapshot
+
+    def to_dict(self) -> dict:
+        return {'version': self.VERSION, 'digest': self.digest, 'schemas': self.schemas, 'columns': self.columns,
+                'types': self.types}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'MappingSnapshot':
+        """Rebuild a snapshot from its JSON form, with the tuples JSON turned into lists"""
+        if data['version'] != cls.VERSION:
+            raise ValueError(f'Mapping snapshot version {data["version"]} is not {cls.VERSION}')
+        schemas = tuple(SchemaMapping(schema, tuple(header),
+                                      tuple((form, base, tuple(map(tuple, fields))) for form, base, fields in forms))
+                        for schema, header, forms in data['schemas'])
+        columns = tuple((form, tuple(names)) for form, names in data['columns'])
+        types = tuple((form, tuple(map(tuple, items))) for form, items in data['types'])
+        return cls(data['digest'], schemas, columns, types)
+
+    @classmethod
+    def current(cls) -> 'MappingSnapshot':
+        """Return the snapshot in use by this process"""
+        global _current
+        if _current is None:
+            _current = cls.load()
+        return _current
+
+    @classmethod
+    def install(cls, snapshot: 'MappingSnapshot'):
+        """Use a snapshot loaded elsewhere, such as the one a worker process is started with"""
+        global _current
+        _current = snapshot
+
+    @classmethod
+    def _check_columns(cls, source: str, form: str, names: typing.Iterable[str]):
+        """Reject form columns named like a header column, which would overwrite the filing's value in each row"""
+        reused = [name for name in names if name in cls.COLUMNS or name in map(str.lower, cls.HEADER)]
+        if reused:
+            raise ValueError(f'The {form} columns {", ".join(reused)} of {source} are named like header columns')
+
+    @classmethod
+    def _schemas(cls) -> list[str]:
+        return sorted(f.name.removesuffix('.ini') for f in importlib.resources.files('irs990v2').iterdir()
+                      if re.fullmatch(r'[0-9]{4}\.ini', f.name))
+
+    @classmethod
+    def _digest(cls) -> str:
+        digest = hashlib.sha256(f'{cls.VERSION}'.encode())
+        files = importlib.resources.files('irs990v2')
+        for name in cls._schemas() + ['template']:
+            digest.update(name.encode())
+            digest.update(files.joinpath(f'{name}.ini').read_bytes())
+        return digest.hexdigest()
 
-        with importlib.resources.open_text('irs990v2', 'template.ini') as mapping_file:
-            config = configparser.ConfigParser()
-            config.read_file(mapping_file)
-            for name, _ in config.items(form):
-                mappings.add(name)
 
-        return mappings
\ No newline at end of file
+_current: MappingSnapshot = None
\ No newline at end of file
@@ -0,0 +1,105 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import json
+import os
+import typing
+from typing import Iterable
+
+from .catalog import object_id
+from .checkpoint import Checkpoint
+from .index import Index
+from .output import SINKS
+from .predicate import FilingPredicate
+from .shard import Shard
+
+class MergeError(ValueError):
+    '''
+    Raised when the shards of a run do not add up to the whole run
+    '''
+
+
+class ShardMerge():
+    '''
+    Merge of the outputs of every shard of a run into one output per form.
+
+    The shards are checked before anything is written: all of them must have finished, every filing
+    must have been committed by the one shard owning it and by no other, and with an index every filing
+    it lists must have been committed by some shard.  The outputs of each form are concatenated in shard
+    order, and a shard's rows are in the order it read its filings, so the merged files are the same
+    however often the merge is run.
+    '''
+
+    shards: list[Shard]
+    output_format: str
+    forms: list[str]
+    filings: int
+
+    def __init__(self, manifests: Iterable[typing.Union[str, os.PathLike]]):
+        '''
+        Constructor
+        '''
+        loaded = list()
+        for path in manifests:
+            with open(path, 'r') as f:
+                manifest = json.load(f)
+            manifest['directory'] = os.path.dirname(os.path.abspath(path))
+            loaded.append((Shard.parse(manifest['shard']), manifest))
+        if not loaded:
+            raise MergeError('No shard manifests to merge')
+        loaded.sort(key=lambda item: item[0].index)
+
+        self.shards = [shard for shard, _ in loaded]
+        self._manifests = [manifest for _, manifest in loaded]
+        count = self.shards[0].count
+        if any(shard.count != count for shard in self.shards):
+            raise MergeError('The manifests are from runs split into different numbers of shards')
+        indexes = [shard.index for shard in self.shards]
+        if len(set(indexes)) != len(indexes):
+            raise MergeError(f'A shard of {count} is listed more than once')
+        missing = sorted(set(range(count)) - set(indexes))
+        if missing:
+            raise MergeError(f'Shards {", ".join(f"{i}/{count}" for i in missing)} have not finished')
+
+        self.output_format = self._manifests[0]['format']
+        self.forms = list(self._manifests[0]['outputs'])
+        for shard, manifest in loaded:
+            if manifest['format'] != self.output_format or list(manifest['outputs']) != self.forms:
+                raise MergeError(f'Shard {shard} wrote different forms or another format than shard {self.shards[0]}')
+        self.filings = 0
+
+    def check(self, index: typing.TextIO = None, predicate: FilingPredicate = None, dedup: str = None):
+        """Raise MergeError unless every filing was committed by exactly its own shard, and by one for every filing of the index"""
+        owners = dict()
+        for shard, manifest in zip(self.shards, self._manifests):
+            for _, member, _ in Checkpoint.committed(self._path(manifest, manifest['checkpoint'])):
+                objectid = object_id(member)
+                if not shard.owns(objectid):
+                    raise MergeError(f'Shard {shard} committed {member}, which belongs to another shard')
+                # A shard commits a filing again when it is retried from the quarantine
+                if owners.setdefault(objectid, shard) != shard:
+                    raise MergeError(f'{member} was committed by both shards {owners[objectid]} and {shard}')
+        self.filings = len(owners)
+
+        if index is not None:
+            missing = [record['OBJECT_ID'] for record in Index.indexed(index, predicate, dedup=dedup)
+                       if record['OBJECT_ID'] not in owners]
+            if missing:
+                raise MergeError(f'{len(missing)} filings of the index were not committed by any shard, '
+                                 f'such as {", ".join(missing[:5])}')
+
+    def merge(self, directory: typing.Union[str, os.PathLike], prefix: str) -> dict[str, str]:
+        """Write the merged output of every form, returning the path of each"""
+        options = dict()
+        if self.output_format == 'sqlite':
+            options['database'] = os.path.join(directory, f'{prefix}.sqlite')
+        sink = SINKS[self.output_format]
+        return {form: sink.merge([self._path(manifest, manifest['outputs'][form]) for manifest in self._manifests],
+                                 os.path.join(directory, f'{prefix}-{form}'), table=form, **options)
+                for form in self.forms}
+
+    @staticmethod
+    def _path(manifest: dict, path: str) -> str:
+        return os.path.join(manifest['directory'], path)
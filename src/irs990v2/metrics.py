@@ -0,0 +1,206 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import collections
+import heapq
+import json
+import math
+import os
+import sys
+import threading
+import time
+import typing
+from contextlib import contextmanager
+
+class Metrics():
+    '''
+    Stage timers, counters and the slowest filings of a run.
+
+    Timers accumulate the seconds spent in each stage and the number of times it ran.  Metrics
+    gathered in worker processes are sent back with to_dict and added in with merge.
+    '''
+
+    top: int
+    timers: dict[str, list]
+    counters: dict[str, int]
+
+    def __init__(self, top: int = 20):
+        '''
+        Constructor
+        '''
+        self.top = top
+        self.timers = dict()
+        self.counters = dict()
+        self._slowest = list()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time the enclosed block as a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        timer = self.timers.setdefault(stage, [0.0, 0])
+        timer[0] += seconds
+        timer[1] += calls
+
+    def count(self, counter: str, n: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def filing(self, name: str, seconds: float, size: int, version: str):
+        """Record the time taken by a filing, keeping only the slowest"""
+        item = (seconds, name or '', size, version or '')
+        if len(self._slowest) < self.top:
+            heapq.heappush(self._slowest, item)
+        elif item > self._slowest[0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def reader(self, filing: typing.IO) -> 'TimedReader':
+        """Wrap a filing so the time spent reading (and inflating) it and its size are recorded"""
+        return TimedReader(filing, self)
+
+    def merge(self, other: dict):
+        """Add in the metrics of another process, as returned by its to_dict"""
+        for stage, timer in other['timers'].items():
+            self.add_time(stage, timer['seconds'], timer['calls'])
+        for counter, n in other['counters'].items():
+            self.count(counter, n)
+        for item in other['slowest']:
+            self.filing(item['filing'], item['seconds'], item['bytes'], item['version'])
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
+        self._slowest.clear()
+
+    def to_dict(self) -> dict:
+        return {'elapsed': round(time.perf_counter() - self._start, 3),
+                'timers': {stage: {'seconds': round(seconds, 6), 'calls': calls}
+                           for stage, (seconds, calls) in sorted(self.timers.items())},
+                'counters': dict(sorted(self.counters.items())),
+                'slowest': [{'filing': name, 'seconds': round(seconds, 6), 'bytes': size, 'version': version}
+                            for seconds, name, size, version in sorted(self._slowest, reverse=True)]}
+
+    def write(self, path: typing.Union[str, os.PathLike]):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class TimedReader():
+    '''
+    File wrapper recording the time spent in read calls and the amount read
+    '''
+
+    def __init__(self, file: typing.IO, metrics: Metrics):
+        '''
+        Constructor
+        '''
+        self.file = file
+        self.metrics = metrics
+        self.name = getattr(file, 'name', None)
+        self.seconds = 0.0
+        self.size = 0
+
+    def read(self, size: int = -1):
+        start = time.perf_counter()
+        data = self.file.read(size)
+        self.seconds += time.perf_counter() - start
+        self.size += len(data)
+        return data
+
+    def close(self):
+        """Add the reading time and size to the metrics"""
+        self.metrics.add_time('read', self.seconds)
+        self.metrics.count('bytes_read', self.size)
+
+
+class Latency():
+    '''
+    Latencies of the most recent requests, for percentiles over a sliding window
+    '''
+    PERCENTILES = (50, 90, 99)
+
+    window: int
+    count: int
+
+    def __init__(self, window: int = 10000):
+        '''
+        Constructor
+        '''
+        self.window = window
+        self.count = 0
+        self._recent = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._recent.append(seconds)
+            self.count += 1
+
+    def percentiles(self, percentiles: typing.Iterable[float] = PERCENTILES) -> dict[float, float]:
+        """Return the nearest-rank percentiles of the latencies in the window, in seconds"""
+        with self._lock:
+            recent = sorted(self._recent)
+        if not recent:
+            return dict()
+        return {p: recent[max(0, math.ceil(p / 100 * len(recent)) - 1)] for p in percentiles}
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            slowest = max(self._recent, default=None)
+        result = {'count': self.count}
+        for p, seconds in self.percentiles().items():
+            result[f'p{p:g}_ms'] = round(seconds * 1000, 3)
+        if slowest is not None:
+            result['max_ms'] = round(slowest * 1000, 3)
+        return result
+
+
+class Progress():
+    '''
+    Periodic progress line with the rate and estimated time remaining
+    '''
+
+    total: int
+    interval: float
+    done: int
+
+    def __init__(self, total: int, interval: float = 10.0, stream: typing.TextIO = None):
+        '''
+        Constructor
+        '''
+        self.total = total
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.done = 0
+        self._start = time.monotonic()
+        self._last = self._start
+
+    def update(self, n: int = 1):
+        self.done += n
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.report(now)
+
+    def report(self, now: float = None):
+        elapsed = (now or time.monotonic()) - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        line = f'{self.done} filings'
+        if self.total:
+            line = f'{self.done}/{self.total} filings ({100 * self.done / self.total:.1f}%)'
+        line += f' {rate:.1f} filings/sec'
+        if self.total and rate > 0:
+            line += f' ETA {_duration((self.total - self.done) / rate)}'
+        print(line, file=self.stream, flush=True)
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
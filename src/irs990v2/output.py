@@ -0,0 +1,737 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import csv
+import datetime
+import itertools
+import json
+import os
+import re
+import shutil
+import sqlite3
+import typing
+from typing import Iterable
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from .aggregate import Aggregate, QuantileSketch
+from .batch import RowBatch
+from .convert import Converter, numpy
+from .plan import ExtractionPlan
+
+class CsvSink():
+    '''
+    Output of the rows of one form to a CSV file.  With column types the values are normalized,
+    so amounts are plain integers, dates are ISO dates and indicators are True or False.
+    '''
+    EXTENSION = '.csv'
+
+    path: str
+    fieldnames: list[str]
+
+    def __init__(self, path: typing.Union[str, os.PathLike], fieldnames: list[str], offset: int = None,
+                 types: dict[str, str] = None, **options):
+        '''
+        Constructor
+        '''
+        self.path = os.fspath(path) + self.EXTENSION
+        self.fieldnames = fieldnames
+        self._converter = Converter(types) if types else None
+
+        if offset is None:
+            self._file = open(self.path, 'w', newline='')
+        else:
+            # Resuming: drop whatever was written after the last sync
+            self._file = open(self.path, 'r+', newline='')
+            self._file.truncate(offset)
+            self._file.seek(offset)
+
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def write(self, rows: Iterable[dict[str, str]]):
+        if self._converter is not None:
+            rows = self._converter.convert_rows(rows, self.fieldnames)
+        self._writer.writerows(rows)
+
+    def write_batch(self, batch: RowBatch):
+        """Write a batch of rows in the order of the sink's fields, without building a dict per row"""
+        rows = _rows(batch, self.fieldnames)
+        if self._converter is not None:
+            rows = self._converter.convert_tuples(rows, self.fieldnames)
+        self._writer.writer.writerows(rows)
+
+    def sync(self) -> int:
+        """Make the rows written so far durable and return the position to resume from"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+    @classmethod
+    def merge(cls, sources: list[typing.Union[str, os.PathLike]], path: typing.Union[str, os.PathLike], **options) -> str:
+        """Concatenate the CSV files of one form in order, keeping the header of the first, and return the path"""
+        target = os.fspath(path) + cls.EXTENSION
+        header = None
+        with open(target, 'wb') as out:
+            for source in sources:
+                with open(source, 'rb') as f:
+                    first = f.readline()
+                    if header is None:
+                        header = first
+                        out.write(header)
+                    elif first != header:
+                        raise ValueError(f'{source} does not have the columns of {sources[0]}')
+                    shutil.copyfileobj(f, out)
+        return target
+
+
+class ParquetSink():
+    '''
+    Output of the rows of one form to a Parquet dataset directory.
+
+    Rows are buffered by column, and each sync writes those buffered since the last one to a small delta
+    file, so every synced row is in a complete Parquet file.  Once the deltas of the current part hold
+    part_rows rows, and when the sink is closed, they are compacted into one part file of full row groups.
+    The offset of a sync is the number of complete parts and of deltas of the next one, so a resumed run
+    drops whatever was written after it.  A compacted part's deltas are only removed once a later sync has
+    been recorded, so a run resumed from before the compaction still has them.  The deltas are named with
+    a leading underscore, so readers of the dataset skip them.
+    '''
+    EXTENSION = '.parquet'
+    TYPES = {'string': 'string', 'int': 'int64', 'date': 'date32', 'bool': 'bool_'}
+    PART = re.compile(r'part-(\d{5})\.parquet$')
+    DELTA = re.compile(r'_delta-(\d{5})-(\d{5})\.parquet$')
+
+    path: str
+    fieldnames: list[str]
+    types: dict[str, str]
+    compression: str
+    row_group_size: int
+    part_rows: int
+
+    def __init__(self, path: typing.Union[str, os.PathLike], fieldnames: list[str], offset: list[int] = None,
+                 types: dict[str, str] = None, compression: str = 'zstd', row_group_size: int = 10000,
+                 part_rows: int = 500000, **options):
+        '''
+        Constructor
+        '''
+        if pyarrow is None:
+            raise ImportError('pyarrow is required for parquet output')
+
+        self.path = os.fspath(path) + self.EXTENSION
+        self.fieldnames = fieldnames
+        self.types = types or dict()
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.part_rows = part_rows
+        self.schema = pyarrow.schema([(name, self._type(self.types.get(name, 'string'))) for name in fieldnames])
+        self._converter = Converter(self.types)
+
+        os.makedirs(self.path, exist_ok=True)
+        # The offset of a sink that closed a part on every sync was the number of parts
+        parts, deltas = (offset or 0, 0) if not isinstance(offset, list) else offset
+        self._resume(parts, deltas)
+
+        self._columns = {name: list() for name in fieldnames}
+        self._buffered = 0
+        # Deltas compacted into a part since the last sync, and before it, removed on the next sync
+        self._compacted = list()
+        self._obsolete = list()
+
+    def write(self, rows: Iterable[dict[str, str]]):
+        columns = self._columns
+        for row in rows:
+            for name in self.fieldnames:
+                columns[name].append(row.get(name))
+            self._buffered += 1
+            if self._buffered >= self.row_group_size:
+                self._write_delta()
+
+    def write_batch(self, batch: RowBatch):
+        """Buffer a batch of rows, a column at a time"""
+        rows = _rows(batch, self.fieldnames)
+        if not rows:
+            return
+        for name, values in zip(self.fieldnames, zip(*rows)):
+            self._columns[name].extend(values)
+        self._buffered += len(rows)
+        if self._buffered >= self.row_group_size:
+            self._write_delta()
+
+    def sync(self) -> list[int]:
+        """Write the buffered rows to a delta, compacting the deltas into a part once they fill one, and return the
+        number of complete parts and of deltas"""
+        # The sync before this one has been recorded, so no resumed run needs these any more
+        for path in self._obsolete:
+            os.remove(path)
+        self._write_delta()
+        if self._delta_rows >= self.part_rows:
+            self._compact()
+        self._obsolete, self._compacted = self._compacted, list()
+        return [self._parts, self._deltas]
+
+    def close(self):
+        self._write_delta()
+        self._compact()
+        for path in self._obsolete + self._compacted:
+            os.remove(path)
+        self._obsolete, self._compacted = list(), list()
+
+    @classmethod
+    def merge(cls, sources: list[typing.Union[str, os.PathLike]], path: typing.Union[str, os.PathLike], **options) -> str:
+        """Copy the part files of one form's datasets into one dataset, in order, and return its path"""
+        if pyarrow is None:
+            raise ImportError('pyarrow is required for parquet output')
+
+        target = os.fspath(path) + cls.EXTENSION
+        os.makedirs(target, exist_ok=True)
+        for name in os.listdir(target):
+            if cls.PART.match(name) or cls.DELTA.match(name):
+                os.remove(os.path.join(target, name))
+
+        schema = None
+        part = 0
+        for source in sources:
+            for name in sorted(os.listdir(source)):
+                if not cls.PART.match(name):
+                    continue
+                file = os.path.join(source, name)
+                if schema is None:
+                    schema = pyarrow.parquet.read_schema(file)
+                elif not pyarrow.parquet.read_schema(file).equals(schema):
+                    raise ValueError(f'{file} does not have the columns of {sources[0]}')
+                shutil.copyfile(file, os.path.join(target, f'part-{part:05d}{cls.EXTENSION}'))
+                part += 1
+        return target
+
+    def _resume(self, parts: int, deltas: int):
+        """Remove the parts and deltas written after the sync that returned the offset"""
+        files = list()
+        for name in os.listdir(self.path):
+            match = self.PART.match(name) or self.DELTA.match(name)
+            if match:
+                files.append((name, int(match.group(1)), int(match.group(2)) if match.re is self.DELTA else None))
+        # Without its deltas, the next part was compacted from them when the sink was closed after the sync
+        compacted = deltas > 0 and not any(part == parts and delta is not None for _, part, delta in files)
+        for name, part, delta in files:
+            if delta is None:
+                keep = part < parts or (part == parts and compacted)
+            else:
+                keep = part == parts and delta < deltas and not compacted
+            if not keep:
+                os.remove(os.path.join(self.path, name))
+
+        self._parts = parts + 1 if compacted else parts
+        self._deltas = 0 if compacted else deltas
+        self._delta_rows = sum(pyarrow.parquet.ParquetFile(self._delta(self._parts, delta)).metadata.num_rows
+                         for delta in range(self._deltas))
+
+    def _write_delta(self):
+        if self._buffered == 0:
+            return
+        columns = self._converter.convert_columns(self._columns)
+        table = pyarrow.Table.from_arrays([self._array(columns[field.name], field.type) for field in self.schema],
+                                          schema=self.schema)
+        path = self._delta(self._parts, self._deltas)
+        pyarrow.parquet.write_table(table, path, row_group_size=self.row_group_size, compression=self.compression)
+        _fsync(path)
+        self._deltas += 1
+        self._delta_rows += self._buffered
+        for values in self._columns.values():
+            values.clear()
+        self._buffered = 0
+
+    def _compact(self):
+        """Rewrite the deltas of the current part as one part file, a full row group at a time"""
+        if self._deltas == 0:
+            return
+        deltas = [self._delta(self._parts, delta) for delta in range(self._deltas)]
+        path = self._part(self._parts)
+        with pyarrow.parquet.ParquetWriter(path, self.schema, compression=self.compression) as writer:
+            pending = list()
+            rows = 0
+            for delta in deltas:
+                table = pyarrow.parquet.read_table(delta, schema=self.schema)
+                pending.append(table)
+                rows += table.num_rows
+                if rows >= self.row_group_size:
+                    table = pyarrow.concat_tables(pending).combine_chunks()
+                    full = rows - rows % self.row_group_size
+                    writer.write_table(table.slice(0, full), row_group_size=self.row_group_size)
+                    pending = [table.slice(full)]
+                    rows -= full
+            if rows:
+                writer.write_table(pyarrow.concat_tables(pending).combine_chunks(), row_group_size=self.row_group_size)
+        _fsync(path)
+        self._compacted.extend(deltas)
+        self._parts += 1
+        self._deltas = 0
+        self._delta_rows = 0
+
+    def _delta(self, part: int, delta: int) -> str:
+        return os.path.join(self.path, f'_delta-{part:05d}-{delta:05d}{self.EXTENSION}')
+
+    def _part(self, part: int) -> str:
+        return os.path.join(self.path, f'part-{part:05d}{self.EXTENSION}')
+
+    @staticmethod
+    def _array(values, arrow_type):
+        if numpy is not None and isinstance(values, numpy.ma.MaskedArray):
+            return pyarrow.array(values.data, mask=numpy.ma.getmaskarray(values), type=arrow_type)
+        return pyarrow.array(values, type=arrow_type)
+
+    @staticmethod
+    def _type(name: str):
+        return getattr(pyarrow, ParquetSink.TYPES[name])()
+
+
+class SqliteSink():
+    '''
+    Output of the rows of one form to a table of a SQLite database, for lookups by EIN and tax year.
+
+    Rows are inserted a batch at a time with executemany, in WAL mode, and only committed on each sync,
+    so a load runs in a few large transactions.  The sinks of the other forms in the same database share
+    its connection.  The indexes on (ein, taxyear) and (ein, taxperiodend) are built when the sink is
+    closed rather than kept up row by row.  Loading into a table that already has them, as an incremental
+    run does, upserts: the rows of each filing replace those loaded before for the same EIN and tax period,
+    and an amended filing with no rows of the form removes the rows loaded before.  A first load keeps the
+    same rule without the indexes: it records where the rows of each filing start in a side table, and on
+    close deletes the rows of every filing that a later one for the same EIN and tax period replaced.
+    Either way the last filing loaded for an EIN and tax period is the one kept.
+    '''
+    EXTENSION = '.sqlite'
+    TYPES = {'string': 'TEXT', 'int': 'INTEGER', 'date': 'TEXT', 'bool': 'INTEGER'}
+    KEY = ('ein', 'taxperiodend')
+    INDEXES = (('ein', 'taxyear'), ('ein', 'taxperiodend'))
+
+    _connections: dict[str, list] = dict()
+
+    path: str
+    table: str
+    fieldnames: list[str]
+    batch_size: int
+
+    def __init__(self, path: typing.Union[str, os.PathLike], fieldnames: list[str], offset: int = None,
+                 types: dict[str, str] = None, database: typing.Union[str, os.PathLike] = None, table: str = None,
+                 batch_size: int = 10000, **options):
+        '''
+        Constructor
+        '''
+        self.path = os.fspath(database) if database is not None else os.fspath(path) + self.EXTENSION
+        self.table = table or os.path.basename(path)
+        self.fieldnames = fieldnames
+        self.batch_size = batch_size
+        types = types or dict()
+        self._converter = Converter(types) if types else None
+        self._dates = [i for i, name in enumerate(fieldnames) if types.get(name) == 'date']
+        self._key = [fieldnames.index(name) for name in self.KEY]
+        self._header_key = [ExtractionPlan.HEADER.index(name) for name in self.KEY]
+        self._rows = list()
+        self._filings = list()
+
+        self._connection = self._connect(self.path)
+        columns = ', '.join(f'{self.quote(name)} {self.TYPES[types.get(name, "string")]}' for name in fieldnames)
+        self._execute(f'CREATE TABLE IF NOT EXISTS {self.quote(self.table)} ({columns})')
+        # A table from an earlier run gains the columns mapped since
+        existing = {row[1] for row in self._connection.execute(f'PRAGMA table_info({self.quote(self.table)})')}
+        for name in fieldnames:
+            if name not in existing:
+                self._execute(f'ALTER TABLE {self.quote(self.table)} ADD COLUMN {self.quote(name)} '
+                              f'{self.TYPES[types.get(name, "string")]}')
+        self._replace = self._connection.execute('SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?',
+                                                 ('index', self._index_name(self.table, self.KEY))).fetchone() is not None
+        if not self._replace:
+            key = ', '.join(f'{self.quote(name)} {self.TYPES[types.get(name, "string")]}' for name in self.KEY)
+            self._execute(f'CREATE TABLE IF NOT EXISTS {self.quote(self._filings_table(self.table))} '
+                          f'({key}, start INTEGER)')
+        if offset is not None:
+            # Resuming: drop whatever was committed after the last checkpoint.  A filing that starts right
+            # after it may have been committed with no rows, and is harmless to keep if it was not
+            self._execute(f'DELETE FROM {self.quote(self.table)} WHERE rowid > ?', (offset,))
+            if not self._replace:
+                self._execute(f'DELETE FROM {self.quote(self._filings_table(self.table))} WHERE start > ?', (offset + 1,))
+        # Rows are inserted without a rowid, so each gets the next one after the largest in the table
+        self._next = (self._connection.execute(f'SELECT max(rowid) FROM {self.quote(self.table)}').fetchone()[0] or 0) + 1
+
+        names = ', '.join(self.quote(name) for name in fieldnames)
+        self._insert = (f'INSERT INTO {self.quote(self.table)} ({names}) '
+                        f'VALUES ({", ".join("?" * len(fieldnames))})')
+        self._delete = (f'DELETE FROM {self.quote(self.table)} WHERE '
+                        + ' AND '.join(f'{self.quote(name)} IS ?' for name in self.KEY))
+
+    def write(self, rows: Iterable[dict[str, str]]):
+        if self._converter is not None:
+            rows = self._converter.convert_rows(rows, self.fieldnames)
+        rows = [[row.get(name) for name in self.fieldnames] for row in rows]
+        self._load(rows, None)
+
+    def write_batch(self, batch: RowBatch):
+        """Write a batch of rows, inserting the tuples as they are unless dates need formatting"""
+        rows = _rows(batch, self.fieldnames)
+        if self._converter is not None:
+            rows = self._converter.convert_tuples(rows, self.fieldnames)
+        if self._dates:
+            rows = [list(values) for values in rows]
+        # Keyed by the filings rather than the rows, so a filing with no rows still replaces its earlier ones
+        self._load(rows, self._filing_keys(batch.filings) if batch.filings else None)
+
+    def sync(self) -> int:
+        """Commit the rows written so far and return the last rowid, to resume from"""
+        self._flush()
+        if self._connection.in_transaction:
+            self._connection.execute('COMMIT')
+        return self._connection.execute(f'SELECT max(rowid) FROM {self.quote(self.table)}').fetchone()[0] or 0
+
+    def close(self):
+        self.sync()
+        self._index(self._connection, self.table)
+        if not self._replace:
+            self._deduplicate()
+        self._release(self.path)
+
+    @classmethod
+    def merge(cls, sources: list[typing.Union[str, os.PathLike]], path: typing.Union[str, os.PathLike],
+              database: typing.Union[str, os.PathLike] = None, table: str = None, **options) -> str:
+        """Copy one form's table from each database into a new table, in order, and return the database path"""
+        target = os.fspath(database) if database is not None else os.fspath(path) + cls.EXTENSION
+        name = table or os.path.basename(path)
+        table = cls.quote(name)
+        connection = cls._connect(target)
+        try:
+            connection.execute(f'DROP TABLE IF EXISTS {table}')
+            for i, source in enumerate(sources):
+                connection.execute('ATTACH DATABASE ? AS source', (os.fspath(source),))
+                try:
+                    columns = [(row[1], row[2]) for row in connection.execute(f'PRAGMA source.table_info({table})')]
+                    if i == 0:
+                        connection.execute(f'CREATE TABLE {table} '
+                                           f'({", ".join(f"{cls.quote(name)} {decl}" for name, decl in columns)})')
+                        names = ', '.join(cls.quote(name) for name, _ in columns)
+                        first = columns
+                    elif columns != first:
+                        raise ValueError(f'{source} does not have the columns of {sources[0]}')
+                    connection.execute(f'INSERT INTO {table} ({names}) SELECT {names} FROM source.{table} ORDER BY rowid')
+                finally:
+                    connection.execute('DETACH DATABASE source')
+            cls._index(connection, name)
+        finally:
+            cls._release(target)
+        return target
+
+    def _load(self, batch: list[typing.Sequence], filings: list[tuple[tuple, int]]):
+        """Load rows with the key and row count of each filing they belong to, or of each run of rows of a key"""
+        for i in self._dates:
+            for values in batch:
+                if values[i] is not None:
+                    values[i] = values[i].isoformat()
+        if filings is None:
+            filings = [(key, len(list(run))) for key, run in
+                       itertools.groupby(batch, lambda values: tuple(values[i] for i in self._key))]
+
+        if self._replace:
+            # An original and its amendment in the same batch leave only the rows of the later
+            last = {key: i for i, (key, _) in enumerate(filings)}
+            rows = list()
+            start = 0
+            for i, (key, count) in enumerate(filings):
+                if last[key] == i:
+                    rows.extend(batch[start:start + count])
+                start += count
+            # The rows of a filing are written together, so its earlier rows are deleted before any are inserted
+            self._flush()
+            self._execute(self._delete, last, many=True)
+            self._execute(self._insert, rows, many=True)
+            return
+
+        start = self._next + len(self._rows)
+        for key, count in filings:
+            self._filings.append(key + (start,))
+            start += count
+        self._rows.extend(batch)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._execute(self._insert, self._rows, many=True)
+            self._next += len(self._rows)
+            self._rows = list()
+        if self._filings:
+            self._execute(f'INSERT INTO {self.quote(self._filings_table(self.table))} VALUES (?, ?, ?)',
+                          self._filings, many=True)
+            self._filings = list()
+
+    def _deduplicate(self):
+        """Delete the rows of each filing of a first load that a later filing for its key replaced"""
+        filings = self.quote(self._filings_table(self.table))
+        table = self.quote(self.table)
+        key = ', '.join(self.quote(name) for name in self.KEY)
+        # The rows of a key that start before those of its last filing are the ones of the filings it replaced
+        self._execute(f'DELETE FROM {table} WHERE rowid IN (SELECT {table}.rowid FROM '
+                      f'(SELECT {key}, max(start) AS start FROM {filings} GROUP BY {key} HAVING count(*) > 1) AS last '
+                      f'JOIN {table} ON '
+                      + ' AND '.join(f'{table}.{self.quote(name)} IS last.{self.quote(name)}' for name in self.KEY)
+                      + f' AND {table}.rowid < last.start)')
+        self._execute(f'DROP TABLE {filings}')
+        self._connection.execute('COMMIT')
+
+    def _filing_keys(self, filings: list[tuple[tuple, int]]) -> list[tuple[tuple, int]]:
+        """Return the key of each filing a batch was extracted from, as the values stored in the table, with its row count"""
+        keys = [tuple(header[i] for i in self._header_key) for header, _ in filings]
+        if self._converter is not None:
+            keys = self._converter.convert_tuples(keys, self.KEY)
+        return [(tuple(value.isoformat() if isinstance(value, datetime.date) else value for value in key), count)
+                for key, (_, count) in zip(keys, filings)]
+
+    def _execute(self, sql: str, parameters=(), many: bool = False):
+        if not self._connection.in_transaction:
+            self._connection.execute('BEGIN')
+        if many:
+            self._connection.executemany(sql, parameters)
+        else:
+            self._connection.execute(sql, parameters)
+
+    @classmethod
+    def _index(cls, connection: sqlite3.Connection, table: str):
+        """Build the lookup indexes of a table once its rows are loaded"""
+        for columns in cls.INDEXES:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS {cls.quote(cls._index_name(table, columns))} '
+                               f'ON {cls.quote(table)} ({", ".join(cls.quote(c) for c in columns)})')
+
+    @staticmethod
+    def _index_name(table: str, columns: tuple[str, ...]) -> str:
+        return '_'.join((table,) + columns)
+
+    @staticmethod
+    def _filings_table(table: str) -> str:
+        return f'{table}_filings'
+
+    @classmethod
+    def _connect(cls, path: str) -> sqlite3.Connection:
+        """Return the connection to a database, shared by the sinks writing to it"""
+        if path not in cls._connections:
+            connection = sqlite3.connect(path, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            cls._connections[path] = [connection, 0]
+        cls._connections[path][1] += 1
+        return cls._connections[path][0]
+
+    @classmethod
+    def _release(cls, path: str):
+        cls._connections[path][1] -= 1
+        if cls._connections[path][1] == 0:
+            cls._connections.pop(path)[0].close()
+
+    @staticmethod
+    def quote(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+
+class AggregateSink():
+    '''
+    Output of a summary of the amount columns of one form, by tax year and return type by default,
+    instead of its rows.
+
+    Rows are buffered as tuples and added to an Aggregate a column batch at a time, so the output is a
+    small table of counts, sums, means, extremes and quantiles per group and column, written to a CSV
+    file when the sink is closed.  Each sync saves the aggregate to a JSON state file, keeping the state
+    of the sync before, so a resumed run starts from the state of its last checkpoint; the states of
+    shards are merged into the summary of the whole run.
+    '''
+    EXTENSION = '.aggregate.json'
+    SUMMARY = '.summary.csv'
+
+    path: str
+    fieldnames: list[str]
+    batch_size: int
+    aggregate: Aggregate
+
+    def __init__(self, path: typing.Union[str, os.PathLike], fieldnames: list[str], offset: int = None,
+                 types: dict[str, str] = None, table: str = None, group_by: typing.Sequence[str] = Aggregate.GROUP_BY,
+                 aggregate: typing.Sequence[str] = None, quantiles: typing.Sequence[float] = Aggregate.QUANTILES,
+                 accuracy: float = QuantileSketch.ACCURACY, batch_size: int = 10000, **options):
+        '''
+        Constructor
+        '''
+        if numpy is None:
+            raise ImportError('numpy is required for aggregate output')
+
+        self.path = os.fspath(path) + self.EXTENSION
+        self.fieldnames = fieldnames
+        self.batch_size = batch_size
+        aggregate = self.columns(table or os.path.basename(path), fieldnames, types, group_by, aggregate)
+        self._keys = [fieldnames.index(name) for name in group_by]
+        self._values = [fieldnames.index(name) for name in aggregate]
+        self._rows = list()
+        self._changed = False
+
+        if offset is None:
+            self.aggregate = Aggregate(table or os.path.basename(path), group_by, aggregate, quantiles, accuracy)
+            self._syncs = 0
+            for state in (self.path, self.path + '.previous'):
+                if os.path.exists(state):
+                    os.remove(state)
+        else:
+            # Resuming: start from the state saved at the last checkpoint, which may be the one before the newest
+            self.aggregate = self._resume(offset)
+            self._syncs = offset
+
+    def write(self, rows: Iterable[dict[str, str]]):
+        self._rows.extend(tuple(row.get(name) for name in self.fieldnames) for row in rows)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def write_batch(self, batch: RowBatch):
+        """Buffer a batch of rows until there are enough to aggregate as columns"""
+        self._rows.extend(_rows(batch, self.fieldnames))
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def sync(self) -> int:
+        """Save the aggregate of the rows written so far and return the number of saves, to resume from"""
+        self._flush()
+        if self._changed or self._syncs == 0:
+            self._syncs += 1
+            if os.path.exists(self.path):
+                os.replace(self.path, self.path + '.previous')
+            self._save(self.path, self.aggregate, self._syncs)
+            self._changed = False
+        return self._syncs
+
+    def close(self):
+        self.sync()
+        self._write_summary(self.aggregate, self.path)
+
+    @classmethod
+    def merge(cls, sources: list[typing.Union[str, os.PathLike]], path: typing.Union[str, os.PathLike], **options) -> str:
+        """Merge the aggregates of one form into one, writing its state and summary, and return the state's path"""
+        target = os.fspath(path) + cls.EXTENSION
+        merged = None
+        for source in sources:
+            with open(source, 'r') as f:
+                aggregate = Aggregate.from_dict(json.load(f)['aggregate'])
+            if merged is None:
+                merged = aggregate
+            else:
+                try:
+                    merged.merge(aggregate)
+                except ValueError:
+                    raise ValueError(f'{source} does not have the columns of {sources[0]}')
+        cls._save(target, merged, 0)
+        cls._write_summary(merged, target)
+        return target
+
+    @classmethod
+    def summary_path(cls, path: typing.Union[str, os.PathLike]) -> str:
+        """Return the path of the summary table written next to an aggregate state file"""
+        return os.fspath(path).removesuffix(cls.EXTENSION) + cls.SUMMARY
+
+    @staticmethod
+    def add_arguments(argparser):
+        """Add the options of aggregate output to a command line parser"""
+        argparser.add_argument('--group-by', dest='group_by', nargs='*', default=list(Aggregate.GROUP_BY),
+                               help=f'columns to aggregate by with --format aggregate (default = {" ".join(Aggregate.GROUP_BY)})')
+        argparser.add_argument('--aggregate', dest='aggregate', nargs='+',
+                               help='columns to summarize with --format aggregate (default = every amount column of each form)')
+        argparser.add_argument('--quantiles', dest='quantiles', type=float, nargs='+', default=list(Aggregate.QUANTILES),
+                               help=f'quantiles to estimate (default = {" ".join(map(str, Aggregate.QUANTILES))})')
+        argparser.add_argument('--sketch-accuracy', dest='accuracy', type=float, default=QuantileSketch.ACCURACY,
+                               help=f'relative accuracy of the quantile estimates (default = {QuantileSketch.ACCURACY})')
+
+    @staticmethod
+    def columns(table: str, fieldnames: list[str], types: dict[str, str] = None,
+                group_by: typing.Sequence[str] = Aggregate.GROUP_BY, aggregate: typing.Sequence[str] = None,
+                **options) -> list[str]:
+        """Return the columns of a form to summarize, raising ValueError if there are none or some are not its columns"""
+        types = types or dict()
+        if aggregate is None:
+            # Every amount column of the form, the header columns only being grouped by
+            aggregate = [name for name in fieldnames[len(ExtractionPlan.HEADER):] if types.get(name) == 'int']
+            if not aggregate:
+                raise ValueError(f'{table} has no amount columns to aggregate')
+        for name in list(group_by) + list(aggregate):
+            if name not in fieldnames:
+                raise ValueError(f'{name} is not a column of {table}')
+        return list(aggregate)
+
+    @staticmethod
+    def options(args) -> dict:
+        """Return the sink options given on the command line"""
+        options = {'group_by': args.group_by, 'quantiles': args.quantiles, 'accuracy': args.accuracy}
+        if args.aggregate is not None:
+            options['aggregate'] = args.aggregate
+        return options
+
+    def _flush(self):
+        if not self._rows:
+            return
+        columns = list(zip(*self._rows))
+        self.aggregate.add([columns[i] for i in self._keys],
+                           [Converter.convert_column('int', columns[i]) for i in self._values])
+        self._rows = list()
+        self._changed = True
+
+    def _resume(self, offset: int) -> Aggregate:
+        for state in (self.path, self.path + '.previous'):
+            if os.path.exists(state):
+                with open(state, 'r') as f:
+                    saved = json.load(f)
+                if saved['syncs'] == offset:
+                    # Saved again as the newest state, dropping any saved after the checkpoint
+                    aggregate = Aggregate.from_dict(saved['aggregate'])
+                    self._save(self.path, aggregate, offset)
+                    if os.path.exists(self.path + '.previous'):
+                        os.remove(self.path + '.previous')
+                    return aggregate
+        raise ValueError(f'{self.path} does not have the aggregate saved at the checkpoint')
+
+    @staticmethod
+    def _save(path: str, aggregate: Aggregate, syncs: int):
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(json.dumps({'syncs': syncs, 'aggregate': aggregate.to_dict()}, separators=(',', ':')))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    @classmethod
+    def _write_summary(cls, aggregate: Aggregate, path: str):
+        with open(cls.summary_path(path), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(aggregate.fieldnames)
+            writer.writerows(aggregate.summary())
+
+
+def _fsync(path: str):
+    """Flush a file written and closed to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _rows(batch: RowBatch, fieldnames: list[str]) -> list[tuple]:
+    """Return the rows of a batch, which must be in the order of a sink's fields"""
+    if batch.schema.fieldnames != tuple(fieldnames):
+        raise ValueError(f'The {batch.schema.form} rows do not have the fields of the output')
+    return batch.rows
+
+
+SINKS = {'csv': CsvSink, 'parquet': ParquetSink, 'sqlite': SqliteSink, 'aggregate': AggregateSink}
+
+def open_sink(output_format: str, path: typing.Union[str, os.PathLike], fieldnames: list[str], offset: int = None,
+              **options) -> typing.Union[CsvSink, ParquetSink, SqliteSink, AggregateSink]:
+    """Open the sink for one form's output, path being the output file name without extension"""
+    return SINKS[output_format](path, fieldnames, offset, **options)
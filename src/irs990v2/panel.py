@@ -0,0 +1,319 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import csv
+import heapq
+import os
+import pickle
+import sys
+import tempfile
+import typing
+from typing import Generator
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from .mapping import Mapping
+from .plan import ExtractionPlan
+
+class PanelError(ValueError):
+    '''
+    Raised when the outputs given cannot be joined into one panel
+    '''
+
+
+class PanelBuilder():
+    '''
+    Longitudinal panel of organizations across tax years, built from the outputs of several runs of a form.
+
+    The outputs are written in archive order, so they are joined by an external sort-merge: rows are read
+    into runs of at most the memory budget, each run sorted on (ein, taxyear, taxperiodend) and spilled
+    to a temporary file, and the spilled runs merged back in order, a limited number of files at a time.
+    The merged rows come out grouped by EIN and tax year, so overlapping filings are dropped as they pass:
+    of the filings for an EIN and tax year, only the one with the latest period is kept, and of the same
+    period loaded by several runs, the one from the run listed last, or first with the original policy.
+    A run can have several filings of the same period too, an original and its amendment, of which the
+    one it has last is kept, or first with the original policy.  Each row of a form with one row per
+    filing is a filing; in the other forms, such as BondIssue or Officer, a filing is the rows of a run
+    next to each other with the same EIN, tax year and period, and every row of the kept filing is kept
+    in the long layout.  The wide layout needs one row per filing.
+    The columns of the panel are every column of any output, in the order first seen, so the outputs of
+    runs with different mappings join too.
+    '''
+    KEY = ('ein', 'taxyear', 'taxperiodend')
+    # latest: the row from the last output listed for each period; original: from the first
+    DEDUP = ('latest', 'original')
+    # Forms extracted as one row per filing
+    FILING_FORMS = ('990',)
+    MEMORY_MB = 256
+    FAN_IN = 64
+    BATCH = 1000
+    SAMPLE = 16
+
+    inputs: list[str]
+    fieldnames: list[str]
+    memory: int
+    fan_in: int
+    dedup: str
+    form: str
+    rows: int
+    duplicates: int
+    spills: int
+    years: list[str]
+
+    def __init__(self, inputs: typing.Iterable[typing.Union[str, os.PathLike]], memory_mb: int = MEMORY_MB,
+                 temp_dir: typing.Union[str, os.PathLike] = None, fan_in: int = FAN_IN, dedup: str = 'latest',
+                 form: str = None):
+        '''
+        Constructor
+        '''
+        if dedup not in self.DEDUP:
+            raise ValueError(f'Unknown dedup policy {dedup}')
+        if fan_in < 2:
+            raise ValueError(f'Invalid fan-in {fan_in}, at least 2 runs must be merged at a time')
+        self.inputs = [os.fspath(path) for path in inputs]
+        if not self.inputs:
+            raise PanelError('No outputs to build the panel from')
+        self.memory = memory_mb * 2**20
+        self.temp_dir = temp_dir
+        self.fan_in = fan_in
+        self.dedup = dedup
+
+        self.fieldnames = list()
+        self._columns = list()
+        for path in self.inputs:
+            columns = self._header(path)
+            missing = [name for name in self.KEY if name not in columns]
+            if missing:
+                raise PanelError(f'{path} has no {", ".join(missing)} column, so it is not the output of a form')
+            self._columns.append(columns)
+            self.fieldnames.extend(name for name in columns if name not in self.fieldnames)
+        self._key = [self.fieldnames.index(name) for name in self.KEY]
+        self.form = form or self._form(self.fieldnames)
+
+        # Counted as the panel is built
+        self.rows = 0
+        self.duplicates = 0
+        self.spills = 0
+        self.years = list()
+        self._directory = None
+        self._runs = None
+
+    def sort(self):
+        """Read every output into sorted runs spilled to temporary files, merged down to at most fan_in runs"""
+        if self._runs is not None:
+            return
+        self._directory = tempfile.TemporaryDirectory(prefix='panel990-', dir=self.temp_dir)
+        runs = self._spill()
+        # Merged a limited number of files at a time, so the last merge reads from at most fan_in files
+        while len(runs) > self.fan_in:
+            merged = list()
+            for i in range(0, len(runs), self.fan_in):
+                group = runs[i:i + self.fan_in]
+                if len(group) == 1:
+                    merged.extend(group)
+                    continue
+                path = self._run_path()
+                self._write_run(path, heapq.merge(*(self._read_run(run) for run in group)))
+                for run in group:
+                    os.remove(run)
+                merged.append(path)
+            runs = merged
+        self._runs = runs
+
+    def close(self):
+        """Remove the spilled runs"""
+        if self._directory is not None:
+            self._directory.cleanup()
+            self._directory = None
+        self._runs = None
+
+    def long(self, columns: typing.Sequence[str] = None) -> tuple[list[str], Generator[tuple, None, None]]:
+        """Return the fieldnames of the rows of each EIN and tax year, and a generator of the rows sorted by EIN and year
+
+        columns picks the form columns to keep after the filing header, all of them by default.  An EIN and
+        year has one row for a form such as 990, and as many as its kept filing has for the other forms.
+        """
+        layout = [self.fieldnames.index(name) for name in self._pick(columns, header=True)]
+        self.sort()
+        return [self.fieldnames[i] for i in layout], (tuple([values[i] for i in layout]) for values in self._merged())
+
+    def wide(self, columns: typing.Sequence[str] = None) -> tuple[list[str], Generator[tuple, None, None]]:
+        """Return the fieldnames of a row per EIN, with each column repeated for every tax year, and a generator of the rows
+
+        The years are those found in the outputs, named in the fieldnames as suffixes of the columns.  The
+        outputs must be of a form with one row per filing, and PanelError is raised on reaching an EIN with
+        several rows for a year.
+        """
+        picked = [self.fieldnames.index(name) for name in self._pick(columns, header=False)]
+        self.sort()
+        ein, year = self._key[0], self._key[1]
+        name = self.fieldnames.index('name') if 'name' in self.fieldnames else None
+        years = {year: i for i, year in enumerate(self.years)}
+        fieldnames = ['ein', 'name'] + [f'{self.fieldnames[i]}_{year}' for i in picked for year in self.years]
+
+        def rows():
+            organization = list()
+            for values in self._merged():
+                if organization and values[ein] != organization[0][ein]:
+                    yield self._spread(organization, picked, years, ein, name, year)
+                    organization = list()
+                organization.append(values)
+            if organization:
+                yield self._spread(organization, picked, years, ein, name, year)
+
+        return fieldnames, rows()
+
+    def _spread(self, organization: list[tuple], picked: list[int], years: dict[str, int], ein: int, name: int,
+                year: int) -> tuple:
+        """Return the wide row of an organization from its rows, one per tax year"""
+        values = [None] * (len(picked) * len(years))
+        seen = set()
+        for row in organization:
+            if row[year] in seen:
+                raise PanelError(f'EIN {row[ein]} has several rows for {row[year]}, '
+                                 'so the outputs are of a form that only has a long layout')
+            seen.add(row[year])
+            if row[year] in years:
+                y = years[row[year]]
+                for c, i in enumerate(picked):
+                    values[c * len(years) + y] = row[i]
+        # The name as of the latest year
+        return (organization[0][ein], None if name is None else organization[-1][name], *values)
+
+    def _pick(self, columns: typing.Sequence[str], header: bool) -> list[str]:
+        if columns is None:
+            return [name for name in self.fieldnames if header or name not in ExtractionPlan.HEADER]
+        unknown = [name for name in columns if name not in self.fieldnames]
+        if unknown:
+            raise PanelError(f'No output has the columns {", ".join(unknown)}')
+        if not header:
+            return list(columns)
+        return ([name for name in ExtractionPlan.HEADER if name in self.fieldnames]
+                + [name for name in columns if name not in ExtractionPlan.HEADER])
+
+    def _merged(self) -> Generator[tuple, None, None]:
+        """Generate the rows of the sorted runs in order, keeping the rows of one filing per EIN and tax year"""
+        # The rows of a filing, held until a later period, run or filing of the same EIN and year replaces them
+        filing = list()
+        last = None
+        for key, values in heapq.merge(*(self._read_run(run) for run in self._runs)):
+            if last is not None and key[:2] != last[:2]:
+                yield from filing
+                filing = list()
+            elif last is not None and key[2:5] != last[2:5]:
+                self.duplicates += len(filing)
+                filing = list()
+            filing.append(values)
+            last = key
+        yield from filing
+
+    def _spill(self) -> list[str]:
+        """Read every output into sorted runs of at most the memory budget, returning the path of each"""
+        runs = list()
+        buffer = list()
+        size = 0
+        years = set()
+        sequence = 0
+        ein, year, period = self._key
+        single = self.form in self.FILING_FORMS
+        for i, path in enumerate(self.inputs):
+            # Rows of the same period are ordered by output and then by filing, the one kept last
+            rank = i if self.dedup == 'latest' else -i
+            layout = [self._columns[i].index(name) if name in self._columns[i] else None for name in self.fieldnames]
+            previous = None
+            for values in self._read(path):
+                row = tuple([None if j is None else values[j] or None for j in layout])
+                # A filing is numbered by the sequence of its first row
+                if single or (row[ein], row[year], row[period]) != previous:
+                    filing = sequence if self.dedup == 'latest' else -sequence
+                    previous = (row[ein], row[year], row[period])
+                buffer.append(((row[ein] or '', row[year] or '', row[period] or '', rank, filing, sequence), row))
+                sequence += 1
+                years.add(row[year])
+                # Sized from every so many rows, the values plus about 200 bytes for the key and the tuple pairing them
+                if sequence % self.SAMPLE == 1:
+                    row_size = sys.getsizeof(row) + sum(map(sys.getsizeof, row)) + 200
+                size += row_size
+                if size >= self.memory:
+                    runs.append(self._sort_run(buffer))
+                    buffer = list()
+                    size = 0
+        if buffer or not runs:
+            runs.append(self._sort_run(buffer))
+        self.rows = sequence
+        self.spills = len(runs)
+        self.years = sorted(year for year in years if year is not None)
+        return runs
+
+    def _sort_run(self, buffer: list[tuple]) -> str:
+        buffer.sort()
+        path = self._run_path()
+        self._write_run(path, buffer)
+        return path
+
+    def _run_path(self) -> str:
+        fd, path = tempfile.mkstemp(suffix='.run', dir=self._directory.name)
+        os.close(fd)
+        return path
+
+    def _write_run(self, path: str, rows: typing.Iterable[tuple]):
+        with open(path, 'wb') as f:
+            batch = list()
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.BATCH:
+                    pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                    batch = list()
+            if batch:
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _read_run(path: str) -> Generator[tuple, None, None]:
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    return
+                yield from batch
+
+    @staticmethod
+    def _form(fieldnames: list[str]) -> str:
+        """Return the form with the most of the columns of the outputs, or None when they have none of any form"""
+        columns = set(fieldnames).difference(ExtractionPlan.HEADER)
+        counts = {form: len(columns.intersection(Mapping.all_mappings(form))) for form in Mapping.forms()}
+        form = max(counts, key=counts.get, default=None)
+        return form if form is not None and counts[form] else None
+
+    @staticmethod
+    def _header(path: str) -> list[str]:
+        """Return the columns of an output, a CSV file or a Parquet file or dataset"""
+        if os.path.isdir(path) or path.endswith('.parquet'):
+            if pyarrow is None:
+                raise ImportError('pyarrow is required to read parquet output')
+            return list(pyarrow.parquet.ParquetDataset(path).schema.names)
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            return next(csv.reader(f), [])
+
+    @staticmethod
+    def _read(path: str) -> Generator[list, None, None]:
+        """Generate the values of each row of an output as text, in the order of its columns"""
+        if os.path.isdir(path) or path.endswith('.parquet'):
+            dataset = pyarrow.parquet.ParquetDataset(path)
+            for fragment in dataset.fragments:
+                for batch in fragment.to_batches():
+                    # Typed values are written back as the text a typed CSV output has
+                    columns = [[None if value is None else str(value) for value in column.to_pylist()]
+                               for column in batch.columns]
+                    yield from zip(*columns)
+            return
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            yield from reader
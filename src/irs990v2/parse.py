@@ -3,12 +3,21 @@ Created on Dec 22, 2023
 
 @author: wlauer
 '''
+import time
 import typing
 import xml.etree.ElementTree as ET
+import zlib
 from typing import Generator
+from zipfile import BadZipFile
 
 # from .index import Index
-from .mapping import Mapping
+from .batch import RowBatch, RowSchema
+from .catalog import CatalogEntry
+from .errors import ErrorSink, Failure
+from .intermediate import IntermediateStore
+from .metrics import Metrics
+from .plan import ExtractionPlan
+from .predicate import FilingPredicate
 
 class Parser(object):
     '''
@@ -16,58 +25,245 @@ class Parser(object):
     '''
     DEFAULT_NAMESPACE = {'':'http://www.irs.gov/efile'}
 
+    HEADER_TAG = '{http://www.irs.gov/efile}ReturnHeader'
 
-    def __init__(self):
+    streaming: bool
+    predicate: FilingPredicate
+    metrics: Metrics
+    errors: ErrorSink
+    skipped: int
+    failure: Failure
+    store: IntermediateStore
+
+    def __init__(self, streaming: bool = False, predicate: FilingPredicate = None, metrics: Metrics = None,
+                 errors: ErrorSink = None, store: IntermediateStore = None):
         '''
         Constructor
         '''
-        pass
+        if streaming and store is not None:
+            raise ValueError('Filings parsed in streaming mode cannot be kept in an intermediate store')
+        self.streaming = streaming
+        self.predicate = predicate
+        self.metrics = metrics
+        self.errors = errors
+        self.store = store
+        self.skipped = 0
+        self.failure = None
+        self._version = None
+        self._stage = None
+        self._error = None
+        self._source = None
     
-    def parse(self, filing: typing.TextIO, forms: list[str]) -> dict[str, Generator[dict[str, str], None, None]]:
-        """ Parse 990 filing and return generator that produces a dictionary keyed by form with a value of a generator """
-        base_row = dict()
+    def parse(self, filing: typing.TextIO, forms: list[str], source: typing.Any = None) -> dict[str, Generator[dict[str, str], None, None]]:
+        """ Parse 990 filing and return generator that produces a dictionary keyed by form with a value of a generator.
+
+        A filing that fails to parse returns None, and the failure is kept in failure.  With an error
+        sink the failure is recorded there along with source, the CatalogEntry or path the filing was
+        read from, or the quarantine record of a filing retried; otherwise it is printed.
+        """
+        batches = self.parse_rows(filing, forms, source)
+        if batches is None:
+            return None
+        return {form: batch.dicts() for form, batch in batches.items()}
+
+    def parse_rows(self, filing: typing.TextIO, forms: list[str], source: typing.Any = None) -> dict[str, RowBatch]:
+        """Parse 990 filing and return the rows of each form as a batch of tuples, or None if it fails to parse
+
+        With an intermediate store, a filing read from a zip member, whose source is its CatalogEntry, is
+        kept in the store as well.
+        """
+        self._source = source
+        self.failure = None
+        if self.metrics is None:
+            row = self._parse(filing, forms)
+        else:
+            row = self._parse_measured(filing, forms)
+
+        if row is None:
+            self.failed(getattr(filing, 'name', None), self._error, source)
+        elif self.errors is not None:
+            self.errors.parsed()
+        return row
+
+    def failed(self, member: str, e: Exception, source: typing.Any = None, stage: str = None):
+        """Report a filing that could not be parsed, or opened in the first place"""
+        self.failure = Failure(member, stage or self._failed_stage(e), type(e).__name__, str(e))
+        if self.errors is None:
+            print(f'Error processing {member}:')
+            print(repr(e))
+        else:
+            self.errors.record(self.failure, source)
+
+    def _parse_measured(self, filing: typing.TextIO, forms: list[str]) -> dict[str, RowBatch]:
+        """Parse while timing reading, parsing and extraction; in streaming mode extraction is part of parsing"""
+        reader = self.metrics.reader(filing)
+        skipped = self.skipped
+        extract = self.metrics.timers.get('extract', (0.0,))[0]
+        self._version = None
+        
+        start = time.perf_counter()
+        row = self._parse(reader, forms)
+        seconds = time.perf_counter() - start
         
+        reader.close()
+        extract = self.metrics.timers.get('extract', (0.0,))[0] - extract
+        self.metrics.add_time('parse', seconds - reader.seconds - extract)
+        self.metrics.filing(reader.name, seconds, reader.size, self._version)
+        self.metrics.count('filings')
+        if row is None:
+            self.metrics.count('filings_failed')
+        elif self.skipped > skipped:
+            self.metrics.count('filings_skipped')
+        return row
+
+    def _parse(self, filing: typing.TextIO, forms: list[str]) -> dict[str, RowBatch]:
+        self._stage = 'parse'
+        self._error = None
         try:
-            root = ET.parse(filing)
-            schema_version = root.getroot().get('returnVersion')
-            
-            mapping = Mapping(schema_version)
-            base_row['ein'] = self._find(root, mapping.ein)
-            base_row['name'] = self._find(root, mapping.name)
-            base_row['returntype'] = self._find(root, mapping.return_type)
-            base_row['taxyear'] = self._find(root, mapping.tax_year)
-            base_row['taxperiodstart'] = self._find(root, mapping.tax_period_start_date)
-            base_row['taxperiodend'] = self._find(root, mapping.tax_period_end_date)
-            
-            row = dict()
-            
-            for form in forms:
-                base_path = mapping.base_path(form)
-                fields = mapping.fields(form)
-                row[form] = self._details(root, base_path, fields, base_row)
+            if self.streaming:
+                return self._parse_stream(filing, forms)
+            if self.predicate is not None:
+                return self._parse_filtered(filing, forms)
+
+            root = ET.parse(filing).getroot()
+            self._version = root.get('returnVersion')
+            plan = self._plan()
+            header, details = self._extract(plan, root, forms)
+            self._store(plan, root, header, details)
             
-            return row
+            return self._rows(plan, forms, details, header)
 
         except Exception as e:
-            print(f'Error processing {filing.name}:')
-            print(repr(e))
-        
+            self._error = e
         
-    def _details(self, root: ET, base_path: str, fields: list[tuple[str, str]], base_row: dict[str, str]) -> Generator[dict[str, str], None, None]:
-        """Return dictionary of generators with details from form"""
-        for f in root.iterfind(base_path, self.DEFAULT_NAMESPACE):
-            form_row = dict()
-            form_row |= base_row
-            
-            for name, field in fields:
-                form_row[name] = self._find(f, field)
-            yield form_row
+    def _parse_stream(self, filing: typing.TextIO, forms: list[str]) -> dict[str, RowBatch]:
+        """Parse 990 filing with iterparse, discarding each element once it has been consumed.
 
-    
-    def _find(self, tree: ET, field: str, namespaces: dict[str, str] = DEFAULT_NAMESPACE):
-        if field != '':
-            elem = tree.findall(field, namespaces)
-            if len(elem) > 0:
-                return elem[0].text
-        return None
-    
\ No newline at end of file
+        Only the subtree of a requested form is held in memory, and only until its rows have been
+        extracted, so memory use stays flat regardless of the size of the filing.
+        """
+        context = ET.iterparse(filing, events=('start', 'end'))
+        _, root = next(context)
+        self._version = root.get('returnVersion')
+
+        if self.predicate is not None and not self.predicate.accepts_version(self._version):
+            return self._skip(forms)
+
+        plan = self._plan()
+        self._stage = 'extract'
+        header_paths = plan.header_paths()
+
+        base_paths = dict()
+        for form in forms:
+            for tags in plan.base_tags(form):
+                base_paths.setdefault(tags, list()).append(form)
+
+        base_row = dict.fromkeys(plan.HEADER)
+        details = {form: list() for form in forms}
+
+        path = list()
+        elems = [root]
+        captured = 0
+        for event, elem in context:
+            if event == 'start':
+                path.append(elem.tag)
+                elems.append(elem)
+                if tuple(path) in base_paths:
+                    captured += 1
+                continue
+            if elem is root:
+                break
+
+            key = tuple(path)
+            path.pop()
+            elems.pop()
+
+            for column in header_paths.get(key, ()):
+                if base_row[column] is None:
+                    base_row[column] = elem.text
+
+            if elem.tag == self.HEADER_TAG and len(path) == 0 and self.predicate is not None:
+                if not self.predicate.accepts_header(base_row):
+                    return self._skip(forms)
+
+            if key in base_paths:
+                captured -= 1
+                for form in base_paths[key]:
+                    details[form].append(plan.values(elem, form))
+
+            # Keep the element only while it is part of a form subtree that has not been consumed yet
+            if captured == 0:
+                elems[-1].remove(elem)
+
+        return self._rows(plan, forms, details, tuple(map(base_row.get, plan.HEADER)))
+
+    def _parse_filtered(self, filing: typing.TextIO, forms: list[str]) -> dict[str, RowBatch]:
+        """Parse 990 filing into a tree, but stop reading as soon as the filing fails the predicate"""
+        context = ET.iterparse(filing, events=('start', 'end'))
+        _, root = next(context)
+        self._version = root.get('returnVersion')
+
+        if not self.predicate.accepts_version(self._version):
+            return self._skip(forms)
+        plan = self._plan()
+        self._stage = 'parse'
+
+        for event, elem in context:
+            if event == 'end' and elem.tag == self.HEADER_TAG:
+                break
+
+        # Unless the filing has no ReturnHeader, only the header has been read so far
+        header, _ = plan.extract(root, [])
+        if not self.predicate.accepts_header(header):
+            return self._skip(forms)
+
+        for _ in context:
+            pass
+
+        header, details = self._extract(plan, root, forms)
+        self._store(plan, root, header, details)
+
+        return self._rows(plan, forms, details, header)
+
+    def _plan(self) -> ExtractionPlan:
+        self._stage = 'mapping'
+        plan = ExtractionPlan.for_schema(self._version)
+        self._stage = 'parse'
+        return plan
+
+    def _failed_stage(self, e: Exception) -> str:
+        """Return the stage a filing failed in: read, parse, mapping or extract"""
+        if isinstance(e, (OSError, EOFError, BadZipFile, zlib.error, UnicodeDecodeError)):
+            return 'read'
+        if isinstance(e, ET.ParseError):
+            return 'parse'
+        return self._stage
+
+    def _extract(self, plan: ExtractionPlan, root: ET.Element, forms: list[str]) -> tuple[tuple, dict[str, list[tuple]]]:
+        self._stage = 'extract'
+        if self.metrics is None:
+            return plan.extract_values(root, forms)
+        with self.metrics.timer('extract'):
+            return plan.extract_values(root, forms)
+
+    def _store(self, plan: ExtractionPlan, root: ET.Element, header: tuple, details: dict[str, list[tuple]]):
+        if self.store is not None and isinstance(self._source, CatalogEntry):
+            self.store.add(self._source, root, plan, header, details)
+
+    def _rows(self, plan: ExtractionPlan, forms: list[str], details: dict[str, list[tuple]], header: tuple) -> dict[str, RowBatch]:
+        """Return the batch of rows of each form, each the filing header followed by one set of form details, counting the rows"""
+        row = dict()
+
+        for form in forms:
+            schema = RowSchema.for_form(form)
+            rows = schema.rows(plan, header, details[form])
+            row[form] = RowBatch(schema, rows, [(header, len(rows))])
+            if self.metrics is not None:
+                self.metrics.count(f'rows.{form}', len(details[form]))
+
+        return row
+
+    def _skip(self, forms: list[str]) -> dict[str, RowBatch]:
+        """Return the result for a filing rejected by the predicate, which has no rows"""
+        self.skipped += 1
+        return {form: RowBatch(RowSchema.for_form(form)) for form in forms}
@@ -0,0 +1,191 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import multiprocessing
+import queue
+import threading
+from itertools import islice
+from typing import Generator, Iterable
+
+from .batch import RowBatch, RowSchema
+from .catalog import ArchivePool, CatalogEntry
+from .errors import ErrorSink
+from .intermediate import IntermediateStore
+from .mapping import MappingSnapshot
+from .metrics import Metrics
+from .parse import Parser
+from .predicate import FilingPredicate
+from .prefetch import Prefetcher
+
+class Pipeline():
+    '''
+    Parse zip members on a pool of worker processes.
+
+    Work units are sent to the workers in batches through a bounded task queue and the extracted rows
+    come back through a bounded result queue, as a batch of tuples per form.  At most window batches are in flight at any time, so a
+    slow consumer applies backpressure to the workers instead of letting results pile up in memory.
+    '''
+
+    workers: int
+    forms: list[str]
+    streaming: bool
+    predicate: FilingPredicate
+    batch_size: int
+    ordered: bool
+    window: int
+    metrics: Metrics
+    errors: ErrorSink
+    prefetch: Prefetcher
+    store: str
+
+    def __init__(self, workers: int, forms: list[str], streaming: bool = False,
+                 batch_size: int = 16, ordered: bool = True, window: int = None,
+                 predicate: FilingPredicate = None, metrics: Metrics = None, errors: ErrorSink = None,
+                 prefetch: Prefetcher = None, store: str = None):
+        '''
+        Constructor
+        '''
+        self.workers = workers
+        self.forms = forms
+        self.streaming = streaming
+        self.predicate = predicate
+        self.batch_size = batch_size
+        self.ordered = ordered
+        self.window = window or 4 * workers
+        self.metrics = metrics
+        self.errors = errors
+        self.prefetch = prefetch or Prefetcher()
+        self.store = store
+
+    def run(self, units: Iterable[CatalogEntry]) -> Generator[tuple[list[CatalogEntry], dict[str, RowBatch]], None, None]:
+        """Parse the work units and yield each batch with its rows, keyed by form.
+
+        In ordered mode batches are yielded in the order of the work units, so the output is the same
+        as parsing them one at a time.  Otherwise batches are yielded as soon as a worker finishes them.
+        """
+        context = multiprocessing.get_context()
+        tasks = context.Queue(self.window)
+        results = context.Queue(self.window)
+        in_flight = threading.BoundedSemaphore(self.window)
+
+        # Workers are handed the mapping snapshot rather than loading the mapping files themselves
+        snapshot = MappingSnapshot.current()
+        processes = [context.Process(target=_work, args=(tasks, results, self.forms, self.streaming, self.predicate,
+                                                         self.metrics is not None, snapshot,
+                                                         (self.prefetch.depth, self.prefetch.max_bytes, self.prefetch.threads),
+                                                         self.prefetch.pool.max_open if self.prefetch.pool else None,
+                                                         self.store),
+                                     daemon=True)
+                     for _ in range(self.workers)]
+        for p in processes:
+            p.start()
+
+        # Batches submitted, whether the units are exhausted, and the error that stopped reading them, if any
+        submitted = [0, False, None]
+        feeder = threading.Thread(target=self._feed, args=(units, tasks, in_flight, submitted), daemon=True)
+        feeder.start()
+
+        try:
+            pending = dict()
+            emitted = 0
+            while not submitted[1] or emitted < submitted[0]:
+                try:
+                    seq, batch, metrics, failures = results.get(timeout=1)
+                except queue.Empty:
+                    for p in processes:
+                        if not p.is_alive() and p.exitcode != 0:
+                            raise RuntimeError(f'worker {p.pid} exited with code {p.exitcode}')
+                    continue
+                if metrics is not None:
+                    self.metrics.merge(metrics)
+                self._failures(batch[0], failures)
+
+                if not self.ordered:
+                    emitted += 1
+                    in_flight.release()
+                    yield batch
+                    continue
+
+                pending[seq] = batch
+                while emitted in pending:
+                    batch = pending.pop(emitted)
+                    emitted += 1
+                    in_flight.release()
+                    yield batch
+            if submitted[2] is not None:
+                # The batches read before it are all yielded, so a resumed run picks up from the failing unit
+                raise submitted[2]
+        finally:
+            for p in processes:
+                if p.is_alive():
+                    p.terminate()
+            for p in processes:
+                p.join()
+
+    def _failures(self, batch: list[CatalogEntry], failures: list):
+        """Record the failures a worker met in a batch"""
+        if self.errors is None:
+            for failure, _ in failures:
+                print(f'Error processing {failure.member}:')
+                print(f'{failure.error}({failure.message!r})')
+            return
+        self.errors.parsed(len(batch) - len(failures))
+        for failure, source in failures:
+            self.errors.record(failure, source)
+
+    def _feed(self, units: Iterable[CatalogEntry], tasks: multiprocessing.Queue,
+              in_flight: threading.BoundedSemaphore, submitted: list):
+        """Send the units to the workers a batch at a time, handing an error reading them to run to raise"""
+        try:
+            units = iter(units)
+            seq = 0
+            while batch := list(islice(units, self.batch_size)):
+                in_flight.acquire()
+                tasks.put((seq, batch))
+                seq += 1
+                submitted[0] = seq
+        except BaseException as e:
+            submitted[2] = e
+        finally:
+            submitted[1] = True
+            for _ in range(self.workers):
+                tasks.put(None)
+
+
+def _work(tasks: multiprocessing.Queue, results: multiprocessing.Queue, forms: list[str], streaming: bool,
+          predicate: FilingPredicate, measure: bool, snapshot: MappingSnapshot, prefetch: tuple[int, int, int],
+          max_open: int, store: str):
+    """Worker process loop: parse each batch of work units and send back its rows, and its metrics if measured."""
+    MappingSnapshot.install(snapshot)
+    metrics = Metrics() if measure else None
+    errors = ErrorSink()
+    # Each worker keeps its filings in the store through its own connection
+    parser = Parser(streaming, predicate, metrics, errors, IntermediateStore(store) if store else None)
+    # Read-ahead stays within a batch, so only the first member of each batch is inflated on demand
+    # Each worker keeps its own archive handles open across batches
+    prefetch = Prefetcher(*prefetch, metrics=metrics, pool=ArchivePool(max_open) if max_open else None)
+
+    while (task := tasks.get()) is not None:
+        seq, batch = task
+        rows = {f: RowBatch(RowSchema.for_form(f)) for f in forms}
+
+        for entry, f, e in prefetch.members(batch):
+            if f is None:
+                parser.failed(entry.name, e, entry, 'read')
+                continue
+            with f:
+                filing = parser.parse_rows(f, forms, entry)
+            if filing is None:
+                continue
+            for f in forms:
+                rows[f].extend(filing[f])
+
+        if parser.store is not None:
+            # Stored before the batch is handed back, so a checkpointed filing is always in the store
+            parser.store.sync()
+        results.put((seq, (batch, rows), metrics.to_dict() if measure else None, errors.failures))
+        errors.failures = list()
+        if measure:
+            metrics.reset()
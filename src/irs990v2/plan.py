@@ -0,0 +1,291 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import re
+import xml.etree.ElementTree as ET
+
+from .flat import FlatFiling
+from .mapping import MappingSnapshot, SchemaMapping
+
+class _Node():
+    '''
+    Node in the compiled tree of element paths
+    '''
+    __slots__ = ('columns', 'forms', 'children')
+
+    def __init__(self):
+        self.columns = list()
+        self.forms = list()
+        self.children = dict()
+
+    def child(self, tag: str) -> '_Node':
+        return self.children.setdefault(tag, _Node())
+
+
+class ExtractionPlan():
+    '''
+    XPath mappings for a schema compiled into a tree of element names, so that the header and every
+    requested form are extracted in a single traversal of the filing instead of one findall per field.
+
+    Every form is a repeating group: each element at the form's base path is a row, and its fields
+    are paths below that element.  A base path or field path may be a union of paths separated by |,
+    and a field mapped to name(...) is the label given for the path of the union the row was found at,
+    so a form can gather rows from several groups, such as the years of an endowment, and still say which
+    is which.  The labels are listed in the order of the paths, so the same group has the same label in
+    every schema even where its element is named differently; a plain name() is the element's name.
+    '''
+    NAMESPACE = 'http://www.irs.gov/efile'
+    HEADER = MappingSnapshot.COLUMNS
+    NAME = re.compile(r'name\(([^()]*)\)')
+
+    # Mappings using anything beyond plain child steps are left to ElementPath
+    SIMPLE_PATH = re.compile(r'[A-Za-z_][\w.-]*(/[A-Za-z_][\w.-]*)*')
+
+    _plans: dict[tuple[str, str], 'ExtractionPlan'] = dict()
+
+    mapping: SchemaMapping
+    schema: str
+    columns: dict[str, tuple[str, ...]]
+    base_paths: dict[str, str]
+
+    def __init__(self, mapping: SchemaMapping):
+        '''
+        Constructor
+        '''
+        self.mapping = mapping
+        self.schema = mapping.schema
+
+        header = dict(zip(self.HEADER, mapping.header))
+        self._header = _Node()
+        self._header_fallback = list()
+        for column, path in header.items():
+            self._add(self._header, self._header_fallback, column, path)
+
+        self.columns = dict()
+        self.base_paths = dict()
+        self._fields = dict()
+        self._fallback = dict()
+        self._names = dict()
+        for form, base_path, fields in mapping.forms:
+            self.base_paths[form] = base_path
+            self.columns[form] = tuple(column for column, _ in fields)
+            self._fields[form] = _Node()
+            self._fallback[form] = list()
+            self._names[form] = [(column, self._labels(form, base_path, path)) for column, path in fields
+                                 if self.NAME.fullmatch(path.strip())]
+            for column, path in fields:
+                self._add(self._fields[form], self._fallback[form], column, path)
+
+        self._roots = dict()
+
+    @classmethod
+    def for_schema(cls, schema_version: str) -> 'ExtractionPlan':
+        """Return the plan for a filing's returnVersion, compiling it once per mapping file."""
+        snapshot = MappingSnapshot.current()
+        key = (snapshot.digest, schema_version[:schema_version.rindex('v')])
+        if key not in cls._plans:
+            cls._plans[key] = cls(snapshot.schema(schema_version))
+        return cls._plans[key]
+
+    def header_paths(self) -> dict[tuple[str, ...], list[str]]:
+        """Return the header columns keyed by the qualified tags leading to them from the root."""
+        paths = dict()
+        self._leaves(self._header, (), paths)
+        return paths
+
+    def base_tags(self, form: str) -> list[tuple[str, ...]]:
+        """Return the qualified tags leading to a form's base elements from the root, for each path of the union."""
+        return [tuple(self._qualify(tag) for tag in path.split('/')) for path in self._union(self.base_paths[form])]
+
+    def extract(self, root: ET.Element, forms: list[str]) -> tuple[dict[str, str], dict[str, list[dict[str, str]]]]:
+        """Return the header row and the rows of each requested form, keyed by column."""
+        header, details = self.extract_values(root, forms)
+        return (dict(zip(self.HEADER, header)),
+                {form: [dict(zip(self.columns[form], values)) for values in rows] for form, rows in details.items()})
+
+    def extract_values(self, root: ET.Element, forms: list[str]) -> tuple[tuple, dict[str, list[tuple]]]:
+        """Return the header values and the values of each row of the requested forms, walking the filing once.
+
+        A form's fields are filled from the subtree of each of its base elements as the walk reaches
+        it, so nested groups such as Part VII under the 990 still cost only the one walk.  The values
+        are in the order of HEADER and of the form's columns.
+        """
+        header = dict()
+        details = {form: list() for form in forms}
+        self._walk(root, self._root(tuple(forms)), header, details)
+
+        for column, path in self._header_fallback:
+            if header.get(column) is None:
+                header[column] = self._find(root, path)
+
+        return tuple(map(header.get, self.HEADER)), details
+
+    def extract_records(self, filing: FlatFiling, forms: list[str]) -> tuple[tuple, dict[str, list[tuple]]]:
+        """Return the same values as extract_values, from the records of a flattened filing.
+
+        The walk steps over every subtree the plan has no path into, so it touches the same elements as
+        the walk of the tree.  Only a path ElementPath has to evaluate needs the elements rebuilt.
+        """
+        header = dict()
+        details = {form: list() for form in forms}
+        self._walk_records(filing, 0, self._root(tuple(forms)), header, details)
+
+        if self._header_fallback:
+            root = filing.element()
+            for column, path in self._header_fallback:
+                if header.get(column) is None:
+                    header[column] = self._find(root, path)
+
+        return tuple(map(header.get, self.HEADER)), details
+
+    def fill(self, elem: ET.Element, form: str) -> dict[str, str]:
+        """Return the columns of a form extracted from the subtree of one of its base elements."""
+        return dict(zip(self.columns[form], self.values(elem, form)))
+
+    def values(self, elem: ET.Element, form: str) -> tuple:
+        """Return the values of a form's columns extracted from the subtree of one of its base elements."""
+        values = dict()
+        self._fill(elem, self._fields[form], values)
+
+        for column, labels in self._names[form]:
+            values[column] = self._label(elem.tag, labels)
+        for column, path in self._fallback[form]:
+            if values.get(column) is None:
+                values[column] = self._find(elem, path)
+
+        return tuple(map(values.get, self.columns[form]))
+
+    def _root(self, forms: tuple[str, ...]) -> _Node:
+        """Return the tree of header paths and base paths of the requested forms."""
+        if forms not in self._roots:
+            root = _Node()
+            self._merge(root, self._header)
+            for form in forms:
+                for tags in self.base_tags(form):
+                    node = root
+                    for tag in tags:
+                        node = node.child(tag)
+                    node.forms.append(form)
+            self._roots[forms] = root
+        return self._roots[forms]
+
+    def _walk(self, elem: ET.Element, node: _Node, header: dict[str, str], details: dict[str, list[tuple]]):
+        for child in elem:
+            sub = node.children.get(child.tag)
+            if sub is None:
+                continue
+            for column in sub.columns:
+                if column not in header:
+                    header[column] = child.text
+            for form in sub.forms:
+                details[form].append(self.values(child, form))
+            if sub.children:
+                self._walk(child, sub, header, details)
+
+    def _walk_records(self, filing: FlatFiling, i: int, node: _Node, header: dict[str, str],
+                      details: dict[str, list[tuple]]):
+        nodes, tags = filing.nodes, filing.tags
+        end = i + 3 * (nodes[i] + 1)
+        i += 3
+        while i < end:
+            sub = node.children.get(tags[nodes[i + 1]])
+            if sub is not None:
+                for column in sub.columns:
+                    if column not in header:
+                        header[column] = nodes[i + 2]
+                for form in sub.forms:
+                    details[form].append(self._record_values(filing, i, form))
+                if sub.children:
+                    self._walk_records(filing, i, sub, header, details)
+            i += 3 * (nodes[i] + 1)
+
+    def _record_values(self, filing: FlatFiling, i: int, form: str) -> tuple:
+        if self._fallback[form]:
+            return self.values(filing.element(i), form)
+        values = dict()
+        self._fill_records(filing, i, self._fields[form], values)
+        for column, labels in self._names[form]:
+            values[column] = self._label(filing.tags[filing.nodes[i + 1]], labels)
+        return tuple(map(values.get, self.columns[form]))
+
+    def _fill_records(self, filing: FlatFiling, i: int, node: _Node, values: dict[str, str]):
+        nodes, tags = filing.nodes, filing.tags
+        end = i + 3 * (nodes[i] + 1)
+        i += 3
+        while i < end:
+            sub = node.children.get(tags[nodes[i + 1]])
+            if sub is not None:
+                for column in sub.columns:
+                    if column not in values:
+                        values[column] = nodes[i + 2]
+                if sub.children:
+                    self._fill_records(filing, i, sub, values)
+            i += 3 * (nodes[i] + 1)
+
+    def _fill(self, elem: ET.Element, node: _Node, values: dict[str, str]):
+        # Elements are visited in document order, so the first one seen matches findall(path)[0]
+        for child in elem:
+            sub = node.children.get(child.tag)
+            if sub is None:
+                continue
+            for column in sub.columns:
+                if column not in values:
+                    values[column] = child.text
+            if sub.children:
+                self._fill(child, sub, values)
+
+    def _add(self, root: _Node, fallback: list[tuple[str, str]], column: str, path: str):
+        # The paths of a union are all added, so whichever matches first in document order wins
+        for path in self._union(path):
+            if self.NAME.fullmatch(path):
+                continue
+            if not self.SIMPLE_PATH.fullmatch(path):
+                fallback.append((column, path))
+                continue
+
+            node = root
+            for tag in path.split('/'):
+                node = node.child(self._qualify(tag))
+            node.columns.append(column)
+
+    def _merge(self, target: _Node, source: _Node):
+        target.columns.extend(source.columns)
+        for tag, node in source.children.items():
+            self._merge(target.child(tag), node)
+
+    def _leaves(self, node: _Node, path: tuple[str, ...], paths: dict[tuple[str, ...], list[str]]):
+        if node.columns:
+            paths[path] = list(node.columns)
+        for tag, sub in node.children.items():
+            self._leaves(sub, path + (tag,), paths)
+
+    def _labels(self, form: str, base_path: str, path: str) -> dict[str, str]:
+        """Return the label of a row of each path of a form's base path union, keyed by the qualified tag it ends in"""
+        labels = [label.strip() for label in self.NAME.fullmatch(path.strip()).group(1).split(',') if label.strip()]
+        if not labels:
+            return None
+        paths = self._union(base_path)
+        if len(labels) != len(paths):
+            raise ValueError(f'{self.schema} {form} has {len(paths)} base paths but {len(labels)} labels in {path}')
+        return {self._qualify(path.rpartition('/')[2]): label for path, label in zip(paths, labels)}
+
+    @staticmethod
+    def _label(tag: str, labels: dict[str, str]) -> str:
+        if labels is None:
+            return tag.rpartition('}')[2]
+        return labels.get(tag)
+
+    @staticmethod
+    def _union(path: str) -> list[str]:
+        return [p.strip() for p in path.split('|') if p.strip()]
+
+    def _qualify(self, tag: str) -> str:
+        return f'{{{self.NAMESPACE}}}{tag}'
+
+    def _find(self, tree: ET.Element, path: str):
+        elem = tree.find(path, {'': self.NAMESPACE})
+        if elem is not None:
+            return elem.text
+        return None
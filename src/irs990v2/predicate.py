@@ -0,0 +1,104 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import re
+from argparse import ArgumentParser, Namespace
+from typing import Iterable
+
+
+def normalize_ein(ein: str) -> str:
+    """Return an EIN as nine digits, the way the index files and the filings differ in writing it"""
+    return ein.replace('-', '').strip().zfill(9) if ein else ein
+
+
+class FilingPredicate():
+    '''
+    Filter on the schema version and return header of a filing.
+
+    The parser checks the predicate as soon as the root element and the ReturnHeader have been read,
+    and stops reading a filing that fails it, so a skipped filing costs only its first few KB.
+    '''
+
+    # Index files use their own names for some return types
+    ALIASES = {'990O': '990', '990EO': '990EZ'}
+    VERSION = re.compile(r'(\d{4})(?:v(\d+)(?:\.(\d+))?)?')
+
+    return_types: frozenset[str]
+    tax_years: frozenset[str]
+    eins: frozenset[str]
+    min_version: tuple[int, ...]
+    max_version: tuple[int, ...]
+
+    def __init__(self, return_types: Iterable[str] = None, tax_years: Iterable[str] = None,
+                 eins: Iterable[str] = None, min_version: str = None, max_version: str = None):
+        '''
+        Constructor
+        '''
+        self.return_types = frozenset(self._return_type(t) for t in return_types) if return_types else None
+        self.tax_years = frozenset(str(y) for y in tax_years) if tax_years else None
+        self.eins = frozenset(normalize_ein(e) for e in eins) if eins else None
+        self.min_version = self._version(min_version) if min_version else None
+        self.max_version = self._version(max_version) if max_version else None
+
+    def accepts_version(self, schema_version: str) -> bool:
+        """Check the returnVersion attribute of the root element"""
+        if self.min_version is None and self.max_version is None:
+            return True
+        version = self._version(schema_version)
+        if self.min_version is not None and version < self.min_version:
+            return False
+        if self.max_version is not None and version[:len(self.max_version)] > self.max_version:
+            return False
+        return True
+
+    def accepts_header(self, header: dict[str, str]) -> bool:
+        """Check the values extracted from the ReturnHeader"""
+        if self.return_types is not None and self._return_type(header.get('returntype')) not in self.return_types:
+            return False
+        if self.tax_years is not None and header.get('taxyear') not in self.tax_years:
+            return False
+        if self.eins is not None and normalize_ein(header.get('ein')) not in self.eins:
+            return False
+        return True
+
+    def accepts_index(self, record: dict[str, str]) -> bool:
+        """Check the columns of an index file record that the predicate covers"""
+        if self.return_types is not None and self._return_type(record['RETURN_TYPE']) not in self.return_types:
+            return False
+        if self.eins is not None and normalize_ein(record['EIN']) not in self.eins:
+            return False
+        return True
+
+    @classmethod
+    def add_arguments(cls, argparser: ArgumentParser):
+        """Add the command line options for the predicate, none of which filters anything unless given"""
+        argparser.add_argument('--return-type', dest='return_types', nargs='*', help='return types to parse (default = all)')
+        argparser.add_argument('--tax-year', dest='tax_years', nargs='*', help='tax years to parse')
+        argparser.add_argument('--ein-file', dest='ein_file', help='file listing the EINs to parse, one per line')
+        argparser.add_argument('--min-version', dest='min_version', help='oldest schema version to parse, e.g. 2013 or 2013v3.0')
+        argparser.add_argument('--max-version', dest='max_version', help='newest schema version to parse, e.g. 2020 or 2020v4.1')
+
+    @classmethod
+    def from_args(cls, args: Namespace) -> 'FilingPredicate':
+        """Return the predicate for the parsed command line, or None when nothing is filtered"""
+        eins = None
+        if args.ein_file is not None:
+            with open(args.ein_file, 'r') as f:
+                eins = [line.strip() for line in f if line.strip()]
+
+        if not (args.return_types or args.tax_years or eins or args.min_version or args.max_version):
+            return None
+        return cls(args.return_types, args.tax_years, eins, args.min_version, args.max_version)
+
+    @classmethod
+    def _return_type(cls, return_type: str) -> str:
+        return cls.ALIASES.get(return_type, return_type)
+
+    @classmethod
+    def _version(cls, version: str) -> tuple[int, ...]:
+        match = cls.VERSION.fullmatch(version or '')
+        if match is None:
+            raise ValueError(f'Invalid schema version {version}')
+        return tuple(int(v) for v in match.groups() if v is not None)
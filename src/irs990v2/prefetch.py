@@ -0,0 +1,106 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import collections
+import io
+import time
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Generator, Iterable
+
+from .catalog import ArchivePool, CatalogEntry, ZipCatalog
+from .metrics import Metrics
+
+class Prefetcher():
+    '''
+    Read-ahead of zip members, inflating the next few into memory on background threads.
+
+    Inflating a member and parsing it otherwise take turns on one thread.  zlib, and the deflate64
+    codec where it does, release the GIL while inflating, so the next members are decompressed while
+    the current one is parsed and the parser always has its input ready.  At most depth members, and
+    at most max_bytes of inflated data, are buffered ahead of the parser; a member larger than
+    max_bytes is not buffered at all and is opened lazily when it is reached, as without read-ahead.
+    With a pool the members are read through its archive handles instead of opening the archive for each.
+    '''
+    DEPTH = 8
+    MAX_BYTES = 64 * 1024 * 1024
+    THREADS = 2
+
+    depth: int
+    max_bytes: int
+    threads: int
+    metrics: Metrics
+    pool: ArchivePool
+
+    def __init__(self, depth: int = DEPTH, max_bytes: int = MAX_BYTES, threads: int = THREADS, metrics: Metrics = None,
+                 pool: ArchivePool = None):
+        '''
+        Constructor
+        '''
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.threads = threads
+        self.metrics = metrics
+        self.pool = pool
+
+    def members(self, entries: Iterable[CatalogEntry]) -> Generator[tuple[CatalogEntry, typing.BinaryIO, Exception], None, None]:
+        """Generate each member in order with an open file, or the error raised opening or inflating it"""
+        if self.depth <= 0:
+            for entry in entries:
+                yield (entry, *self._open(entry))
+            return
+
+        entries = iter(entries)
+        pending = collections.deque()
+        buffered = 0
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='prefetch') as executor:
+            try:
+                while True:
+                    # Always keep one member ahead, however large, so the cap cannot stall the parser
+                    while len(pending) < self.depth and (not pending or buffered < self.max_bytes):
+                        entry = next(entries, None)
+                        if entry is None:
+                            break
+                        if entry.file_size > self.max_bytes:
+                            pending.append((entry, None))
+                        else:
+                            pending.append((entry, executor.submit(self._read, entry)))
+                            buffered += entry.file_size
+                    if not pending:
+                        break
+
+                    entry, future = pending.popleft()
+                    if future is None:
+                        yield (entry, *self._open(entry))
+                        continue
+                    buffered -= entry.file_size
+                    yield (entry, *self._result(entry, future))
+            finally:
+                for _, future in pending:
+                    if future is not None:
+                        future.cancel()
+
+    def _result(self, entry: CatalogEntry, future: Future) -> tuple[typing.BinaryIO, Exception]:
+        start = time.perf_counter()
+        try:
+            data = future.result()
+        except Exception as e:
+            return None, e
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_time('prefetch_wait', time.perf_counter() - start)
+        f = io.BytesIO(data)
+        f.name = entry.name
+        return f, None
+
+    def _read(self, entry: CatalogEntry) -> bytes:
+        with ZipCatalog.open(entry, self.pool) as f:
+            return f.read()
+
+    def _open(self, entry: CatalogEntry) -> tuple[typing.BinaryIO, Exception]:
+        try:
+            return ZipCatalog.open(entry, self.pool), None
+        except Exception as e:
+            return None, e
@@ -0,0 +1,378 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import http.client
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+import typing
+import urllib.parse
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+from .batch import RowBatch
+from .catalog import ArchivePool, ZipCatalog, object_id
+from .errors import ErrorSink, Failure
+from .mapping import Mapping, MappingSnapshot
+from .metrics import Latency
+from .parse import Parser
+
+class ExtractionRequest(NamedTuple):
+    '''
+    A filing to extract, given by exactly one of its XML, its path, or an archive and member name
+    '''
+    forms: tuple[str, ...]
+    xml: bytes = None
+    path: str = None
+    archive: str = None
+    member: str = None
+
+    @classmethod
+    def from_json(cls, data: dict, forms: typing.Iterable[str]) -> 'ExtractionRequest':
+        """Build a request from the JSON body of a call, with the forms of the call unless the body gives its own"""
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        forms = data.get('forms', forms)
+        return cls(tuple([forms] if isinstance(forms, str) else forms),
+                   data['xml'].encode() if isinstance(data.get('xml'), str) else None,
+                   data.get('path'), data.get('archive'), data.get('member'))
+
+    def check(self):
+        """Raise ValueError unless the request names one filing and known forms"""
+        if (self.xml is not None) + (self.path is not None) + (self.archive is not None) != 1:
+            raise ValueError('Give one of xml, path, or archive and member')
+        if (self.archive is None) != (self.member is None):
+            raise ValueError('A zip member is given by both archive and member')
+        unknown = set(self.forms) - set(Mapping.forms())
+        if unknown or not self.forms:
+            raise ValueError(f'Unknown forms {", ".join(sorted(unknown))}' if unknown else 'No forms requested')
+
+
+class ServiceError(RuntimeError):
+    '''
+    Raised by the client when the service rejects a request or cannot extract the filing
+    '''
+    status: int
+    body: dict
+
+    def __init__(self, status: int, body: dict):
+        super().__init__(f'{status}: {body.get("error")}')
+        self.status = status
+        self.body = body
+
+
+class ExtractionFailed(Exception):
+    '''
+    Raised for a filing that could not be read or parsed, carrying its failure
+    '''
+    failure: Failure
+
+    def __init__(self, failure: Failure):
+        super().__init__(f'{failure.stage}: {failure.error}({failure.message!r})')
+        self.failure = failure
+
+
+class ExtractionService():
+    '''
+    Long-running extraction of filings one at a time as they arrive, for an ingestion service.
+
+    The mappings are loaded once and handed to a pool of worker processes that stay up, so a request
+    costs only the parse, not interpreter startup and ini parsing.  Requests are queued and gathered into
+    batches while the workers are busy, up to batch_size of them or whatever arrives within max_wait of the
+    first, and a batch is sent to a worker as one task; a request arriving at an idle worker is sent on
+    straight away.  Each worker keeps its own archive handles and zip catalogs between
+    requests.  With no worker processes the filings are parsed on a thread of the service process.
+    '''
+
+    forms: tuple[str, ...]
+    workers: int
+    streaming: bool
+    batch_size: int
+    max_wait: float
+    latency: Latency
+    requests: int
+    failures: int
+    batches: int
+
+    def __init__(self, forms: typing.Iterable[str] = ('990',), workers: int = 1, streaming: bool = False,
+                 batch_size: int = 16, max_wait: float = 0.005, max_open: int = ArchivePool.MAX_OPEN,
+                 cache_dir: typing.Union[str, os.PathLike] = None):
+        '''
+        Constructor
+        '''
+        self.forms = tuple(forms)
+        self.workers = workers
+        self.streaming = streaming
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.latency = Latency()
+        self.requests = 0
+        self.failures = 0
+        self.batches = 0
+        self._in_flight = 0
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+
+        initargs = (MappingSnapshot.current(), streaming, max_open, None if cache_dir is None else os.fspath(cache_dir))
+        if workers > 0:
+            self._executor: Executor = ProcessPoolExecutor(workers, initializer=_init, initargs=initargs)
+        else:
+            self._executor = ThreadPoolExecutor(1, initializer=_init, initargs=initargs)
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, request: ExtractionRequest) -> Future:
+        """Queue a filing for extraction, returning the future of its rows keyed by form"""
+        request.check()
+        future = Future()
+        self._queue.put((request, future, time.perf_counter()))
+        return future
+
+    def extract(self, request: ExtractionRequest, timeout: float = None) -> dict[str, RowBatch]:
+        """Extract a filing, raising ExtractionFailed if it cannot be parsed"""
+        return self.submit(request).result(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'requests': self.requests,
+                    'failures': self.failures,
+                    'batches': self.batches,
+                    'workers': self.workers,
+                    'latency': self.latency.to_dict()}
+
+    def close(self):
+        self._queue.put(None)
+        self._dispatcher.join()
+        self._executor.shutdown()
+
+    def _dispatch(self):
+        while (item := self._queue.get()) is not None:
+            batch = [item]
+            with self._lock:
+                idle = self._in_flight < max(self.workers, 1)
+            # Waiting for more requests only pays while no worker could take them now
+            deadline = time.perf_counter() + (0.0 if idle else self.max_wait)
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            with self._lock:
+                self.batches += 1
+                self._in_flight += 1
+            task = self._executor.submit(_extract, [request for request, _, _ in batch])
+            task.add_done_callback(lambda task, batch=batch: self._done(batch, task))
+
+    def _done(self, batch: list[tuple[ExtractionRequest, Future, float]], task: Future):
+        with self._lock:
+            self._in_flight -= 1
+        if task.exception() is not None:
+            results = [task.exception()] * len(batch)
+        else:
+            results = [ExtractionFailed(result) if isinstance(result, Failure) else result for result in task.result()]
+
+        for (_, future, start), result in zip(batch, results):
+            self.latency.add(time.perf_counter() - start)
+            with self._lock:
+                self.requests += 1
+                self.failures += isinstance(result, Exception)
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    '''
+    HTTP calls of the service: POST /extract, GET /stats and GET /health
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/health':
+            self._reply(200, {'status': 'ok'})
+        elif url.path == '/stats':
+            self._reply(200, self.server.service.stats())
+        else:
+            self._reply(404, {'error': f'No such call {url.path}'})
+
+    def do_POST(self):
+        """Extract a filing: a JSON body names it by path or zip member, any other body is the XML itself"""
+        url = urllib.parse.urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if url.path != '/extract':
+            self._reply(404, {'error': f'No such call {url.path}'})
+            return
+
+        service = self.server.service
+        query = urllib.parse.parse_qs(url.query)
+        forms = query['forms'][0].split(',') if 'forms' in query else service.forms
+        try:
+            if self.headers.get_content_type() == 'application/json':
+                request = ExtractionRequest.from_json(json.loads(body), forms)
+            else:
+                request = ExtractionRequest(tuple(forms), xml=body)
+            rows = service.extract(request)
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+        except ExtractionFailed as e:
+            self._reply(422, {'error': str(e), 'failure': e.failure._asdict()})
+        else:
+            self._reply(200, {'forms': {form: list(batch.dicts()) for form, batch in rows.items()}})
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format: str, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _TCPHandler(_Handler):
+    # Headers and body are written separately, which would otherwise wait on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: ExtractionService, address: typing.Union[str, tuple[str, int]],
+                verbose: bool = False) -> socketserver.BaseServer:
+    """Return the HTTP server for a service, on a Unix socket given by path or on a (host, port)"""
+    if isinstance(address, str):
+        # A socket left behind by a service that did not shut down cleanly
+        if os.path.exists(address) and not os.path.isfile(address):
+            os.remove(address)
+        server = _UnixHTTPServer(address, _Handler)
+    else:
+        server = ThreadingHTTPServer(address, _TCPHandler)
+        server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+class ServiceClient():
+    '''
+    Client of a running service, keeping its connection open between calls.  Not to be shared between threads.
+    '''
+
+    def __init__(self, address: typing.Union[str, tuple[str, int]], timeout: float = 60.0):
+        '''
+        Constructor
+        '''
+        if isinstance(address, str):
+            self._connection = _UnixConnection(address, timeout)
+        else:
+            self._connection = http.client.HTTPConnection(*address, timeout=timeout)
+
+    def extract(self, xml: bytes = None, path: typing.Union[str, os.PathLike] = None, archive: str = None,
+                member: str = None, forms: typing.Iterable[str] = None) -> dict[str, list[dict[str, str]]]:
+        """Return the rows of each form extracted from a filing, raising ServiceError if it cannot be"""
+        if xml is not None:
+            query = '' if forms is None else '?' + urllib.parse.urlencode({'forms': ','.join(forms)})
+            return self._call('POST', '/extract' + query, xml, 'application/xml')['forms']
+
+        data = {'path': os.fspath(path) if path is not None else None, 'archive': archive, 'member': member}
+        data = {key: value for key, value in data.items() if value is not None}
+        if forms is not None:
+            data['forms'] = list(forms)
+        return self._call('POST', '/extract', json.dumps(data).encode(), 'application/json')['forms']
+
+    def stats(self) -> dict:
+        return self._call('GET', '/stats')
+
+    def close(self):
+        self._connection.close()
+
+    def _call(self, method: str, path: str, body: bytes = None, content_type: str = None) -> dict:
+        headers = {'Content-Type': content_type} if content_type else dict()
+        self._connection.request(method, path, body, headers)
+        response = self._connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise ServiceError(response.status, data)
+        return data
+
+
+class _UnixConnection(http.client.HTTPConnection):
+
+    def __init__(self, path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+# State of a worker, kept between the batches it is given
+_parser: Parser = None
+_pool: ArchivePool = None
+_catalogs: dict[tuple, ZipCatalog] = dict()
+_cache_dir: str = None
+
+def _init(snapshot: MappingSnapshot, streaming: bool, max_open: int, cache_dir: str):
+    global _parser, _pool, _cache_dir
+    MappingSnapshot.install(snapshot)
+    _parser = Parser(streaming, errors=ErrorSink())
+    _pool = ArchivePool(max_open)
+    _cache_dir = cache_dir
+
+def _extract(requests: list[ExtractionRequest]) -> list[typing.Union[dict[str, RowBatch], Failure]]:
+    """Worker task: extract each filing of a batch, returning its rows or its failure"""
+    results = list()
+    for request in requests:
+        name = request.path or request.member
+        try:
+            f = _open(request)
+        except Exception as e:
+            _parser.failed(name, e, None, 'read')
+            results.append(_parser.failure)
+            continue
+        with f:
+            rows = _parser.parse_rows(f, list(request.forms), name)
+        results.append(_parser.failure if rows is None else rows)
+    _parser.errors.failures = list()
+    return results
+
+def _open(request: ExtractionRequest) -> typing.BinaryIO:
+    if request.xml is not None:
+        return io.BytesIO(request.xml)
+    if request.path is not None:
+        return open(request.path, 'rb')
+
+    # The catalog of an archive is reused until the archive changes
+    stat = os.stat(request.archive)
+    key = (os.path.abspath(request.archive), stat.st_mtime_ns, stat.st_size)
+    if key not in _catalogs:
+        _catalogs[key] = ZipCatalog([request.archive], _cache_dir)
+    entry = _catalogs[key].get(object_id(request.member))
+    if entry is None:
+        raise KeyError(f'No member {request.member} in {request.archive}')
+    return ZipCatalog.open(entry, _pool)
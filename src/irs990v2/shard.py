@@ -0,0 +1,63 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import json
+import os
+import re
+import typing
+import zlib
+from typing import NamedTuple
+
+from .catalog import object_id
+
+class Shard(NamedTuple):
+    '''
+    One of count static partitions of the filings, for spreading a run across machines.
+
+    A filing belongs to the shard given by the CRC-32 of its OBJECT_ID, so every node agrees on the
+    partition without coordinating, and a filing keeps its shard whichever archive or directory holds it.
+    A node reads only the members it owns, picked out of the catalog built from the zip central directory.
+    '''
+    index: int
+    count: int
+
+    EXTENSION = '.shard.json'
+
+    @classmethod
+    def parse(cls, text: str) -> 'Shard':
+        """Parse a shard given as i/N, for i from 0 to N - 1"""
+        match = re.fullmatch(r'(\d+)/(\d+)', text.strip())
+        if match is None or not 0 <= int(match[1]) < int(match[2]):
+            raise ValueError(f'Invalid shard {text}, expected i/N with 0 <= i < N')
+        return cls(int(match[1]), int(match[2]))
+
+    def __str__(self) -> str:
+        return f'{self.index}/{self.count}'
+
+    @property
+    def suffix(self) -> str:
+        """Suffix for the names of the shard's output files, so shards writing to one directory do not collide"""
+        return f'.{self.index}-of-{self.count}'
+
+    def owns(self, name: str) -> bool:
+        """Check whether a filing, given by OBJECT_ID or file or member name, belongs to this shard"""
+        return zlib.crc32(object_id(name).encode()) % self.count == self.index
+
+    def write_manifest(self, path: typing.Union[str, os.PathLike], output_format: str, outputs: dict[str, str],
+                       checkpoint: str, errors: str = None):
+        """Record the outputs of the shard once its run is complete, for the merge
+
+        The paths are saved relative to the manifest, so the shards' files can be gathered from the nodes
+        into one directory before merging.
+        """
+        path = os.fspath(path)
+        directory = os.path.dirname(os.path.abspath(path))
+        relative = lambda p: None if p is None else os.path.relpath(os.path.abspath(p), directory)
+        with open(path, 'w') as f:
+            json.dump({'shard': str(self),
+                       'format': output_format,
+                       'outputs': {form: relative(output) for form, output in outputs.items()},
+                       'checkpoint': relative(checkpoint),
+                       'errors': relative(errors)}, f, indent=1)
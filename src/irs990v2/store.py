@@ -0,0 +1,65 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import os
+import sqlite3
+import typing
+from pathlib import Path
+
+from .output import SqliteSink
+
+class FilingStore():
+    '''
+    Lookups of the rows loaded by SqliteSink, by EIN and tax year or tax period.
+
+    The lookups use the (ein, taxyear) and (ein, taxperiodend) indexes built at the end of the load, so
+    returning a filing's rows takes milliseconds however many filings were loaded.  The database is
+    opened read only, and may be queried while an incremental run is loading into it.
+    '''
+    FORMS = ('990', 'BondIssue')
+
+    path: str
+    forms: list[str]
+
+    def __init__(self, path: typing.Union[str, os.PathLike]):
+        '''
+        Constructor
+        '''
+        self.path = os.fspath(path)
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(self.path)
+        self._connection = sqlite3.connect(Path(self.path).resolve().as_uri() + '?mode=ro', uri=True)
+        self._connection.row_factory = sqlite3.Row
+        self.forms = [row[0] for row in self._connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+
+    def filing(self, ein: str, taxyear: typing.Union[int, str] = None, taxperiodend: str = None,
+               forms: typing.Iterable[str] = FORMS) -> dict[str, list[dict[str, typing.Any]]]:
+        """Return the rows of each form loaded for an EIN, in the tax year or tax period given"""
+        return {form: self.rows(form, ein, taxyear, taxperiodend) for form in forms if form in self.forms}
+
+    def rows(self, form: str, ein: str, taxyear: typing.Union[int, str] = None,
+             taxperiodend: str = None) -> list[dict[str, typing.Any]]:
+        """Return the rows of one form loaded for an EIN, in the tax year or tax period given"""
+        if form not in self.forms:
+            raise KeyError(form)
+        sql = f'SELECT * FROM {SqliteSink.quote(form)} WHERE ein = ?'
+        parameters = [ein]
+        if taxyear is not None:
+            sql += ' AND taxyear = ?'
+            parameters.append(taxyear)
+        if taxperiodend is not None:
+            sql += ' AND taxperiodend = ?'
+            parameters.append(taxperiodend)
+        return [dict(row) for row in self._connection.execute(sql + ' ORDER BY rowid', parameters)]
+
+    def periods(self, ein: str, form: str = '990') -> list[tuple[typing.Any, str]]:
+        """Return the (taxyear, taxperiodend) of every filing loaded for an EIN"""
+        return [tuple(row) for row in self._connection.execute(
+            f'SELECT DISTINCT taxyear, taxperiodend FROM {SqliteSink.quote(form)} WHERE ein = ? ORDER BY taxperiodend',
+            (ein,))]
+
+    def close(self):
+        self._connection.close()
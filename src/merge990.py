@@ -0,0 +1,40 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+
+from argparse import ArgumentParser
+from irs990v2.index import Index
+from irs990v2.merge import MergeError, ShardMerge
+from irs990v2.predicate import FilingPredicate
+
+def main(args: list[str] = None):
+    argparser = ArgumentParser(description='Merge the outputs of the shards of a parse990 or parse990AllZip run')
+    argparser.add_argument('manifests', nargs='+',
+                           help="manifests written at the end of each shard's run, PREFIX.i-of-N.shard.json")
+    argparser.add_argument('-d', '--directory', dest='directory', default='.', help='directory to write the merged output to')
+    argparser.add_argument('-p', '--prefix', dest='prefix', default='merged', help='output filename prefix (default = merged)')
+    argparser.add_argument('-i', '--index', dest='index', help='index file listing every filing the shards should have parsed')
+    argparser.add_argument('--dedup', dest='dedup', choices=Index.DEDUP,
+                           help='dedup policy the shards were run with, so the returns it drops are not missing')
+    FilingPredicate.add_arguments(argparser)
+
+    args = argparser.parse_args(args=args)
+    predicate = FilingPredicate.from_args(args)
+
+    try:
+        merge = ShardMerge(args.manifests)
+        if args.index is None:
+            merge.check()
+        else:
+            with open(args.index, 'r', encoding='utf-8-sig', newline='') as index:
+                merge.check(index, predicate, args.dedup)
+        outputs = merge.merge(args.directory, args.prefix)
+    except MergeError as e:
+        argparser.exit(1, f'{argparser.prog}: {e}\n')
+
+    print(f'Merged {merge.filings} filings from {len(merge.shards)} shards into {", ".join(sorted(set(outputs.values())))}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+
+from argparse import ArgumentParser
+import os
+import shutil
+import time
+
+from irs990v2.batch import RowBatch, RowSchema
+from irs990v2.mapping import Mapping
+from irs990v2.output import open_sink
+from irs990v2.panel import PanelBuilder, PanelError
+
+def main(args: list[str] = None):
+    argparser = ArgumentParser(description='Build a panel of organizations across tax years from the outputs of several runs')
+    argparser.add_argument('outputs', nargs='+',
+                           help='CSV files or Parquet datasets of one form written by parse990 or parse990AllZip runs, '
+                                'later ones taking precedence for the same filing')
+    argparser.add_argument('-o', '--output', dest='output', required=True,
+                           help='output filename without extension, e.g. panel-990')
+    argparser.add_argument('-l', '--layout', dest='layout', default='long', choices=('long', 'wide'),
+                           help='the rows of each EIN and tax year, or a row per EIN with each column repeated per year, '
+                                'for forms with a row per filing (default = long)')
+    argparser.add_argument('--columns', dest='columns', nargs='+',
+                           help='form columns to keep (default = every column of the outputs)')
+    argparser.add_argument('--dedup', dest='dedup', default='latest', choices=PanelBuilder.DEDUP,
+                           help='for a period in several outputs, keep the row of the last output listed or the first (default = latest)')
+    argparser.add_argument('-t', '--format', dest='format', default='csv', choices=('csv', 'parquet'),
+                           help='output format (default = csv)')
+    argparser.add_argument('-z', '--compression', dest='compression',
+                           help='compression codec for columnar output (default = zstd)')
+    argparser.add_argument('-y', '--typed', dest='typed', action='store_true',
+                           help='convert amounts, dates and indicators to typed values')
+    argparser.add_argument('-f', '--form', dest='form', choices=Mapping.forms(),
+                           help='form the outputs are of, for the column types and whether each row is a filing '
+                                '(default = the form whose columns the outputs have)')
+    argparser.add_argument('--memory-mb', dest='memory_mb', type=int, default=PanelBuilder.MEMORY_MB,
+                           help=f'rows held in memory before a sorted run is spilled to disk (default = {PanelBuilder.MEMORY_MB})')
+    argparser.add_argument('--temp-dir', dest='temp_dir', help='directory for the spilled runs (default = the system temporary directory)')
+    argparser.add_argument('--fan-in', dest='fan_in', type=int, default=PanelBuilder.FAN_IN,
+                           help=f'spilled runs merged at a time (default = {PanelBuilder.FAN_IN})')
+
+    args = argparser.parse_args(args=args)
+    options = dict()
+    if args.compression is not None:
+        options['compression'] = args.compression
+
+    start = time.perf_counter()
+    try:
+        panel = PanelBuilder(args.outputs, args.memory_mb, args.temp_dir, args.fan_in, args.dedup, args.form)
+    except PanelError as e:
+        argparser.exit(1, f'{argparser.prog}: {e}\n')
+    try:
+        try:
+            fieldnames, rows = (panel.long if args.layout == 'long' else panel.wide)(args.columns)
+        except PanelError as e:
+            argparser.exit(1, f'{argparser.prog}: {e}\n')
+        form = panel.form or '990'
+        types = _types(Mapping.column_types(form), fieldnames, panel.years) if args.typed else None
+        schema = RowSchema(form, fieldnames)
+        sink = open_sink(args.format, args.output, fieldnames, types=types, **options)
+        written = 0
+        error = None
+        try:
+            batch = list()
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= 10000:
+                    sink.write_batch(RowBatch(schema, batch))
+                    written += len(batch)
+                    batch = list()
+            sink.write_batch(RowBatch(schema, batch))
+            written += len(batch)
+        except PanelError as e:
+            error = e
+        finally:
+            sink.close()
+        if error is not None:
+            # Not left behind to be taken for a panel
+            if os.path.isdir(sink.path):
+                shutil.rmtree(sink.path)
+            elif os.path.exists(sink.path):
+                os.remove(sink.path)
+            argparser.exit(1, f'{argparser.prog}: {error}\n')
+    finally:
+        panel.close()
+
+    print(f'Wrote {written} rows to {sink.path} from {panel.rows} rows of {len(panel.inputs)} outputs, '
+          f'dropping {panel.duplicates} overlapping, in {time.perf_counter() - start:.1f}s '
+          f'({panel.spills} sorted runs)')
+
+def _types(types: dict[str, str], fieldnames: list[str], years: list[str]) -> dict[str, str]:
+    """Return the type of each panel column, the columns of the wide layout being named after their year"""
+    typed = dict()
+    for name in fieldnames:
+        column = name
+        for year in years:
+            if name.endswith(f'_{year}'):
+                column = name[:-len(year) - 1]
+                break
+        if column in types:
+            typed[name] = types[column]
+    return typed
+
+if __name__ == "__main__":
+    main()
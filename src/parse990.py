@@ -6,37 +6,150 @@ Created on Dec 28, 2023
 
 from argparse import ArgumentParser
 import os
-import csv
+from pathlib import Path
+import time
+from irs990v2.batch import RowSchema
 from irs990v2.mapping import Mapping
+from irs990v2.metrics import Metrics, Progress
+from irs990v2.checkpoint import Checkpoint
+from irs990v2.errors import ErrorBudgetExceeded, ErrorSink
 from irs990v2.index import Index
+from irs990v2.output import SINKS, AggregateSink, open_sink
+from irs990v2.parse import Parser
+from irs990v2.predicate import FilingPredicate
+from irs990v2.shard import Shard
 
 def main(args: list[str] = None):
     argparser = ArgumentParser(description='Parse 990 filings')
     argparser.add_argument('-d', '--directory', dest='directory', help='directory with 990 xml files')
     argparser.add_argument('-i', '--index', dest='index', help='index file listing 990''s to parse')
     argparser.add_argument('-o', '--output', dest='out',help='output directory')
-    argparser.add_argument('-f', '--forms', dest='forms', default='990', choices=['990', 'BondIssue'],
+    argparser.add_argument('-f', '--forms', dest='forms', default=['990'], choices=Mapping.forms(),
                            help='forms to process (default = 990)', nargs='*')
+    argparser.add_argument('-s', '--streaming', dest='streaming', action='store_true',
+                           help='parse filings incrementally to bound memory use on large filings')
+    FilingPredicate.add_arguments(argparser)
+    argparser.add_argument('--dedup', dest='dedup', choices=Index.DEDUP,
+                           help='parse one return per EIN and tax period listed in the index: the latest submission, '
+                                'the original, or only the amendments (default = parse every return)')
+    argparser.add_argument('--shard', dest='shard', type=Shard.parse,
+                           help='parse only shard i of N, e.g. 0/4, partitioned by OBJECT_ID; merge the shards with merge990')
+    argparser.add_argument('-c', '--cache-dir', dest='cache_dir',
+                           help='directory for the filings catalog (default = $PARSE990_CACHE_DIR or ~/.cache/parse990/catalogs)')
+    argparser.add_argument('-t', '--format', dest='format', default='csv', choices=list(SINKS),
+                           help='output format, sqlite loading every form into one indexed database, aggregate summarizing '
+                                'each form by group instead of writing its rows (default = csv)')
+    argparser.add_argument('-z', '--compression', dest='compression',
+                           help='compression codec for columnar output (default = zstd)')
+    AggregateSink.add_arguments(argparser)
+    argparser.add_argument('-y', '--typed', dest='typed', action='store_true',
+                           help='convert amounts, dates and indicators to typed values')
+    argparser.add_argument('-m', '--metrics', dest='metrics', help='file to write stage timings and counts to, as JSON')
+    argparser.add_argument('--progress', dest='progress', type=float,
+                           help='print progress and the time remaining every so many seconds')
+    argparser.add_argument('-e', '--errors', dest='errors',
+                           help='file to write a JSON line per failed filing to (default = OUTPUT/parse990.errors.jsonl)')
+    argparser.add_argument('-q', '--quarantine', dest='quarantine', help='directory to copy failed filings to')
+    argparser.add_argument('--retry-quarantine', dest='retry_quarantine', action='store_true',
+                           help='parse only the filings in the quarantine directory, adding their rows to the output')
+    argparser.add_argument('--max-errors', dest='max_errors', type=int, help='stop after this many failed filings')
+    argparser.add_argument('--max-error-rate', dest='max_error_rate', type=float,
+                           help='stop when more than this fraction of the recent filings failed, e.g. 0.5')
+    argparser.add_argument('--error-window', dest='error_window', type=int, default=100,
+                           help='recent filings the error rate is measured over (default = 100)')
+    argparser.add_argument('-r', '--resume', dest='resume', action='store_true',
+                           help='resume an interrupted run, skipping filings already written')
+    argparser.add_argument('--checkpoint-every', dest='checkpoint_every', type=int, default=100,
+                           help='filings between checkpoints (default = 100)')
     
     args = argparser.parse_args(args=args)
+    if args.retry_quarantine and args.quarantine is None:
+        argparser.error('--retry-quarantine needs the --quarantine directory')
+    predicate = FilingPredicate.from_args(args)
+    # Shards writing to one directory name their files apart
+    suffix = '' if args.shard is None else args.shard.suffix
+    name = 'parse990' + suffix
+    options = dict()
+    if args.compression is not None:
+        options['compression'] = args.compression
+    if args.format == 'sqlite':
+        # Every form is loaded into a table of the one database
+        options['database'] = os.path.join(args.out, f'{name}.sqlite')
+    if args.format == 'aggregate':
+        options.update(AggregateSink.options(args))
+        for f in args.forms:
+            try:
+                AggregateSink.columns(f, list(RowSchema.for_form(f).fieldnames), Mapping.column_types(f), **options)
+            except ValueError as e:
+                argparser.error(str(e))
     
     with open(args.index, 'r', newline='') as index:
-        output_files = {f: open(os.path.join(args.out, f + '.csv'), 'w', newline='') for f in args.forms}
-        
-        base_fieldnames = ['ein', 'name', 'returntype', 'taxyear', 'taxperiodstart', 'taxperiodend']
-        fieldnames = {f: base_fieldnames + list(Mapping.all_mappings(f)) for f in args.forms}
+        checkpoint = Checkpoint(os.path.join(args.out, f'{name}.checkpoint'), args.resume or args.retry_quarantine,
+                                args.checkpoint_every)
+        errors = ErrorSink(args.errors or os.path.join(args.out, f'{name}.errors.jsonl'), args.quarantine, args.max_errors,
+                           args.max_error_rate, args.error_window, append=args.resume or args.retry_quarantine)
         
-        writer = {f: csv.DictWriter(output_files[f], fieldnames=fieldnames[f]) for f in args.forms}
+        fieldnames = {f: list(RowSchema.for_form(f).fieldnames) for f in args.forms}
+        # Aggregation needs the column types to find the amounts
+        types = {f: Mapping.column_types(f) if args.typed or args.format == 'aggregate' else None for f in args.forms}
         
-        for f in args.forms:
-            writer[f].writeheader()
+        output_files = {f: open_sink(args.format, os.path.join(args.out, f + suffix), fieldnames[f], checkpoint.offset(f),
+                                     types=types[f], table=f, **options) for f in args.forms}
         
-        for filing in Index.process(index, args.directory, args.forms):
-            for f in args.forms:
-                writer[f].writerows(filing[f])
+        metrics = Metrics() if args.metrics else None
+        parser = Parser(args.streaming, predicate, metrics, errors)
+        progress = None
+        try:
+            if args.retry_quarantine:
+                files = ((payload, (record['member'], record)) for record, payload in ErrorSink.quarantined(args.quarantine))
+            else:
+                files = ((file, (file, None)) for file in Index.filings(index, args.directory, args.cache_dir, predicate, metrics,
+                                                                              args.dedup, args.shard))
+                if args.progress:
+                    files = list(files)
+                    progress = Progress(len(files), args.progress)
+            
+            for file, (original, record) in files:
+                original = Path(original)
+                key = (os.path.abspath(original.parent), original.name, None)
+                if progress is not None:
+                    progress.update()
+                if record is None and checkpoint.done(*key):
+                    continue
+                try:
+                    with open(file, 'r', newline='', encoding='utf-8-sig') as xml:
+                        filing = parser.parse_rows(xml, args.forms, file if record is None else record)
+                except OSError as e:
+                    parser.failed(str(file), e, record, 'read')
+                    filing = None
+                start = time.perf_counter()
+                if filing is not None:
+                    for f in args.forms:
+                        output_files[f].write_batch(filing[f])
+                    if record is not None:
+                        ErrorSink.release(args.quarantine, record)
+                # A failed filing is in the error log and quarantine, so it is not tried again on resume
+                if filing is not None or record is None:
+                    checkpoint.add(output_files, key)
+                if metrics is not None:
+                    metrics.add_time('write', time.perf_counter() - start)
+        except ErrorBudgetExceeded as e:
+            argparser.exit(1, f'{argparser.prog}: stopping, {e}\n')
+        finally:
+            checkpoint.close(output_files)
+            for w in output_files.values():
+                w.close()
+            errors.close()
         
-        for w in output_files.values():
-            w.close()
+        if progress is not None:
+            progress.report()
+        if metrics is not None:
+            metrics.write(args.metrics)
+        if args.shard is not None:
+            args.shard.write_manifest(os.path.join(args.out, name + Shard.EXTENSION), args.format,
+                                      {f: w.path for f, w in output_files.items()}, checkpoint.path, errors.path)
+        if errors.failed:
+            print(f'{errors.failed} filings failed, see {errors.path}')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,45 +6,219 @@ Created on Dec 28, 2023
 
 from argparse import ArgumentParser
 import os
-import re
-import csv
-from zipfile import ZipFile
-import zipfile_deflate64
+import time
 
+from irs990v2.batch import RowSchema
+from irs990v2.catalog import ArchivePool, CatalogEntry, ZipCatalog
+from irs990v2.checkpoint import Checkpoint
+from irs990v2.errors import ErrorBudgetExceeded, ErrorSink
+from irs990v2.intermediate import IntermediateStore
 from irs990v2.mapping import Mapping
+from irs990v2.metrics import Metrics, Progress
+from irs990v2.output import SINKS, AggregateSink, open_sink
 from irs990v2.parse import Parser
+from irs990v2.pipeline import Pipeline
+from irs990v2.prefetch import Prefetcher
+from irs990v2.predicate import FilingPredicate
+from irs990v2.shard import Shard
 
 def main(args: list[str] = None):
     argparser = ArgumentParser(description='Parse 990 filing zip files')
     argparser.add_argument('-d', '--directory', dest='directory', help='directory with 990 zip files')
     argparser.add_argument('-p', '--prefix', dest='prefix', help='output filename prefix')
-    argparser.add_argument('-f', '--forms', dest='forms', default='990', choices=['990', 'BondIssue'],
+    argparser.add_argument('-f', '--forms', dest='forms', default=['990'], choices=Mapping.forms(),
                            help='forms to process (default = 990)', nargs='*')
+    argparser.add_argument('-s', '--streaming', dest='streaming', action='store_true',
+                           help='parse filings incrementally to bound memory use on large filings')
+    FilingPredicate.add_arguments(argparser)
+    argparser.add_argument('-c', '--cache-dir', dest='cache_dir',
+                           help='directory for zip catalogs (default = $PARSE990_CACHE_DIR or ~/.cache/parse990/catalogs)')
+    argparser.add_argument('--shard', dest='shard', type=Shard.parse,
+                           help='parse only shard i of N, e.g. 0/4, partitioned by OBJECT_ID; merge the shards with merge990')
+    argparser.add_argument('-w', '--workers', dest='workers', type=int, default=1,
+                           help='number of worker processes (default = 1, parse in this process)')
+    argparser.add_argument('-b', '--batch-size', dest='batch_size', type=int, default=16,
+                           help='filings sent to a worker at a time (default = 16)')
+    argparser.add_argument('-u', '--unordered', dest='ordered', action='store_false',
+                           help='write rows as workers finish instead of in archive order')
+    argparser.add_argument('--prefetch', dest='prefetch', type=int, default=Prefetcher.DEPTH,
+                           help=f'members to inflate ahead of the parser, 0 to inflate as they are parsed (default = {Prefetcher.DEPTH})')
+    argparser.add_argument('--prefetch-mb', dest='prefetch_mb', type=int, default=Prefetcher.MAX_BYTES // 2**20,
+                           help=f'cap on inflated data buffered ahead, per process (default = {Prefetcher.MAX_BYTES // 2**20})')
+    argparser.add_argument('--max-open', dest='max_open', type=int, default=ArchivePool.MAX_OPEN,
+                           help=f'zip files kept open at a time, per process (default = {ArchivePool.MAX_OPEN})')
+    argparser.add_argument('-t', '--format', dest='format', default='csv', choices=list(SINKS),
+                           help='output format, sqlite loading every form into one indexed database, aggregate summarizing '
+                                'each form by group instead of writing its rows (default = csv)')
+    argparser.add_argument('-z', '--compression', dest='compression',
+                           help='compression codec for columnar output (default = zstd)')
+    AggregateSink.add_arguments(argparser)
+    argparser.add_argument('-y', '--typed', dest='typed', action='store_true',
+                           help='convert amounts, dates and indicators to typed values')
+    argparser.add_argument('-m', '--metrics', dest='metrics', help='file to write stage timings and counts to, as JSON')
+    argparser.add_argument('--progress', dest='progress', type=float,
+                           help='print progress and the time remaining every so many seconds')
+    argparser.add_argument('-e', '--errors', dest='errors',
+                           help='file to write a JSON line per failed filing to (default = DIRECTORY/PREFIX.errors.jsonl)')
+    argparser.add_argument('-q', '--quarantine', dest='quarantine', help='directory to copy failed filings to')
+    argparser.add_argument('--retry-quarantine', dest='retry_quarantine', action='store_true',
+                           help='parse only the filings in the quarantine directory, adding their rows to the output')
+    argparser.add_argument('--max-errors', dest='max_errors', type=int, help='stop after this many failed filings')
+    argparser.add_argument('--max-error-rate', dest='max_error_rate', type=float,
+                           help='stop when more than this fraction of the recent filings failed, e.g. 0.5')
+    argparser.add_argument('--error-window', dest='error_window', type=int, default=100,
+                           help='recent filings the error rate is measured over (default = 100)')
+    argparser.add_argument('--store', dest='store',
+                           help='intermediate store to keep the parsed filings in, flattened, to extract them again after a mapping change')
+    argparser.add_argument('--from-store', dest='from_store', action='store_true',
+                           help='extract the filings of the --store with the current mappings instead of parsing the zip files, '
+                                'only re-extracting the columns whose mapping changed')
+    argparser.add_argument('-r', '--resume', dest='resume', action='store_true',
+                           help='resume an interrupted run, skipping filings already written')
+    argparser.add_argument('--checkpoint-every', dest='checkpoint_every', type=int, default=100,
+                           help='filings between checkpoints (default = 100)')
     
     args = argparser.parse_args(args=args)
+    if args.retry_quarantine and args.quarantine is None:
+        argparser.error('--retry-quarantine needs the --quarantine directory')
+    if args.from_store and args.store is None:
+        argparser.error('--from-store needs the --store to extract from')
+    if args.store is not None and args.streaming:
+        argparser.error('filings parsed with --streaming cannot be kept in the --store')
+    if args.max_open < 1:
+        argparser.error('--max-open must be at least 1')
+    predicate = FilingPredicate.from_args(args)
+    # Shards writing to one directory name their files apart
+    prefix = args.prefix if args.shard is None else args.prefix + args.shard.suffix
+    options = dict()
+    if args.compression is not None:
+        options['compression'] = args.compression
+    if args.format == 'sqlite':
+        # Every form is loaded into a table of the one database
+        options['database'] = os.path.join(args.directory, f'{prefix}.sqlite')
+    if args.format == 'aggregate':
+        options.update(AggregateSink.options(args))
+        for f in args.forms:
+            try:
+                AggregateSink.columns(f, list(RowSchema.for_form(f).fieldnames), Mapping.column_types(f), **options)
+            except ValueError as e:
+                argparser.error(str(e))
     
-    output_files = {f: open(os.path.join(args.directory, f'{args.prefix}-{f}.csv'), 'w', newline='') for f in args.forms}
+    checkpoint = Checkpoint(os.path.join(args.directory, f'{prefix}.checkpoint'), args.resume or args.retry_quarantine,
+                            args.checkpoint_every)
+    errors = ErrorSink(args.errors or os.path.join(args.directory, f'{prefix}.errors.jsonl'), args.quarantine,
+                       args.max_errors, args.max_error_rate, args.error_window, append=args.resume or args.retry_quarantine)
     
-    base_fieldnames = ['ein', 'name', 'returntype', 'taxyear', 'taxperiodstart', 'taxperiodend']
-    fieldnames = {f: base_fieldnames + list(Mapping.all_mappings(f)) for f in args.forms}
+    fieldnames = {f: list(RowSchema.for_form(f).fieldnames) for f in args.forms}
+    # Aggregation needs the column types to find the amounts
+    types = {f: Mapping.column_types(f) if args.typed or args.format == 'aggregate' else None for f in args.forms}
     
-    writer = {f: csv.DictWriter(output_files[f], fieldnames=fieldnames[f]) for f in args.forms}
-
-    for f in args.forms:
-        writer[f].writeheader()
+    output_files = {f: open_sink(args.format, os.path.join(args.directory, f'{prefix}-{f}'), fieldnames[f],
+                                 checkpoint.offset(f), types=types[f], table=f, **options) for f in args.forms}
     
-    parser = Parser()
+    # The store is committed with the outputs at each checkpoint
+    store = IntermediateStore(args.store) if args.store else None
+    synced = output_files if store is None else output_files | {'store': store}
     
-    for file in os.scandir(args.directory):
-        if file.is_file() and re.match('.*\.zip', file.name):
-            with ZipFile(file.path) as archive:
-                for name in archive.namelist():
-                    filing = parser.parse(archive.open(name, mode='r'), args.forms)
+    metrics = Metrics() if args.metrics else None
+    pool = ArchivePool(args.max_open)
+    prefetch = Prefetcher(args.prefetch, args.prefetch_mb * 2**20, metrics=metrics, pool=pool)
+    progress = None
+    try:
+        if args.retry_quarantine:
+            parser = Parser(args.streaming, predicate, metrics, errors, store)
+            for record, payload in ErrorSink.quarantined(args.quarantine):
+                with open(payload, 'rb') as member:
+                    filing = parser.parse_rows(member, args.forms, record)
+                if filing is None:
+                    continue
+                for f in args.forms:
+                    output_files[f].write_batch(filing[f])
+                checkpoint.add(synced, (record['archive'], record['member'], record['crc']))
+                ErrorSink.release(args.quarantine, record)
+        elif args.from_store:
+            accept = lambda archive, member, crc: ((args.shard is None or args.shard.owns(member))
+                                                   and not checkpoint.done(archive, member, crc))
+            if args.progress:
+                progress = Progress(len(store), args.progress)
+            for key, filing in store.extract(args.forms, predicate, accept, metrics, errors):
+                start = time.perf_counter()
+                if filing is not None:
+                    for f in args.forms:
+                        output_files[f].write_batch(filing[f])
+                checkpoint.add(synced, key)
+                if metrics is not None:
+                    metrics.add_time('write', time.perf_counter() - start)
+                if progress is not None:
+                    progress.update()
+        else:
+            start = time.perf_counter()
+            catalog = ZipCatalog.from_dirs([args.directory], args.cache_dir)
+            if metrics is not None:
+                metrics.add_time('catalog', time.perf_counter() - start)
+            members = (entry for entry in catalog.members()
+                       if (args.shard is None or args.shard.owns(entry.name)) and not checkpoint.done(*_key(entry)))
+            if args.progress:
+                members = list(members)
+                progress = Progress(len(members), args.progress)
+            
+            if args.workers > 1:
+                pipeline = Pipeline(args.workers, args.forms, args.streaming, args.batch_size, args.ordered,
+                                    predicate=predicate, metrics=metrics, errors=errors, prefetch=prefetch,
+                                    store=args.store)
+                for batch, rows in pipeline.run(members):
+                    start = time.perf_counter()
                     for f in args.forms:
-                        writer[f].writerows(filing[f])
-   
-    for w in output_files.values():
-        w.close()        
+                        output_files[f].write_batch(rows[f])
+                    checkpoint.add(synced, *(_key(entry) for entry in batch))
+                    if metrics is not None:
+                        metrics.add_time('write', time.perf_counter() - start)
+                    if progress is not None:
+                        progress.update(len(batch))
+            else:
+                parser = Parser(args.streaming, predicate, metrics, errors, store)
+                
+                for entry, member, e in prefetch.members(members):
+                    if member is None:
+                        parser.failed(entry.name, e, entry, 'read')
+                        filing = None
+                    else:
+                        with member:
+                            filing = parser.parse_rows(member, args.forms, entry)
+                    start = time.perf_counter()
+                    if filing is not None:
+                        for f in args.forms:
+                            output_files[f].write_batch(filing[f])
+                    # A failed filing is in the error log and quarantine, so it is not tried again on resume
+                    checkpoint.add(synced, _key(entry))
+                    if metrics is not None:
+                        metrics.add_time('write', time.perf_counter() - start)
+                    if progress is not None:
+                        progress.update()
+    except ErrorBudgetExceeded as e:
+        argparser.exit(1, f'{argparser.prog}: stopping, {e}\n')
+    finally:
+        checkpoint.close(synced)
+        for w in output_files.values():
+            w.close()
+        errors.close()
+        pool.close()
+        if store is not None:
+            store.close()
+    
+    if progress is not None:
+        progress.report()
+    if metrics is not None:
+        metrics.write(args.metrics)
+    if args.shard is not None:
+        args.shard.write_manifest(os.path.join(args.directory, prefix + Shard.EXTENSION), args.format,
+                                  {f: w.path for f, w in output_files.items()}, checkpoint.path, errors.path)
+    if errors.failed:
+        print(f'{errors.failed} filings failed, see {errors.path}')
+
+def _key(entry: CatalogEntry) -> tuple[str, str, int]:
+    """Identify a zip member in the checkpoint manifest"""
+    return os.path.abspath(entry.archive), entry.name, entry.crc
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
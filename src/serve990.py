@@ -0,0 +1,56 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+
+from argparse import ArgumentParser
+import json
+import os
+from irs990v2.catalog import ArchivePool
+from irs990v2.mapping import Mapping
+from irs990v2.service import ExtractionService, make_server
+
+def main(args: list[str] = None):
+    argparser = ArgumentParser(description='Serve extraction of 990 filings to local clients, keeping mappings and workers warm')
+    argparser.add_argument('-u', '--socket', dest='socket', help='Unix socket to listen on, instead of localhost HTTP')
+    argparser.add_argument('--host', dest='host', default='127.0.0.1', help='address to listen on (default = 127.0.0.1)')
+    argparser.add_argument('--port', dest='port', type=int, default=8990, help='port to listen on (default = 8990)')
+    argparser.add_argument('-f', '--forms', dest='forms', default=['990'], choices=Mapping.forms(), nargs='*',
+                           help='forms extracted when a request does not say (default = 990)')
+    argparser.add_argument('-s', '--streaming', dest='streaming', action='store_true',
+                           help='parse filings incrementally to bound memory use on large filings')
+    argparser.add_argument('-w', '--workers', dest='workers', type=int, default=1,
+                           help='number of worker processes (default = 1, 0 to parse in this process)')
+    argparser.add_argument('-b', '--batch-size', dest='batch_size', type=int, default=16,
+                           help='most requests sent to a worker at a time (default = 16)')
+    argparser.add_argument('--max-wait-ms', dest='max_wait', type=float, default=5.0,
+                           help='how long a request waits for others to batch with (default = 5)')
+    argparser.add_argument('--max-open', dest='max_open', type=int, default=ArchivePool.MAX_OPEN,
+                           help=f'zip archives each worker keeps open (default = {ArchivePool.MAX_OPEN})')
+    argparser.add_argument('-c', '--cache-dir', dest='cache_dir',
+                           help='directory for zip catalogs (default = $PARSE990_CACHE_DIR or ~/.cache/parse990/catalogs)')
+    argparser.add_argument('-v', '--verbose', dest='verbose', action='store_true', help='log every request')
+
+    args = argparser.parse_args(args=args)
+    if args.max_open < 1:
+        argparser.error('--max-open must be at least 1')
+
+    service = ExtractionService(args.forms, args.workers, args.streaming, args.batch_size, args.max_wait / 1000,
+                                args.max_open, args.cache_dir)
+    address = args.socket or (args.host, args.port)
+    server = make_server(service, address, args.verbose)
+    print(f'Serving on {args.socket or f"http://{args.host}:{server.server_address[1]}"}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
+        print(json.dumps(service.stats()))
+
+if __name__ == "__main__":
+    main()
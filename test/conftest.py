@@ -0,0 +1,15 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import os
+import tempfile
+
+# Set before the tests are collected, so the mapping snapshots and catalogs they cache, in this process or
+# in the processes they start, go to a directory of their own rather than the user's cache
+_cache = tempfile.TemporaryDirectory(prefix='parse990-test-cache-')
+os.environ['PARSE990_CACHE_DIR'] = _cache.name
+
+def pytest_unconfigure(config):
+    _cache.cleanup()
@@ -0,0 +1,90 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import json
+import math
+import random
+
+from irs990v2.aggregate import Aggregate, QuantileSketch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class Test(unittest.TestCase):
+
+    def testSketch(self):
+        rng = random.Random(990)
+        values = [int(rng.lognormvariate(12, 2)) * rng.choice((1, 1, 1, -1)) for _ in range(5000)] + [0] * 50
+        sketch = QuantileSketch(0.01)
+        sketch.add(numpy.array(values))
+        self.assertEqual(sketch.count, len(values))
+        self.assertEqual(sketch.zeros, 50)
+
+        values.sort()
+        for q in (0, 0.1, 0.25, 0.5, 0.9, 0.99, 1):
+            true = values[max(math.ceil(q * len(values)) - 1, 0)]
+            self.assertLessEqual(abs(sketch.quantile(q) - true), 0.01 * abs(true))
+
+        # Sketches of parts of the values merge into the sketch of all of them
+        parts = [QuantileSketch(0.01) for _ in range(3)]
+        for i, part in enumerate(parts):
+            part.add(numpy.array(values[i::3]))
+        merged = QuantileSketch.from_dict(json.loads(json.dumps(parts[0].to_dict())))
+        merged.merge(parts[2])
+        merged.merge(parts[1])
+        self.assertEqual(merged.to_dict(), sketch.to_dict())
+
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+        with self.assertRaises(ValueError):
+            merged.merge(QuantileSketch(0.05))
+
+    def testAggregate(self):
+        keys = [['2019', '2019', '2020', '2019', None], ['990', '990', '990', '990EZ', '990']]
+        values = [numpy.ma.masked_array([10, 30, 5, 7, 1], mask=[False, False, False, False, True]),
+                  numpy.ma.masked_array([1, 2, 3, 4, 5], mask=[True, True, False, False, False])]
+        aggregate = Aggregate('990', ('taxyear', 'returntype'), ('totalrevenue', 'totalexpenses'), (0.5,))
+        aggregate.add(keys, values)
+        self.assertEqual(aggregate.fieldnames, ['taxyear', 'returntype', 'column', 'rows', 'count', 'sum', 'mean',
+                                                'min', 'max', 'p50'])
+        self.assertEqual(aggregate.summary(), [
+            ('', '990', 'totalrevenue', 1, 0, None, None, None, None, None),
+            ('', '990', 'totalexpenses', 1, 1, 5, 5.0, 5, 5, 5),
+            ('2019', '990', 'totalrevenue', 2, 2, 40, 20.0, 10, 30, 10),
+            ('2019', '990', 'totalexpenses', 2, 0, None, None, None, None, None),
+            ('2019', '990EZ', 'totalrevenue', 1, 1, 7, 7.0, 7, 7, 7),
+            ('2019', '990EZ', 'totalexpenses', 1, 1, 4, 4.0, 4, 4, 4),
+            ('2020', '990', 'totalrevenue', 1, 1, 5, 5.0, 5, 5, 5),
+            ('2020', '990', 'totalexpenses', 1, 1, 3, 3.0, 3, 3, 3)])
+
+        # Adding the rows a batch at a time, or in aggregates merged afterwards, gives the same summary
+        other = Aggregate('990', ('taxyear', 'returntype'), ('totalrevenue', 'totalexpenses'), (0.5,))
+        other.add([column[:2] for column in keys], [column[:2] for column in values])
+        rest = Aggregate.from_dict(json.loads(json.dumps(other.to_dict())))
+        rest.groups.clear()
+        rest.add([column[2:] for column in keys], [column[2:] for column in values])
+        other.merge(rest)
+        self.assertEqual(other.summary(), aggregate.summary())
+
+        with self.assertRaises(ValueError):
+            other.merge(Aggregate('990', ('taxyear',), ('totalrevenue', 'totalexpenses')))
+
+    def testSmallGroup(self):
+        # The upper quantiles of a few values are the highest of them, not the one below
+        aggregate = Aggregate('BondIssue', ('taxyear',), ('issuepriceamt',), (0.25, 0.5, 0.9, 0.99))
+        aggregate.add([['2019', '2019', '2019']], [numpy.ma.masked_array([236036, 6450, 83310])])
+        p25, p50, p90, p99 = aggregate.summary()[0][-4:]
+        self.assertLessEqual(abs(p25 - 6450), 0.01 * 6450)
+        self.assertLessEqual(abs(p50 - 83310), 0.01 * 83310)
+        self.assertLessEqual(abs(p90 - 236036), 0.01 * 236036)
+        self.assertLessEqual(abs(p99 - 236036), 0.01 * 236036)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testSketch']
+    unittest.main()
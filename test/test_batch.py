@@ -0,0 +1,80 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import csv
+import os
+import pathlib
+import pickle
+import tempfile
+
+from irs990v2.batch import RowBatch, RowSchema
+from irs990v2.mapping import Mapping
+from irs990v2.output import CsvSink
+from irs990v2.parse import Parser
+from irs990v2.plan import ExtractionPlan
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+    FORMS = ['990', 'BondIssue']
+
+    def testSchema(self):
+        schema = RowSchema.for_form('990')
+        self.assertIs(RowSchema.for_form('990'), schema)
+        self.assertEqual(schema.fieldnames, ExtractionPlan.HEADER + tuple(Mapping.all_mappings('990')))
+        self.assertIs(pickle.loads(pickle.dumps(schema)), schema)
+
+        # A mapping ordered otherwise than the template is laid out in the template's order
+        plan = ExtractionPlan.for_schema('2009v1.0')
+        schema = RowSchema('BondIssue', ExtractionPlan.HEADER + tuple(reversed(plan.columns['BondIssue'])) + ('missing',))
+        values = tuple(range(len(plan.columns['BondIssue'])))
+        row = schema.rows(plan, ('h',) * len(ExtractionPlan.HEADER), [values])[0]
+        self.assertEqual(row[len(ExtractionPlan.HEADER):], tuple(reversed(values)) + (None,))
+
+    def testParseRows(self):
+        parser = Parser()
+        for path in sorted(self.TEST_DIR.glob('042103545*.txt')):
+            with open(path, 'rb') as f:
+                batches = parser.parse_rows(f, self.FORMS)
+            with open(path, 'rb') as f:
+                expected = parser.parse(f, self.FORMS)
+            for form in self.FORMS:
+                self.assertIs(batches[form].schema, RowSchema.for_form(form))
+                self.assertEqual(list(batches[form].dicts()), list(expected[form]))
+
+    def testBatch(self):
+        parser = Parser()
+        batch = RowBatch(RowSchema.for_form('BondIssue'))
+        self.assertEqual(len(batch.columns()), len(batch.schema.fieldnames))
+        for path in sorted(self.TEST_DIR.glob('042103545*.txt')):
+            with open(path, 'rb') as f:
+                batch.extend(parser.parse_rows(f, self.FORMS)['BondIssue'])
+        self.assertGreater(len(batch), 0)
+
+        columns = batch.columns()
+        self.assertEqual(set(columns[0]), {'042103545'})
+        self.assertEqual(list(zip(*columns)), list(batch))
+        with self.assertRaises(ValueError):
+            batch.extend(RowBatch(RowSchema.for_form('990')))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'BondIssue')
+            fieldnames = list(batch.schema.fieldnames)
+            sink = CsvSink(path, fieldnames, types=Mapping.column_types('BondIssue'))
+            sink.write_batch(batch)
+            sink.close()
+            with open(path + '.csv', 'r', newline='') as f:
+                written = list(csv.DictReader(f))
+            self.assertEqual(len(written), len(batch))
+            sink = CsvSink(path, fieldnames[:-1])
+            with self.assertRaises(ValueError):
+                sink.write_batch(batch)
+            sink.close()
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testBatch']
+    unittest.main()
@@ -0,0 +1,117 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import concurrent.futures
+import os
+import pathlib
+import shutil
+import tempfile
+from zipfile import ZipFile
+
+from irs990v2.catalog import ArchivePool, ZipCatalog, DirectoryCatalog
+from irs990v2.index import Index
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+    TEST_ZIP = TEST_DIR.joinpath('2019_TEOS_XML_CT1.zip')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive = shutil.copy(self.TEST_ZIP, self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def testZipCatalog(self):
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        catalog = ZipCatalog([self.archive], cache_dir)
+        self.assertEqual(catalog.rebuilt, [self.archive])
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertFalse(os.path.exists(self.archive + ZipCatalog.EXTENSION))
+        self.assertEqual(len(catalog), 3)
+        self.assertIn('201812509349300931', catalog)
+
+        with ZipFile(self.archive) as z:
+            for info in z.infolist():
+                entry = catalog.get(info.filename[:-len('_public.xml')])
+                self.assertEqual(entry.header_offset, info.header_offset)
+                self.assertEqual(entry.crc, info.CRC)
+                with ZipCatalog.open(entry) as f:
+                    self.assertEqual(f.read(), z.read(info.filename))
+
+        # Reused while the archive is unchanged, rebuilt once it changes
+        self.assertEqual(ZipCatalog([self.archive], cache_dir).rebuilt, [])
+        stat = os.stat(self.archive)
+        os.utime(self.archive, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(ZipCatalog([self.archive], cache_dir).rebuilt, [self.archive])
+
+        # Catalogs rebuilt at once, as by the workers of a run, each write a temporary file of their own
+        os.utime(self.archive, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            rebuilt = list(executor.map(lambda _: ZipCatalog([self.archive], cache_dir).rebuilt, range(16)))
+        self.assertIn([self.archive], rebuilt)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertEqual(ZipCatalog([self.archive], cache_dir).rebuilt, [])
+
+    def testZipCatalogFromDirs(self):
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        os.mkdir(cache_dir)
+        catalog = ZipCatalog.from_dirs([self.tmp.name, None], cache_dir)
+        self.assertEqual(len(catalog), 3)
+        self.assertEqual(len(list(catalog.members())), 3)
+        self.assertFalse(os.path.exists(self.archive + ZipCatalog.EXTENSION))
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        # Sidecars in the directory are not mistaken for archives
+        self.assertEqual(ZipCatalog.from_dirs([cache_dir]).archives, dict())
+
+    def testArchivePool(self):
+        other = shutil.copy(self.TEST_ZIP, os.path.join(self.tmp.name, 'other.zip'))
+        catalog = ZipCatalog([self.archive, other], os.path.join(self.tmp.name, 'cache'))
+        expected = dict()
+        for entry in catalog.members():
+            with ZipCatalog.open(entry) as f:
+                expected[entry] = f.read()
+
+        # Alternating between the archives with one handle reopens them lazily
+        pool = ArchivePool(max_open=1)
+        entries = list(catalog.members())
+        for entry in entries[::2] + entries[1::2]:
+            with ZipCatalog.open(entry, pool) as f:
+                self.assertEqual(f.read(), expected[entry])
+        self.assertEqual(pool.opened, 4)
+
+        # Members open together share the handle, which outlives its eviction until they are read
+        pool = ArchivePool(max_open=1)
+        first, second = [ZipCatalog.open(entry, pool) for entry in catalog.archives[self.archive][:2]]
+        third = ZipCatalog.open(catalog.archives[other][0], pool)
+        self.assertEqual(pool.opened, 2)
+        self.assertEqual(second.read(), expected[catalog.archives[self.archive][1]])
+        self.assertEqual(first.read(), expected[catalog.archives[self.archive][0]])
+        for f in (first, second, third):
+            f.close()
+        pool.close()
+
+        with self.assertRaises(ValueError):
+            ArchivePool(max_open=0)
+
+    def testDirectoryCatalog(self):
+        dirs = Index._expandFilingsDir(self.TEST_DIR)
+        catalog = DirectoryCatalog(self.TEST_DIR, dirs, self.tmp.name)
+        self.assertTrue(catalog.rebuilt)
+        self.assertEqual(catalog.get('201741089349300319'),
+                         self.TEST_DIR.joinpath('2017', 'filings', '201741089349300319_public.xml'))
+        self.assertIsNone(catalog.get('201632289349200513'))
+
+        catalog = DirectoryCatalog(self.TEST_DIR, dirs, self.tmp.name)
+        self.assertFalse(catalog.rebuilt)
+        self.assertEqual(len(catalog), 1)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testZipCatalog']
+    unittest.main()
@@ -0,0 +1,68 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import os
+import tempfile
+
+from irs990v2.checkpoint import Checkpoint
+from irs990v2.output import CsvSink
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manifest = os.path.join(self.tmp.name, 'run.checkpoint')
+        self.output = os.path.join(self.tmp.name, '990')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def testResume(self):
+        checkpoint = Checkpoint(self.manifest, every=2)
+        outputs = {'990': CsvSink(self.output, ['row'], checkpoint.offset('990'))}
+        self.assertFalse(checkpoint.resuming)
+
+        for member in ['a', 'b', 'c']:
+            outputs['990'].write([{'row': member}])
+            checkpoint.add(outputs, ('x.zip', member, 1))
+
+        # Crash: the row for c is in the output but was never committed
+        outputs['990'].close()
+        with open(self.manifest, 'a') as f:
+            f.write('{"filings": [["x.zip", "c"')
+
+        checkpoint = Checkpoint(self.manifest, resume=True, every=2)
+        self.assertTrue(checkpoint.resuming)
+        self.assertTrue(checkpoint.done('x.zip', 'b', 1))
+        self.assertFalse(checkpoint.done('x.zip', 'c', 1))
+
+        outputs = {'990': CsvSink(self.output, ['row'], checkpoint.offset('990'))}
+        for member in ['c', 'd']:
+            outputs['990'].write([{'row': member}])
+            checkpoint.add(outputs, ('x.zip', member, 1))
+        checkpoint.close(outputs)
+        outputs['990'].close()
+
+        with open(self.output + '.csv', 'r', newline='') as f:
+            self.assertEqual(f.read(), 'row\r\na\r\nb\r\nc\r\nd\r\n')
+
+        checkpoint = Checkpoint(self.manifest, resume=True)
+        self.assertEqual(len(checkpoint.completed), 4)
+
+    def testRestart(self):
+        checkpoint = Checkpoint(self.manifest)
+        outputs = {'990': CsvSink(self.output, ['row'])}
+        checkpoint.close(outputs)
+        outputs['990'].close()
+
+        checkpoint = Checkpoint(self.manifest, resume=False)
+        self.assertFalse(checkpoint.resuming)
+        self.assertEqual(os.path.getsize(self.manifest), 0)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testResume']
+    unittest.main()
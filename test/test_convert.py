@@ -0,0 +1,62 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import datetime
+
+from irs990v2 import convert
+from irs990v2.convert import Converter
+from irs990v2.mapping import Mapping
+
+class Test(unittest.TestCase):
+
+    TYPES = {'taxyear': 'int', 'taxperiodend': 'date', 'contributions': 'int', 'organizationfollowssfas117ind': 'bool'}
+    ROWS = [{'ein': '042103545', 'taxyear': '2019', 'taxperiodend': '2020-05-31', 'contributions': '210570096',
+             'organizationfollowssfas117ind': 'X'},
+            {'ein': '550307300', 'taxyear': '2019', 'taxperiodend': '2019-12-31', 'contributions': None,
+             'organizationfollowssfas117ind': 'false'},
+            {'ein': '346526754', 'taxyear': '2019', 'taxperiodend': None, 'contributions': ' -1500 ',
+             'organizationfollowssfas117ind': None}]
+    EXPECTED = [{'ein': '042103545', 'taxyear': 2019, 'taxperiodend': datetime.date(2020, 5, 31),
+                 'contributions': 210570096, 'organizationfollowssfas117ind': True},
+                {'ein': '550307300', 'taxyear': 2019, 'taxperiodend': datetime.date(2019, 12, 31),
+                 'contributions': None, 'organizationfollowssfas117ind': False},
+                {'ein': '346526754', 'taxyear': 2019, 'taxperiodend': None,
+                 'contributions': -1500, 'organizationfollowssfas117ind': None}]
+
+    def testConvertRows(self):
+        converter = Converter(self.TYPES)
+        self.assertEqual(converter.convert_rows(self.ROWS, list(self.ROWS[0])), self.EXPECTED)
+
+    def testConvertRowsWithoutNumpy(self):
+        numpy = convert.numpy
+        convert.numpy = None
+        try:
+            converter = Converter(self.TYPES)
+            self.assertEqual(converter.convert_rows(self.ROWS, list(self.ROWS[0])), self.EXPECTED)
+        finally:
+            convert.numpy = numpy
+
+    def testMalformed(self):
+        # One bad value only loses that value, not the rest of the batch
+        self.assertEqual(Converter.convert_column('int', ['12', 'n/a', None]).tolist(), [12, None, None])
+        self.assertEqual(Converter.convert_column('date', ['2019-12-31', '12/31/2019']).tolist(),
+                         [datetime.date(2019, 12, 31), None])
+        self.assertEqual(Converter.convert_value('bool', 'maybe'), None)
+        self.assertRaises(ValueError, Converter, {'contributions': 'money'})
+
+    def testColumnTypes(self):
+        types = Mapping.column_types('990')
+        self.assertEqual(types['taxyear'], 'int')
+        self.assertEqual(types['contributions'], 'int')
+        self.assertEqual(types['organizationfollowssfas117ind'], 'bool')
+        self.assertNotIn('ein', types)
+        self.assertEqual(Mapping.column_types('BondIssue')['bondissueddt'], 'date')
+        Converter(types)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testConvertRows']
+    unittest.main()
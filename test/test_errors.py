@@ -0,0 +1,89 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import io
+import json
+import os
+import pathlib
+import tempfile
+
+from irs990v2.catalog import ZipCatalog
+from irs990v2.errors import ErrorBudgetExceeded, ErrorSink, Failure
+from irs990v2.parse import Parser
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+
+    def testParserFailure(self):
+        errors = ErrorSink()
+        parser = Parser(errors=errors)
+        bad = io.StringIO('<Return>')
+        bad.name = '202000000000000001_public.xml'
+        self.assertIsNone(parser.parse(bad, ['990'], 'source'))
+        with open(self.TEST_DIR.joinpath('0421035452019.txt'), 'r', encoding='utf-8-sig', newline='') as f:
+            self.assertIsNotNone(parser.parse(f, ['990']))
+
+        self.assertEqual(errors.seen, 2)
+        self.assertEqual(len(errors.failures), 1)
+        failure, source = errors.failures[0]
+        self.assertEqual(failure.member, bad.name)
+        self.assertEqual(failure.stage, 'parse')
+        self.assertEqual(failure.error, 'ParseError')
+        self.assertEqual(source, 'source')
+
+    def testQuarantine(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            entry = next(ZipCatalog.from_dirs([self.TEST_DIR], tmp).members())
+            quarantine = os.path.join(tmp, 'quarantine')
+            errors = ErrorSink(os.path.join(tmp, 'errors.jsonl'), quarantine)
+            errors.record(Failure(entry.name, 'extract', 'KeyError', "'990'"), entry)
+            errors.close()
+
+            with open(os.path.join(tmp, 'errors.jsonl'), 'r') as f:
+                record = json.loads(f.readline())
+            self.assertEqual(record['archive'], os.path.abspath(entry.archive))
+            self.assertEqual(record['member'], entry.name)
+            self.assertEqual(record['crc'], entry.crc)
+            self.assertEqual(record['stage'], 'extract')
+
+            quarantined = list(ErrorSink.quarantined(quarantine))
+            self.assertEqual(len(quarantined), 1)
+            record, payload = quarantined[0]
+            with ZipCatalog.open(entry) as f:
+                self.assertEqual(payload.read_bytes(), f.read())
+
+            # Failing again on retry keeps where the filing came from, in place of the quarantine copy
+            errors = ErrorSink(os.path.join(tmp, 'errors.jsonl'), quarantine, append=True)
+            errors.record(Failure(str(payload), 'parse', 'ParseError', ''), record)
+            errors.close()
+            with open(os.path.join(tmp, 'errors.jsonl'), 'r') as f:
+                retried = json.loads(f.readlines()[-1])
+            self.assertEqual((retried['archive'], retried['member'], retried['crc'], retried['payload']),
+                             (record['archive'], record['member'], record['crc'], record['payload']))
+            self.assertEqual([r for r, _ in ErrorSink.quarantined(quarantine)], [retried])
+
+            ErrorSink.release(quarantine, record)
+            self.assertEqual(os.listdir(quarantine), [])
+
+    def testBudget(self):
+        errors = ErrorSink(max_errors=2)
+        errors.record(Failure('a', 'parse', 'ParseError', ''))
+        errors.record(Failure('b', 'parse', 'ParseError', ''))
+        with self.assertRaises(ErrorBudgetExceeded):
+            errors.record(Failure('c', 'parse', 'ParseError', ''))
+
+        errors = ErrorSink(max_rate=0.5, window=4)
+        errors.parsed(3)
+        errors.record(Failure('a', 'parse', 'ParseError', ''))
+        errors.parsed()
+        errors.record(Failure('b', 'parse', 'ParseError', ''))
+        with self.assertRaises(ErrorBudgetExceeded):
+            errors.record(Failure('c', 'parse', 'ParseError', ''))
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -4,9 +4,12 @@ Created on Dec 24, 2023
 @author: wlauer
 '''
 import unittest
+import io
 import pathlib
+import tempfile
 
 from irs990v2.index import Index
+from irs990v2.metrics import Metrics
 
 class Test(unittest.TestCase):
 
@@ -14,6 +17,12 @@ class Test(unittest.TestCase):
     TEST_FILE =TEST_DIR.joinpath("index.csv")
     TEST_FILE_2019 =TEST_DIR.joinpath("index_2019.csv")
 
+    def setUp(self):
+        # Catalogs of the test filings are kept out of the test directory
+        self.cache = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache.cleanup()
 
     def testIndex(self):
         with open(self.TEST_FILE, 'r', newline='') as f:
@@ -31,10 +40,54 @@ class Test(unittest.TestCase):
             
             self.assertEquals(ii, 3)
             
+    def testIndexFilter(self):
+        with open(self.TEST_FILE, 'r', newline='') as f:
+            idx = Index(f, return_types=Index.RETURN_TYPES)
+            self.assertEqual(len(idx), 1)
+            self.assertEqual(idx[-1]['OBJECT_ID'], '201741089349300319')
+            self.assertEqual(idx.column('RETURN_TYPE'), ['990'])
+        
+        with open(self.TEST_FILE, 'r', newline='') as f:
+            self.assertEqual(len(Index(f, tax_periods=['201412'])), 0)
+        
+        with open(self.TEST_FILE, 'r', newline='') as f:
+            records = list(Index.stream(f, return_types=['990EZ', '990EO']))
+            self.assertEqual([r['RETURN_TYPE'] for r in records], ['990EZ', '990EO'])
+    
+    def testLookup(self):
+        with open(self.TEST_FILE, 'r', newline='') as f:
+            idx = Index(f)
+        
+        self.assertEqual(idx.get('201632289349201303')['TAXPAYER_NAME'], 'CHATIEMAC CLUB')
+        self.assertIsNone(idx.get('000000000000000000'))
+        self.assertEqual([r['RETURN_TYPE'] for r in idx.for_ein('23-7111999')], ['990EO'])
+        self.assertEqual(idx.for_ein('999999999'), [])
+        self.assertEqual(idx[1:], [idx[1], idx[2]])
+        
+    def testDedup(self):
+        data = ('RETURN_ID,FILING_TYPE,EIN,TAX_PERIOD,SUB_DATE,TAXPAYER_NAME,RETURN_TYPE,DLN,OBJECT_ID\n'
+                '1,EFILE,042103545,201905,11/14/2019 9:01:02 AM,BOSTON COLLEGE,990,1,201903189349300100\n'
+                '2,EFILE,550307300,201712,2/5/2019 18:34,TRUCKING ASSOCIATION,990,2,201812509349300931\n'
+                '3,EFILE,04-2103545,201905,2/3/2020 10:15:00 AM,BOSTON COLLEGE,990,3,202000189349300200\n'
+                '4,EFILE,042103545,201805,11/14/2018 9:01:02 AM,BOSTON COLLEGE,990,4,201803189349300300\n'
+                '5,EFILE,042103545,201905,2/3/2020 10:15:00 AM,BOSTON COLLEGE,990,5,202000189349300100\n')
+        idx = Index(io.StringIO(data))
+        oids = lambda kept: [idx[i]['OBJECT_ID'] for i in kept]
+        self.assertEqual(oids(idx.dedup('latest')), ['201812509349300931', '202000189349300200', '201803189349300300'])
+        self.assertEqual(oids(idx.dedup('original')), ['201903189349300100', '201812509349300931', '201803189349300300'])
+        self.assertEqual(oids(idx.dedup('amended')), ['202000189349300200', '202000189349300100'])
+        with self.assertRaises(ValueError):
+            idx.dedup('newest')
+        
+        metrics = Metrics()
+        records = list(Index.indexed(io.StringIO(data), None, metrics, 'latest'))
+        self.assertEqual([r['RETURN_ID'] for r in records], ['2', '3', '4'])
+        self.assertEqual(metrics.counters['index_dedup_skipped'], 2)
+        
     def testProcess(self):
         with open(self.TEST_FILE, 'r', encoding='utf-8-sig', newline='') as file:
 
-            for filing in Index.process(file, self.TEST_DIR, ['990', 'BondIssue']):
+            for filing in Index.process(file, self.TEST_DIR, ['990', 'BondIssue'], cache_dir=self.cache.name):
                 d = next(filing['990'])
                 self.assertEqual(d['ein'], '042103545')
                 self.assertEqual(d['name'], 'TRUSTEES OF BOSTON COLLEGE')
@@ -55,7 +108,7 @@ class Test(unittest.TestCase):
 
     def testProcessZip(self):
         with open(self.TEST_FILE_2019, 'r', encoding='utf-8-sig', newline='') as file:
-            for filing in Index.processZip(file, self.TEST_DIR, None, ['990', 'BondIssue']):
+            for filing in Index.processZip(file, self.TEST_DIR, None, ['990', 'BondIssue'], cache_dir=self.cache.name):
                 d = next(filing['990'])
                 self.assertEqual(d['ein'], '550307300')
                 self.assertEqual(d['name'], 'WEST VIRGINIA TRUCKING ASSOCIATION INC')
@@ -68,6 +121,16 @@ class Test(unittest.TestCase):
                 self.assertEqual(len(list(bonds)), 0)
 
 
+    def testProcessZipGrouped(self):
+        # Listed against the order of the members in the zip file
+        data = ('RETURN_ID,FILING_TYPE,EIN,TAX_PERIOD,SUB_DATE,TAXPAYER_NAME,RETURN_TYPE,DLN,OBJECT_ID\n'
+                + ''.join(f'{i},EFILE,,201712,2/5/2019 18:34,,990,{i},{oid}\n' for i, oid in
+                          enumerate(['201812509349300931', '201812509349300101', '201812509349300736'])))
+        eins = lambda filings: [next(filing['990'])['ein'] for filing in filings]
+        grouped = eins(Index.processZip(io.StringIO(data), self.TEST_DIR, None, cache_dir=self.cache.name, max_open=1))
+        listed = eins(Index.processZip(io.StringIO(data), self.TEST_DIR, None, cache_dir=self.cache.name, index_order=True))
+        self.assertEqual(listed, [grouped[2], grouped[0], grouped[1]])
+
     def testExpandFilingsDir(self):    
         dirs = Index._expandFilingsDir(self.TEST_DIR)
     
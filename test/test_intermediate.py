@@ -0,0 +1,103 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import os
+import pathlib
+import tempfile
+
+from irs990v2.catalog import ZipCatalog
+from irs990v2.intermediate import IntermediateStore
+from irs990v2.mapping import MappingSnapshot, SchemaMapping
+from irs990v2.metrics import Metrics
+from irs990v2.parse import Parser
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+    TEST_ZIP = TEST_DIR.joinpath('2019_TEOS_XML_CT1.zip')
+    FORMS = ['990', 'BondIssue', 'Officer']
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.entries = list(ZipCatalog([self.TEST_ZIP], self.tmp.name).members())
+        self.path = os.path.join(self.tmp.name, 'store.sqlite')
+        snapshot = MappingSnapshot.current()
+        self.addCleanup(MappingSnapshot.install, snapshot)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _parse(self, store=None, forms=FORMS):
+        parser = Parser(store=store)
+        rows = dict()
+        for entry in self.entries:
+            with ZipCatalog.open(entry) as f:
+                filing = parser.parse_rows(f, forms, entry)
+            rows[entry.name] = {form: list(batch.dicts()) for form, batch in filing.items()}
+        return rows
+
+    def _extract(self, store, forms=FORMS):
+        metrics = Metrics()
+        rows = {member: {form: list(batch.dicts()) for form, batch in filing.items()}
+                for (_, member, _), filing in store.extract(forms, metrics=metrics)}
+        return rows, metrics.counters
+
+    def _change(self, schema, header=None, base=None, fields=None):
+        """Install mappings where one schema maps some header columns, base paths or fields otherwise"""
+        snapshot = MappingSnapshot.current()
+        schemas = list()
+        for mapping in snapshot.schemas:
+            if mapping.schema == schema:
+                mapping = SchemaMapping(
+                    mapping.schema,
+                    tuple((header or dict()).get(i, path) for i, path in enumerate(mapping.header)),
+                    tuple((form, (base or dict()).get(form, base_path),
+                           tuple((column, (fields or dict()).get((form, column), path)) for column, path in form_fields))
+                          for form, base_path, form_fields in mapping.forms))
+            schemas.append(mapping)
+        MappingSnapshot.install(snapshot._replace(digest=f'{snapshot.digest}-{len(schemas)}-{header}{base}{fields}',
+                                                  schemas=tuple(schemas)))
+
+    def testReextract(self):
+        store = IntermediateStore(self.path)
+        self.addCleanup(store.close)
+        expected = self._parse(store, ['990', 'BondIssue'])
+        store.sync()
+        self.assertEqual(len(store), len(self.entries))
+
+        # Officer was not stored, so it is extracted from the records
+        rows, counters = self._extract(store)
+        self.assertEqual(rows, self._parse())
+        self.assertEqual(counters, {'store_reextracted': 3})
+        rows, counters = self._extract(store)
+        self.assertEqual(counters, {'store_reused': 3})
+
+        # Only the filings of the changed schema are extracted again
+        self._change('2017', header={3: 'ReturnHeader/TaxPeriodEndDt'},
+                     fields={('990', 'contributions'): 'ReturnData/IRS990/CYProgramServiceRevenueAmt',
+                             ('BondIssue', 'issuername'): 'BondIssuerEIN'},
+                     base={'Officer': 'ReturnData/IRS990/Form990PartVIISectionAGrp | '
+                                       'ReturnData/IRS990ScheduleJ/RltdOrgOfficerTrstKeyEmplGrp'})
+        expected = self._parse()
+        self.assertEqual(expected[self.entries[0].name]['990'][0]['taxyear'],
+                         expected[self.entries[0].name]['990'][0]['taxperiodend'])
+        rows, counters = self._extract(store)
+        self.assertEqual(rows, expected)
+        self.assertGreater(len(expected[self.entries[0].name]['Officer']), 0)
+        self.assertEqual(counters, {'store_reextracted': 3})
+
+        # The stored rows were brought up to date, also in a new connection
+        store.sync()
+        reopened = IntermediateStore(self.path)
+        self.addCleanup(reopened.close)
+        rows, counters = self._extract(reopened)
+        self.assertEqual(rows, expected)
+        self.assertEqual(counters, {'store_reused': 3})
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testReextract']
+    unittest.main()
@@ -0,0 +1,40 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import pathlib
+
+from irs990.parse import Irs990Parser
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+
+    def testExtract2009(self):
+        row, cusip_rows, failure = Irs990Parser().extract(self.TEST_DIR.joinpath('0421035452009.txt'))
+        self.assertIsNone(failure)
+        self.assertEqual(row['TaxYr'], '2009')
+        self.assertEqual(row['TotalAssets'], '3092937771')
+        self.assertEqual(len(cusip_rows), 3)
+        self.assertEqual(cusip_rows[0]['CUSIP'], '57585K6M5')
+        self.assertEqual(cusip_rows[0]['IssuerName'], 'Mass Health& Education Facilities Auth - Series N')
+        self.assertEqual(cusip_rows[0]['EIN'], '042103545')
+
+    def testExtract2019(self):
+        row, cusip_rows, failure = Irs990Parser().extract(self.TEST_DIR.joinpath('0421035452019.txt'))
+        self.assertIsNone(failure)
+        self.assertEqual(row['TotalAssets'], '5201949007')
+        self.assertEqual(len(cusip_rows), 5)
+        self.assertEqual(cusip_rows[0]['CUSIP'], '57583RL45')
+        self.assertEqual(cusip_rows[0]['BondIssuedDt'], '2009-05-21')
+
+    def testFailure(self):
+        row, cusip_rows, failure = Irs990Parser().extract(self.TEST_DIR.joinpath('index.csv'))
+        self.assertEqual((row, cusip_rows), (dict(), list()))
+        self.assertEqual(failure[0].stage, 'parse')
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testExtract2009']
+    unittest.main()
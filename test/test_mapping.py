@@ -4,8 +4,12 @@ Created on Dec 24, 2023
 @author: wlauer
 '''
 import unittest
+import os
+import json
+import pickle
+import tempfile
 
-from irs990v2.mapping import Mapping
+from irs990v2.mapping import Mapping, MappingSnapshot
 
 class Test(unittest.TestCase):
 
@@ -55,6 +59,31 @@ class Test(unittest.TestCase):
         s = Mapping.all_mappings('990')
         
         self.assertEqual(len(s), 51)
+        self.assertEqual(s[:2], ['contributions', 'programrevenue'])
+        self.assertEqual(Mapping.all_mappings('BondIssue'), ['cusip', 'issuerein', 'issuername', 'bondissueddt', 'issuepriceamt'])
+    
+    def testSnapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = MappingSnapshot.load(tmp)
+            self.assertEqual(snapshot, MappingSnapshot.compile())
+            self.assertEqual(pickle.loads(pickle.dumps(snapshot)), snapshot)
+            # Cached as JSON, which loads back to the same snapshot
+            cached, = os.listdir(tmp)
+            self.assertTrue(cached.endswith('.json'))
+            with open(os.path.join(tmp, cached)) as f:
+                self.assertEqual(MappingSnapshot.from_dict(json.load(f)), snapshot)
+        
+        m = snapshot.schema('2016v3.1')
+        self.assertEqual(m.schema, '2016')
+        self.assertEqual(m.header[0], 'ReturnHeader/Filer/EIN')
+        self.assertEqual(m.base_path('BondIssue'), 'ReturnData/IRS990ScheduleK/TaxExemptBondsIssuesGrp')
+        self.assertEqual(m.fields('990')[0], ('contributions', 'CYContributionsGrantsAmt'))
+        self.assertEqual(len(m.fields('990')), 51)
+        self.assertRaises(KeyError, snapshot.schema, '2001v1.0')
+
+        # A form column named like a header column would overwrite the filer's value in its rows
+        with self.assertRaises(ValueError):
+            MappingSnapshot._check_columns('2019.ini', 'RelatedOrg', ['part', 'name', 'ein'])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import csv
+import glob
+import io
+import os
+import pathlib
+import shutil
+import tempfile
+
+import parse990AllZip
+from irs990v2.merge import MergeError, ShardMerge
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+    ZIP = '2019_TEOS_XML_CT1.zip'
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        shutil.copy(self.TEST_DIR.joinpath(self.ZIP), self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, prefix: str, *options: str):
+        parse990AllZip.main(['-d', self.tmp.name, '-p', prefix, '-f', '990', 'BondIssue',
+                             '-c', os.path.join(self.tmp.name, 'cache'), *options])
+
+    def _rows(self, path: str) -> list[dict[str, str]]:
+        with open(path, 'r', newline='') as f:
+            return list(csv.DictReader(f))
+
+    def testMerge(self):
+        self._run('full')
+        for i in range(3):
+            self._run('run', '--shard', f'{i}/3')
+        manifests = glob.glob(os.path.join(self.tmp.name, 'run.*.shard.json'))
+        self.assertEqual(len(manifests), 3)
+
+        merge = ShardMerge(reversed(manifests))
+        merge.check()
+        self.assertEqual(merge.filings, 3)
+        outputs = merge.merge(self.tmp.name, 'merged')
+        self.assertEqual(outputs['990'], os.path.join(self.tmp.name, 'merged-990.csv'))
+
+        full = self._rows(os.path.join(self.tmp.name, 'full-990.csv'))
+        merged = self._rows(outputs['990'])
+        key = lambda row: row['ein']
+        self.assertEqual(sorted(merged, key=key), sorted(full, key=key))
+        # Merging again gives the same file
+        with open(outputs['990'], 'rb') as f:
+            first = f.read()
+        ShardMerge(manifests).merge(self.tmp.name, 'merged')
+        with open(outputs['990'], 'rb') as f:
+            self.assertEqual(f.read(), first)
+
+    def testCheck(self):
+        for i in range(2):
+            self._run('run', '--shard', f'{i}/2')
+        manifests = sorted(glob.glob(os.path.join(self.tmp.name, 'run.*.shard.json')))
+        with self.assertRaisesRegex(MergeError, 'Shards 1/2 have not finished'):
+            ShardMerge(manifests[:1])
+
+        index = ('RETURN_ID,FILING_TYPE,EIN,TAX_PERIOD,SUB_DATE,TAXPAYER_NAME,RETURN_TYPE,DLN,OBJECT_ID\n'
+                 '1,EFILE,550307300,201712,2/5/2019 18:34,TRUCKING ASSOCIATION,990,1,201812509349300931\n'
+                 '2,EFILE,999999999,201712,2/5/2019 18:34,MISSING,990,2,201800000000000000\n')
+        with self.assertRaisesRegex(MergeError, '1 filings of the index .* 201800000000000000'):
+            ShardMerge(manifests).check(io.StringIO(index))
+
+        # A shard that committed a filing it does not own
+        with open(os.path.join(self.tmp.name, 'run.0-of-2.checkpoint'), 'r') as f:
+            committed = f.read()
+        with open(os.path.join(self.tmp.name, 'run.1-of-2.checkpoint'), 'a') as f:
+            f.write(committed)
+        with self.assertRaisesRegex(MergeError, 'belongs to another shard'):
+            ShardMerge(manifests).check()
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testMerge']
+    unittest.main()
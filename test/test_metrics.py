@@ -0,0 +1,75 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import io
+import pathlib
+
+from irs990v2.metrics import Latency, Metrics, Progress
+from irs990v2.parse import Parser
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+
+    def testParserMetrics(self):
+        metrics = Metrics(top=3)
+        parser = Parser(metrics=metrics)
+        files = sorted(self.TEST_DIR.glob('042103545*.txt'))
+        for file in files:
+            with open(file, 'r', encoding='utf-8-sig', newline='') as f:
+                parser.parse(f, ['990', 'BondIssue'])
+        self.assertIsNone(parser.parse(io.StringIO('<Return>'), ['990']))
+
+        m = metrics.to_dict()
+        self.assertEqual(m['counters']['filings'], len(files) + 1)
+        self.assertEqual(m['counters']['filings_failed'], 1)
+        self.assertEqual(m['counters']['rows.990'], len(files))
+        self.assertGreater(m['counters']['rows.BondIssue'], 0)
+        self.assertGreater(m['counters']['bytes_read'], 0)
+        self.assertEqual(set(m['timers']), {'read', 'parse', 'extract'})
+        self.assertEqual(m['timers']['extract']['calls'], len(files))
+
+        self.assertEqual(len(m['slowest']), 3)
+        self.assertTrue(m['slowest'][0]['version'].startswith('20'))
+        seconds = [f['seconds'] for f in m['slowest']]
+        self.assertEqual(seconds, sorted(seconds, reverse=True))
+
+    def testMerge(self):
+        worker = Metrics()
+        worker.count('filings', 2)
+        worker.add_time('parse', 1.5)
+        worker.filing('a_public.xml', 1.0, 100, '2019v5.1')
+
+        metrics = Metrics()
+        metrics.count('filings')
+        metrics.merge(worker.to_dict())
+        m = metrics.to_dict()
+        self.assertEqual(m['counters']['filings'], 3)
+        self.assertEqual(m['timers']['parse'], {'seconds': 1.5, 'calls': 1})
+        self.assertEqual(m['slowest'][0]['filing'], 'a_public.xml')
+
+    def testProgress(self):
+        out = io.StringIO()
+        progress = Progress(200, 3600, out)
+        progress.update(50)
+        self.assertEqual(out.getvalue(), '')
+        progress.report()
+        self.assertRegex(out.getvalue(), r'^50/200 filings \(25\.0%\) [0-9.]+ filings/sec ETA [0-9]+:[0-9]{2}:[0-9]{2}\n$')
+
+    def testLatency(self):
+        latency = Latency(window=100)
+        self.assertEqual(latency.percentiles(), dict())
+        for ms in range(1, 201):
+            latency.add(ms / 1000)
+        # Only the last 100 are in the window
+        self.assertEqual(latency.percentiles((50, 99)), {50: 0.15, 99: 0.199})
+        self.assertEqual(latency.to_dict(), {'count': 200, 'p50_ms': 150.0, 'p90_ms': 190.0, 'p99_ms': 199.0,
+                                             'max_ms': 200.0})
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testParserMetrics']
+    unittest.main()
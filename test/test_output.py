@@ -0,0 +1,221 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import csv
+import os
+import sqlite3
+import tempfile
+
+from irs990v2.batch import RowBatch, RowSchema
+from irs990v2.output import AggregateSink, CsvSink, ParquetSink, SqliteSink, open_sink
+from irs990v2.plan import ExtractionPlan
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Test(unittest.TestCase):
+
+    FIELDNAMES = ['ein', 'name', 'contributions']
+    ROWS = [{'ein': '042103545', 'name': 'TRUSTEES OF BOSTON COLLEGE', 'contributions': '210570096'},
+            {'ein': '550307300', 'name': 'WEST VIRGINIA TRUCKING ASSOCIATION INC', 'contributions': None}]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, '990')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def testCsv(self):
+        sink = open_sink('csv', self.path, self.FIELDNAMES)
+        self.assertIsInstance(sink, CsvSink)
+        sink.write(self.ROWS[:1])
+        offset = sink.sync()
+        sink.write(self.ROWS[1:])
+        sink.close()
+
+        # Resuming drops the rows written after the sync
+        sink = CsvSink(self.path, self.FIELDNAMES, offset)
+        sink.close()
+        with open(self.path + '.csv', 'r', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows, [self.ROWS[0]])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def testParquet(self):
+        directory = self.path + '.parquet'
+        sink = open_sink('parquet', self.path, self.FIELDNAMES, row_group_size=2, part_rows=4)
+        self.assertIsInstance(sink, ParquetSink)
+        sink.write(self.ROWS)
+        self.assertEqual(sink.sync(), [0, 1])
+        sink.write(self.ROWS)
+        # The deltas fill a part, compacted into a file of full row groups
+        self.assertEqual(sink.sync(), [1, 0])
+        sink.write(self.ROWS[:1])
+        self.assertEqual(sink.sync(), [1, 1])
+        sink.close()
+        self.assertEqual(sorted(os.listdir(directory)), ['part-00000.parquet', 'part-00001.parquet'])
+
+        table = pyarrow.parquet.read_table(directory)
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.column_names, self.FIELDNAMES)
+        self.assertEqual(table.to_pylist()[:2], self.ROWS)
+        parts = pyarrow.parquet.ParquetFile(os.path.join(directory, 'part-00000.parquet'))
+        self.assertEqual(parts.metadata.num_row_groups, 2)
+
+        # Resuming from the last sync keeps the part compacted on closing, and stray files are left alone
+        with open(os.path.join(directory, 'part-notes.txt'), 'w'):
+            pass
+        ParquetSink(self.path, self.FIELDNAMES, [1, 1]).close()
+        os.remove(os.path.join(directory, 'part-notes.txt'))
+        self.assertEqual(pyarrow.parquet.read_table(directory).num_rows, 5)
+        # Resuming from an earlier sync drops the part written after it
+        ParquetSink(self.path, self.FIELDNAMES, [1, 0]).close()
+        self.assertEqual(pyarrow.parquet.read_table(directory).num_rows, 4)
+
+        # Resuming from before a compaction drops the part, rebuilt from the deltas synced
+        sink = ParquetSink(self.path, self.FIELDNAMES, row_group_size=2, part_rows=4)
+        sink.write(self.ROWS)
+        sink.sync()
+        sink.write(self.ROWS)
+        sink.sync()
+        ParquetSink(self.path, self.FIELDNAMES, [0, 1]).close()
+        self.assertEqual(os.listdir(directory), ['part-00000.parquet'])
+        self.assertEqual(pyarrow.parquet.read_table(directory).to_pylist(), self.ROWS)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def testParquetTyped(self):
+        sink = ParquetSink(self.path, self.FIELDNAMES, types={'contributions': 'int'})
+        sink.write(self.ROWS)
+        sink.close()
+
+        table = pyarrow.parquet.read_table(self.path + '.parquet')
+        self.assertEqual(str(table.schema.field('contributions').type), 'int64')
+        self.assertEqual(table.column('contributions').to_pylist(), [210570096, None])
+
+    def testSqlite(self):
+        fieldnames = ['ein', 'taxyear', 'taxperiodend', 'contributions']
+        rows = [{'ein': '042103545', 'taxyear': '2019', 'taxperiodend': '2020-05-31', 'contributions': '210570096'},
+                {'ein': '550307300', 'taxyear': '2019', 'taxperiodend': '2019-12-31', 'contributions': None}]
+        database = os.path.join(self.tmp.name, 'filings.sqlite')
+        sink = open_sink('sqlite', self.path, fieldnames, database=database, table='990',
+                         types={'taxyear': 'int', 'taxperiodend': 'date', 'contributions': 'int'})
+        self.assertIsInstance(sink, SqliteSink)
+        sink.write(rows[:1])
+        offset = sink.sync()
+        sink.write(rows[1:])
+        sink.close()
+
+        # Resuming drops the rows committed after the checkpoint
+        SqliteSink(self.path, fieldnames, offset, database=database, table='990').close()
+        with sqlite3.connect(database) as connection:
+            self.assertEqual(connection.execute('SELECT * FROM "990"').fetchall(),
+                             [('042103545', 2019, '2020-05-31', 210570096)])
+            indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            self.assertEqual(indexes, {'990_ein_taxyear', '990_ein_taxperiodend'})
+
+        # A later run replaces the rows of the filings it loads again, and adds the others
+        amended = rows[0] | {'contributions': '1'}
+        sink = SqliteSink(self.path, fieldnames, database=database, table='990')
+        sink.write([amended])
+        sink.write(rows[1:])
+        sink.close()
+        with sqlite3.connect(database) as connection:
+            self.assertEqual(connection.execute('SELECT ein, contributions FROM "990" ORDER BY ein').fetchall(),
+                             [('042103545', 1), ('550307300', None)])
+
+    def testSqliteAmendedWithoutRows(self):
+        schema = RowSchema('BondIssue', ExtractionPlan.HEADER + ('cusip',))
+        header = ('042103545', 'TRUSTEES OF BOSTON COLLEGE', '990', '2019', '2019-06-01', '2020-05-31')
+        other = ('550307300', 'WEST VIRGINIA TRUCKING ASSOCIATION INC', '990', '2019', '2019-01-01', '2019-12-31')
+        database = os.path.join(self.tmp.name, 'filings.sqlite')
+        types = {'taxyear': 'int', 'taxperiodstart': 'date', 'taxperiodend': 'date'}
+        sink = SqliteSink(self.path, list(schema.fieldnames), database=database, table='BondIssue', types=types)
+        sink.write_batch(RowBatch(schema, [header + ('57585K6M5',), header + ('57583RPC3',), other + ('1',)],
+                                  [(header, 2), (other, 1)]))
+        sink.close()
+
+        # The amended filing has no bonds, so its earlier rows go, and the other filing's rows stay
+        sink = SqliteSink(self.path, list(schema.fieldnames), database=database, table='BondIssue', types=types)
+        sink.write_batch(RowBatch(schema, [], [(header, 0)]))
+        sink.close()
+        with sqlite3.connect(database) as connection:
+            self.assertEqual(connection.execute('SELECT ein, cusip FROM BondIssue').fetchall(), [('550307300', '1')])
+
+    def testSqliteAmendedInSameLoad(self):
+        schema = RowSchema('BondIssue', ExtractionPlan.HEADER + ('cusip',))
+        header = ('042103545', 'TRUSTEES OF BOSTON COLLEGE', '990', '2019', '2019-06-01', '2020-05-31')
+        other = ('550307300', 'WEST VIRGINIA TRUCKING ASSOCIATION INC', '990', '2019', '2019-01-01', '2019-12-31')
+        database = os.path.join(self.tmp.name, 'filings.sqlite')
+        types = {'taxyear': 'int', 'taxperiodstart': 'date', 'taxperiodend': 'date'}
+
+        # A first load keeps the last filing of each key, whether the original is in the same batch or an earlier one
+        sink = SqliteSink(self.path, list(schema.fieldnames), database=database, table='BondIssue', types=types)
+        sink.write_batch(RowBatch(schema, [header + ('57585K6M5',), header + ('57583RPC3',), other + ('1',)],
+                                  [(header, 2), (other, 1)]))
+        sink.sync()
+        sink.write_batch(RowBatch(schema, [other + ('2',), header + ('57585K6M5',)], [(other, 1), (header, 1), (other, 0)]))
+        sink.close()
+        with sqlite3.connect(database) as connection:
+            self.assertEqual(connection.execute('SELECT ein, cusip FROM BondIssue').fetchall(), [('042103545', '57585K6M5')])
+            self.assertEqual(connection.execute("SELECT count(*) FROM sqlite_master WHERE name = 'BondIssue_filings'")
+                             .fetchone()[0], 0)
+
+        # An upsert keeps only the amendment of an original in the same batch
+        sink = SqliteSink(self.path, list(schema.fieldnames), database=database, table='BondIssue', types=types)
+        sink.write_batch(RowBatch(schema, [header + ('A',), header + ('B',), header + ('C',)], [(header, 2), (header, 1)]))
+        sink.close()
+        with sqlite3.connect(database) as connection:
+            self.assertEqual(connection.execute('SELECT ein, cusip FROM BondIssue').fetchall(), [('042103545', 'C')])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def testAggregate(self):
+        fieldnames = ['ein', 'name', 'returntype', 'taxyear', 'taxperiodstart', 'taxperiodend', 'totalrevenue']
+        rows = [{'ein': '042103545', 'returntype': '990', 'taxyear': '2019', 'totalrevenue': '100'},
+                {'ein': '550307300', 'returntype': '990', 'taxyear': '2019', 'totalrevenue': '300'},
+                {'ein': '550307300', 'returntype': '990', 'taxyear': '2020', 'totalrevenue': None}]
+        types = {'taxyear': 'int', 'totalrevenue': 'int'}
+        sink = open_sink('aggregate', self.path, fieldnames, types=types, table='990', quantiles=[0.5])
+        self.assertIsInstance(sink, AggregateSink)
+        sink.write(rows[:1])
+        offset = sink.sync()
+        sink.write(rows[1:])
+        sink.close()
+
+        summary = [['taxyear', 'returntype', 'column', 'rows', 'count', 'sum', 'mean', 'min', 'max', 'p50'],
+                   ['2019', '990', 'totalrevenue', '2', '2', '400', '200.0', '100', '300', '100'],
+                   ['2020', '990', 'totalrevenue', '1', '0', '', '', '', '', '']]
+        with open(AggregateSink.summary_path(sink.path), 'r', newline='') as f:
+            self.assertEqual(list(csv.reader(f)), summary)
+
+        # Resuming starts from the aggregate saved at the checkpoint, without the rows written after it
+        sink = AggregateSink(self.path, fieldnames, offset, types=types, table='990', quantiles=[0.5])
+        sink.write(rows[1:2])
+        sink.close()
+        with open(AggregateSink.summary_path(sink.path), 'r', newline='') as f:
+            self.assertEqual(list(csv.reader(f)), summary[:2])
+
+        # The aggregates of shards merge into the summary of all their rows
+        other = os.path.join(self.tmp.name, 'other')
+        sink = AggregateSink(other, fieldnames, types=types, table='990', quantiles=[0.5])
+        sink.write(rows[2:])
+        sink.close()
+        merged = AggregateSink.merge([self.path + AggregateSink.EXTENSION, other + AggregateSink.EXTENSION],
+                                     os.path.join(self.tmp.name, 'merged'))
+        with open(AggregateSink.summary_path(merged), 'r', newline='') as f:
+            self.assertEqual(list(csv.reader(f)), summary)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testCsv']
+    unittest.main()
@@ -0,0 +1,142 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import csv
+import os
+import tempfile
+
+import panel990
+from irs990v2.panel import PanelBuilder, PanelError
+
+class Test(unittest.TestCase):
+
+    FIELDNAMES = ['ein', 'name', 'returntype', 'taxyear', 'taxperiodstart', 'taxperiodend', 'totalrevenue']
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name: str, fieldnames: list[str], rows: list[list[str]]) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            writer.writerows(rows)
+        return path
+
+    def testPanel(self):
+        first = self.write('first-990.csv', self.FIELDNAMES, [
+            ['550307300', 'TRUCKING ASSN', '990', '2019', '2019-01-01', '2019-12-31', '300'],
+            ['042103545', 'BOSTON COLLEGE', '990', '2019', '2019-06-01', '2020-05-31', '100'],
+            ['042103545', 'BOSTON COLLEGE', '990', '2017', '2017-06-01', '2018-05-31', '80']])
+        # A later run with a new column, loading one filing again as amended, and a short year
+        second = self.write('second-990.csv', self.FIELDNAMES + ['totalexpenses'], [
+            ['042103545', 'TRUSTEES OF BOSTON COLLEGE', '990', '2019', '2019-06-01', '2020-05-31', '110', '90'],
+            ['550307300', 'TRUCKING ASSN', '990', '2020', '2020-01-01', '2020-06-30', '10', '5'],
+            ['550307300', 'TRUCKING ASSN', '990', '2020', '2020-07-01', '2020-12-31', '20', '15']])
+
+        # A run of a row at a time spills every row, and merging three at a time takes two passes
+        for memory_mb, fan_in in ((PanelBuilder.MEMORY_MB, PanelBuilder.FAN_IN), (0, 3)):
+            panel = PanelBuilder([first, second], memory_mb, self.tmp.name, fan_in)
+            try:
+                fieldnames, rows = panel.long()
+                self.assertEqual(fieldnames, self.FIELDNAMES + ['totalexpenses'])
+                self.assertEqual(list(rows), [
+                    ('042103545', 'BOSTON COLLEGE', '990', '2017', '2017-06-01', '2018-05-31', '80', None),
+                    ('042103545', 'TRUSTEES OF BOSTON COLLEGE', '990', '2019', '2019-06-01', '2020-05-31', '110', '90'),
+                    ('550307300', 'TRUCKING ASSN', '990', '2019', '2019-01-01', '2019-12-31', '300', None),
+                    ('550307300', 'TRUCKING ASSN', '990', '2020', '2020-07-01', '2020-12-31', '20', '15')])
+                self.assertEqual((panel.rows, panel.duplicates, panel.years), (6, 2, ['2017', '2019', '2020']))
+                self.assertEqual(panel.spills, 1 if fan_in == PanelBuilder.FAN_IN else 6)
+            finally:
+                panel.close()
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['first-990.csv', 'second-990.csv'])
+
+        # The original policy keeps the first run's row of the filing loaded twice
+        panel = PanelBuilder([first, second], dedup='original')
+        try:
+            fieldnames, rows = panel.wide(['totalrevenue'])
+            self.assertEqual(fieldnames, ['ein', 'name', 'totalrevenue_2017', 'totalrevenue_2019', 'totalrevenue_2020'])
+            self.assertEqual(list(rows), [('042103545', 'BOSTON COLLEGE', '80', '100', None),
+                                          ('550307300', 'TRUCKING ASSN', None, '300', '20')])
+        finally:
+            panel.close()
+
+        with self.assertRaises(PanelError):
+            PanelBuilder([first]).long(['nosuchcolumn'])
+
+    def testSeveralRowsPerFiling(self):
+        fieldnames = self.FIELDNAMES[:-1] + ['cusip']
+        header = ['042103545', 'TRUSTEES OF BOSTON COLLEGE', '990', '2019', '2019-06-01', '2020-05-31']
+        first = self.write('first-BondIssue.csv', fieldnames, [header + ['57585K6M5'], header + ['57583RPC3']])
+        # The filing amended with three bonds, one fewer than the two runs have together
+        second = self.write('second-BondIssue.csv', fieldnames, [header + ['57585K6M5'], header + ['57583RL45'],
+                                                                  header + ['57583RPC3']])
+
+        for dedup, cusips in (('latest', ['57585K6M5', '57583RL45', '57583RPC3']), ('original', ['57585K6M5', '57583RPC3'])):
+            panel = PanelBuilder([first, second], memory_mb=0, temp_dir=self.tmp.name, fan_in=2, dedup=dedup)
+            try:
+                _, rows = panel.long(['cusip'])
+                # Every row of the kept run's filing, in the order it has them
+                self.assertEqual([row[-1] for row in rows], cusips)
+                self.assertEqual(panel.duplicates, 5 - len(cusips))
+
+                _, rows = panel.wide(['cusip'])
+                with self.assertRaises(PanelError):
+                    list(rows)
+            finally:
+                panel.close()
+        with self.assertRaises(PanelError):
+            PanelBuilder([self.write('index.csv', ['EIN', 'TAX_PERIOD'], [])])
+
+    def testAmendedInSameRun(self):
+        original = ['042103545', 'BOSTON COLLEGE', '990', '2019', '2019-06-01', '2020-05-31', '100']
+        amended = ['042103545', 'TRUSTEES OF BOSTON COLLEGE', '990', '2019', '2019-06-01', '2020-05-31', '110']
+        other = ['550307300', 'TRUCKING ASSN', '990', '2019', '2019-01-01', '2019-12-31', '300']
+        # The original and its amendment next to each other, and apart
+        for rows in ([original, amended, other], [original, other, amended]):
+            path = self.write('run-990.csv', self.FIELDNAMES, rows)
+            for dedup, kept in (('latest', amended), ('original', original)):
+                panel = PanelBuilder([path], memory_mb=0, temp_dir=self.tmp.name, fan_in=2, dedup=dedup)
+                try:
+                    self.assertEqual(panel.form, '990')
+                    _, rows = panel.long()
+                    self.assertEqual(list(rows), [tuple(kept), tuple(other)])
+                    self.assertEqual(panel.duplicates, 1)
+                    _, rows = panel.wide(['totalrevenue'])
+                    self.assertEqual(list(rows), [('042103545', kept[1], kept[-1]), ('550307300', 'TRUCKING ASSN', '300')])
+                finally:
+                    panel.close()
+
+        # A form with several rows per filing tells its filings apart when they are not next to each other
+        fieldnames = self.FIELDNAMES[:-1] + ['cusip']
+        header = original[:-1]
+        path = self.write('run-BondIssue.csv', fieldnames, [header + ['57585K6M5'], header + ['57583RPC3'],
+                                                           other[:-1] + ['1'], header + ['57583RL45']])
+        panel = PanelBuilder([path])
+        try:
+            self.assertEqual(panel.form, 'BondIssue')
+            _, rows = panel.long(['cusip'])
+            self.assertEqual([row[-1] for row in rows], ['57583RL45', '1'])
+            self.assertEqual(panel.duplicates, 2)
+        finally:
+            panel.close()
+
+    def testFailedPanelRemoved(self):
+        fieldnames = self.FIELDNAMES[:-1] + ['cusip']
+        header = ['042103545', 'TRUSTEES OF BOSTON COLLEGE', '990', '2019', '2019-06-01', '2020-05-31']
+        path = self.write('run-BondIssue.csv', fieldnames, [header + ['57585K6M5'], header + ['57583RPC3']])
+        output = os.path.join(self.tmp.name, 'panel')
+        with self.assertRaises(SystemExit):
+            panel990.main([path, '-o', output, '-l', 'wide'])
+        self.assertFalse(os.path.exists(output + '.csv'))
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testPanel']
+    unittest.main()
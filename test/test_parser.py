@@ -51,6 +51,29 @@ class Test(unittest.TestCase):
             self.assertEqual(row['returntype'], '990')
             self.assertEqual(row['name'], 'TRUSTEES OF BOSTON COLLEGE')
             self.assertIsNone(row['priorperiodadjustments'])
+
+    def testRelatedOrg(self):
+        # The related organization's name and EIN have columns of their own, so every row keeps the filer's
+        for streaming in (False, True):
+            with open(self.TEST_FILE_2019, 'r', encoding='utf-8-sig', newline='') as file:
+                rows = list(Parser(streaming).parse(file, ['RelatedOrg'])['RelatedOrg'])
+
+            self.assertEqual(len(rows), 4)
+            for row in rows:
+                self.assertEqual(row['ein'], '042103545')
+                self.assertEqual(row['name'], 'TRUSTEES OF BOSTON COLLEGE')
+                self.assertIsNone(row['relatedein'])
+            self.assertEqual(rows[0]['relatedname'], 'CHARITABLE REMAINDER TRUSTS (16)')
+
+    def testParseStreaming(self):
+        for test_file in sorted(self.TEST_DIR.glob('042103545*.txt')):
+            with open(test_file, 'r', encoding='utf-8-sig', newline='') as file:
+                expected = Parser().parse(file, ['990', 'BondIssue'])
+                expected = {f: list(rows) for f, rows in expected.items()}
+
+            with open(test_file, 'r', encoding='utf-8-sig', newline='') as file:
+                r = Parser(streaming=True).parse(file, ['990', 'BondIssue'])
+                self.assertEqual({f: list(rows) for f, rows in r.items()}, expected, test_file.name)
         
 
 if __name__ == "__main__":
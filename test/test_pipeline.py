@@ -0,0 +1,83 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import pathlib
+import tempfile
+from zipfile import ZipFile
+
+from irs990v2.catalog import ZipCatalog
+from irs990v2.parse import Parser
+from irs990v2.pipeline import Pipeline
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+    TEST_ZIP = TEST_DIR.joinpath('2019_TEOS_XML_CT1.zip')
+    FORMS = ['990', 'BondIssue']
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def _units(self):
+        return list(ZipCatalog([self.TEST_ZIP], self.cache_dir.name).members()) * 5
+
+    def _sequential(self):
+        parser = Parser()
+        rows = {f: list() for f in self.FORMS}
+        with ZipFile(self.TEST_ZIP) as archive:
+            for entry in self._units():
+                filing = parser.parse(archive.open(entry.name, mode='r'), self.FORMS)
+                for f in self.FORMS:
+                    rows[f].extend(filing[f])
+        return rows
+
+    def _run(self, pipeline):
+        rows = {f: list() for f in self.FORMS}
+        units = list()
+        for batch, batch_rows in pipeline.run(self._units()):
+            units.extend(batch)
+            for f in self.FORMS:
+                rows[f].extend(batch_rows[f].dicts())
+        self.assertEqual(sorted(units), sorted(self._units()))
+        return rows
+
+    def testOrdered(self):
+        pipeline = Pipeline(2, self.FORMS, batch_size=2, window=2)
+        rows = self._run(pipeline)
+
+        self.assertEqual(rows, self._sequential())
+        self.assertEqual(len(rows['990']), 15)
+        self.assertEqual(rows['990'][0]['ein'], '346526754')
+
+    def testUnitsError(self):
+        # An error reading the units reaches the consumer, after the batches read before it
+        def units():
+            yield from self._units()[:3]
+            raise KeyError('bad index row')
+
+        pipeline = Pipeline(2, self.FORMS, batch_size=2)
+        batches = list()
+        with self.assertRaises(KeyError):
+            for batch, _ in pipeline.run(units()):
+                batches.extend(batch)
+        self.assertEqual(batches, self._units()[:2])
+
+    def testUnordered(self):
+        pipeline = Pipeline(3, self.FORMS, streaming=True, batch_size=1, ordered=False)
+        rows = self._run(pipeline)
+
+        expected = self._sequential()
+        for f in self.FORMS:
+            key = lambda r: tuple(str(v) for v in r.values())
+            self.assertEqual(sorted(rows[f], key=key), sorted(expected[f], key=key))
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testOrdered']
+    unittest.main()
@@ -0,0 +1,109 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import pathlib
+import xml.etree.ElementTree as ET
+
+from irs990v2.flat import FlatFiling
+from irs990v2.mapping import Mapping, MappingSnapshot, SchemaMapping
+from irs990v2.plan import ExtractionPlan
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+    NAMESPACE = {'':'http://www.irs.gov/efile'}
+
+    def _find(self, tree, field):
+        if field != '':
+            elem = tree.findall(field, self.NAMESPACE)
+            if len(elem) > 0:
+                return elem[0].text
+        return None
+
+    def testPlanCaching(self):
+        self.assertIs(ExtractionPlan.for_schema('2016v3.0'), ExtractionPlan.for_schema('2016v3.1'))
+        self.assertIsNot(ExtractionPlan.for_schema('2016v3.1'), ExtractionPlan.for_schema('2017v2.2'))
+
+    def testMatchesFindall(self):
+        for test_file in sorted(self.TEST_DIR.glob('042103545*.txt')):
+            with open(test_file, 'r', encoding='utf-8-sig', newline='') as file:
+                root = ET.parse(file).getroot()
+
+            mapping = Mapping(root.get('returnVersion'))
+            plan = ExtractionPlan.for_schema(root.get('returnVersion'))
+            header, details = plan.extract(root, ['990', 'BondIssue'])
+
+            self.assertEqual(header['ein'], self._find(root, mapping.ein))
+            self.assertEqual(header['taxperiodend'], self._find(root, mapping.tax_period_end_date))
+
+            for form in ['990', 'BondIssue']:
+                expected = [{name: self._find(f, field) for name, field in mapping.fields(form)}
+                            for f in root.iterfind(mapping.base_path(form), self.NAMESPACE)]
+                self.assertEqual(details[form], expected, test_file.name)
+
+    def testRepeatingGroups(self):
+        forms = ['Officer', 'OfficerCompensation', 'RelatedOrg', 'Endowment']
+        for test_file in sorted(self.TEST_DIR.glob('042103545*.txt')):
+            with open(test_file, 'r', encoding='utf-8-sig', newline='') as file:
+                root = ET.parse(file).getroot()
+
+            mapping = Mapping(root.get('returnVersion'))
+            _, details = ExtractionPlan.for_schema(root.get('returnVersion')).extract(root, forms + ['990'])
+            order = {elem: i for i, elem in enumerate(root.iter())}
+
+            for form in forms:
+                expected = [{name: self._union(f, field, order, mapping.base_path(form)) for name, field in mapping.fields(form)}
+                            for f in self._union_all(root, mapping.base_path(form), order)]
+                self.assertEqual(details[form], expected, f'{test_file.name} {form}')
+            self.assertGreater(len(details['Officer']), 50)
+            self.assertEqual(len(details['OfficerCompensation']), len(root.findall('.//{*}IRS990ScheduleJ/*[{*}TotalCompensationFilingOrg]'))
+                             + len(root.findall('.//{*}IRS990ScheduleJ/*[{*}TotalCompensationFilingOrgAmt]')))
+
+        self.assertEqual([row['period'] for row in details['Endowment']], ['CY', 'CY-1', 'CY-2', 'CY-3', 'CY-4'])
+        self.assertEqual({row['part'] for row in details['RelatedOrg']}, {'IV'})
+
+        # A label is needed for each path of the union
+        header = MappingSnapshot.current().schema('2019v5.1').header
+        with self.assertRaises(ValueError):
+            ExtractionPlan(SchemaMapping('2019', header, (('Endowment', 'A/B | A/C', (('period', 'name(CY)'),)),)))
+
+    def testFlatRecords(self):
+        forms = Mapping.forms()
+        for test_file in sorted(self.TEST_DIR.glob('042103545*.txt')):
+            with open(test_file, 'r', encoding='utf-8-sig', newline='') as file:
+                root = ET.parse(file).getroot()
+            filing = FlatFiling.loads(FlatFiling.from_element(root).dumps())
+            plan = ExtractionPlan.for_schema(root.get('returnVersion'))
+            self.assertEqual(plan.extract_records(filing, forms), plan.extract_values(root, forms), test_file.name)
+            self.assertEqual(plan.extract_values(filing.element(), forms), plan.extract_values(root, forms))
+
+            # Paths left to ElementPath are evaluated on the rebuilt elements
+            mapping = plan.mapping
+            fallback = ExtractionPlan(SchemaMapping(
+                mapping.schema, ('./' + mapping.header[0],) + mapping.header[1:],
+                tuple((form, base, fields + (('first', './' + fields[0][1]),)) for form, base, fields in mapping.forms)))
+            header, details = fallback.extract_records(filing, ['BondIssue'])
+            self.assertEqual((header, details), fallback.extract_values(root, ['BondIssue']))
+            self.assertEqual(header[0], '042103545')
+            self.assertEqual([values[-1] for values in details['BondIssue']], [values[0] for values in details['BondIssue']])
+
+    def _union_all(self, tree, path, order):
+        elems = [e for p in path.split('|') for e in tree.iterfind(p.strip(), self.NAMESPACE)]
+        return sorted(elems, key=order.get)
+
+    def _union(self, tree, field, order, base_path=None):
+        if field.startswith('name('):
+            # The label listed for the path of the union the row's element ends
+            tags = [p.strip().rpartition('/')[2] for p in base_path.split('|')]
+            labels = [label.strip() for label in field[5:-1].split(',')]
+            return labels[tags.index(tree.tag.rpartition('}')[2])]
+        elems = self._union_all(tree, field, order) if field != '' else []
+        return elems[0].text if elems else None
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testMatchesFindall']
+    unittest.main()
@@ -0,0 +1,60 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import io
+import pathlib
+
+from irs990v2.parse import Parser
+from irs990v2.predicate import FilingPredicate, normalize_ein
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+    TEST_FILE_2019 = TEST_DIR.joinpath("0421035452019.txt")
+
+    def testVersion(self):
+        p = FilingPredicate(min_version='2013', max_version='2016v3.0')
+        self.assertFalse(p.accepts_version('2012v2.1'))
+        self.assertTrue(p.accepts_version('2013v3.0'))
+        self.assertTrue(p.accepts_version('2016v3.0'))
+        self.assertFalse(p.accepts_version('2016v3.1'))
+        self.assertTrue(FilingPredicate(max_version='2016').accepts_version('2016v3.1'))
+
+    def testHeader(self):
+        p = FilingPredicate(return_types=['990O'], tax_years=[2018], eins=['04-2103545'])
+        header = {'ein': '042103545', 'returntype': '990', 'taxyear': '2018'}
+        self.assertTrue(p.accepts_header(header))
+        self.assertFalse(p.accepts_header(header | {'returntype': '990EZ'}))
+        self.assertFalse(p.accepts_header(header | {'taxyear': '2017'}))
+        self.assertFalse(p.accepts_header(header | {'ein': '550307300'}))
+        self.assertTrue(p.accepts_index({'RETURN_TYPE': '990', 'EIN': '42103545'}))
+        self.assertFalse(p.accepts_index({'RETURN_TYPE': '990EO', 'EIN': '42103545'}))
+
+    def testNormalizeEin(self):
+        self.assertEqual(normalize_ein('04-2103545'), '042103545')
+        self.assertEqual(normalize_ein(' 42103545'), '042103545')
+        self.assertIsNone(normalize_ein(None))
+
+    def testParseSkipsEarly(self):
+        data = self.TEST_FILE_2019.read_bytes()
+        for streaming in [False, True]:
+            parser = Parser(streaming, FilingPredicate(return_types=['990EZ']))
+            f = io.BufferedReader(io.BytesIO(data), buffer_size=1024)
+            r = parser.parse(f, ['990', 'BondIssue'])
+            self.assertEqual(list(r['990']), [])
+            self.assertEqual(list(r['BondIssue']), [])
+            self.assertEqual(parser.skipped, 1)
+            self.assertLess(f.tell(), len(data) // 4)
+
+            parser = Parser(streaming, FilingPredicate(return_types=['990'], tax_years=['2019']))
+            r = parser.parse(io.BytesIO(data), ['990'])
+            self.assertEqual(next(r['990'])['ein'], '042103545')
+            self.assertEqual(parser.skipped, 0)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testVersion']
+    unittest.main()
@@ -0,0 +1,51 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import pathlib
+import tempfile
+
+from irs990v2.catalog import ZipCatalog
+from irs990v2.prefetch import Prefetcher
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+
+    def setUp(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.entries = list(ZipCatalog.from_dirs([self.TEST_DIR], cache_dir).members())
+
+    def _expected(self):
+        expected = list()
+        for entry in self.entries:
+            with ZipCatalog.open(entry) as f:
+                expected.append((entry.name, f.read()))
+        return expected
+
+    def testOrder(self):
+        for prefetch in (Prefetcher(), Prefetcher(depth=0), Prefetcher(depth=2, threads=1)):
+            members = [(entry.name, f.read()) for entry, f, e in prefetch.members(self.entries)]
+            self.assertEqual(members, self._expected())
+
+    def testByteCap(self):
+        # Members over the cap are opened lazily instead of being buffered
+        cap = sorted(entry.file_size for entry in self.entries)[len(self.entries) // 2]
+        prefetch = Prefetcher(depth=4, max_bytes=cap)
+        members = list()
+        for entry, f, e in prefetch.members(self.entries):
+            self.assertEqual(hasattr(f, 'getbuffer'), entry.file_size <= cap)
+            members.append((entry.name, f.read()))
+        self.assertEqual(members, self._expected())
+
+    def testError(self):
+        bad = self.entries[1]._replace(header_offset=self.entries[1].header_offset + 1)
+        results = list(Prefetcher().members([self.entries[0], bad, self.entries[2]]))
+        self.assertEqual([f is None for _, f, _ in results], [False, True, False])
+        self.assertIn('Bad local header', str(results[1][2]))
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testOrder']
+    unittest.main()
@@ -0,0 +1,104 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import os
+import pathlib
+import tempfile
+import threading
+from zipfile import ZipFile
+
+from irs990v2.parse import Parser
+from irs990v2.service import ExtractionFailed, ExtractionRequest, ExtractionService, ServiceClient, ServiceError, make_server
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+    TEST_FILE = TEST_DIR.joinpath('0421035452019.txt')
+    TEST_ZIP = TEST_DIR.joinpath('2019_TEOS_XML_CT1.zip')
+    FORMS = ['990', 'BondIssue']
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _expected(self, f):
+        return {form: list(rows) for form, rows in Parser().parse(f, self.FORMS).items()}
+
+    def _serve(self, service, address):
+        server = make_server(service, address)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(service.close)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def testHttp(self):
+        service = ExtractionService(self.FORMS, workers=0, cache_dir=self.tmp.name)
+        server = self._serve(service, ('127.0.0.1', 0))
+        client = ServiceClient(server.server_address)
+        self.addCleanup(client.close)
+
+        with open(self.TEST_FILE, 'rb') as f:
+            expected = self._expected(f)
+        self.assertEqual(client.extract(path=self.TEST_FILE), expected)
+        self.assertEqual(client.extract(xml=self.TEST_FILE.read_bytes()), expected)
+        self.assertEqual(client.extract(xml=self.TEST_FILE.read_bytes(), forms=['BondIssue']),
+                         {'BondIssue': expected['BondIssue']})
+
+        with ZipFile(self.TEST_ZIP) as archive:
+            member = archive.namelist()[1]
+            expected = self._expected(archive.open(member))
+        self.assertEqual(client.extract(archive=os.fspath(self.TEST_ZIP), member=member), expected)
+
+        with self.assertRaises(ServiceError) as e:
+            client.extract(xml=b'<Return')
+        self.assertEqual(e.exception.status, 422)
+        self.assertEqual(e.exception.body['failure']['stage'], 'parse')
+        with self.assertRaises(ServiceError) as e:
+            client.extract(archive=os.fspath(self.TEST_ZIP), member='missing_public.xml')
+        self.assertEqual(e.exception.body['failure']['stage'], 'read')
+        with self.assertRaises(ServiceError) as e:
+            client.extract(path=self.TEST_FILE, forms=['Schedule Z'])
+        self.assertEqual(e.exception.status, 400)
+
+        stats = client.stats()
+        self.assertEqual(stats['requests'], 6)
+        self.assertEqual(stats['failures'], 2)
+        self.assertIn('p99_ms', stats['latency'])
+
+    def testUnixSocket(self):
+        service = ExtractionService(self.FORMS, workers=1)
+        path = os.path.join(self.tmp.name, 'serve990.sock')
+        self._serve(service, path)
+        client = ServiceClient(path)
+        self.addCleanup(client.close)
+
+        with open(self.TEST_FILE, 'rb') as f:
+            expected = self._expected(f)
+        self.assertEqual(client.extract(path=self.TEST_FILE), expected)
+
+    def testBatching(self):
+        service = ExtractionService(self.FORMS, workers=0, batch_size=4, max_wait=1.0)
+        self.addCleanup(service.close)
+        futures = [service.submit(ExtractionRequest(tuple(self.FORMS), path=os.fspath(self.TEST_FILE))) for _ in range(8)]
+        futures.append(service.submit(ExtractionRequest(('990',), xml=b'not xml')))
+
+        rows = [future.result(10) for future in futures[:-1]]
+        self.assertTrue(all(len(r['990']) == 1 for r in rows))
+        with self.assertRaises(ExtractionFailed):
+            futures[-1].result(10)
+        # Requests wait to be batched while the one worker thread is busy
+        self.assertLess(service.stats()['batches'], 9)
+        with self.assertRaises(ValueError):
+            service.submit(ExtractionRequest(('990',)))
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testHttp']
+    unittest.main()
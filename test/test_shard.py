@@ -0,0 +1,35 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+
+from irs990v2.shard import Shard
+
+class Test(unittest.TestCase):
+
+    def testParse(self):
+        self.assertEqual(Shard.parse('2/8'), Shard(2, 8))
+        self.assertEqual(str(Shard(2, 8)), '2/8')
+        self.assertEqual(Shard(2, 8).suffix, '.2-of-8')
+        for text in ('8/8', '-1/8', '2', '2/0'):
+            with self.assertRaises(ValueError):
+                Shard.parse(text)
+
+    def testOwns(self):
+        # Every filing belongs to exactly one shard, whatever it is named by
+        shards = [Shard(i, 4) for i in range(4)]
+        counts = [0] * 4
+        for n in range(1000):
+            objectid = f'2020{n:014d}'
+            owners = [shard for shard in shards if shard.owns(objectid)]
+            self.assertEqual(len(owners), 1)
+            self.assertTrue(owners[0].owns(f'{objectid}_public.xml'))
+            self.assertTrue(owners[0].owns(f'2020/filings/{objectid}_public.xml'))
+            counts[owners[0].index] += 1
+        self.assertTrue(all(200 < count < 300 for count in counts))
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testParse']
+    unittest.main()
@@ -0,0 +1,67 @@
+'''
+Created on Oct 18, 2026
+
+@author: wlauer
+'''
+import unittest
+import os
+import pathlib
+import tempfile
+
+from irs990v2.catalog import ZipCatalog
+from irs990v2.mapping import Mapping
+from irs990v2.output import SqliteSink
+from irs990v2.parse import Parser
+from irs990v2.store import FilingStore
+
+class Test(unittest.TestCase):
+
+    TEST_DIR = pathlib.Path(__file__).parent
+    FORMS = ['990', 'BondIssue']
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmp.name, 'filings.sqlite')
+
+        base_fieldnames = ['ein', 'name', 'returntype', 'taxyear', 'taxperiodstart', 'taxperiodend']
+        sinks = {f: SqliteSink(os.path.join(self.tmp.name, f), base_fieldnames + list(Mapping.all_mappings(f)),
+                               database=self.database, table=f) for f in self.FORMS}
+        parser = Parser()
+        for year in ('2009', '2019'):
+            with open(self.TEST_DIR.joinpath(f'042103545{year}.txt'), 'r', encoding='utf-8-sig', newline='') as f:
+                filing = parser.parse(f, self.FORMS)
+            for form in self.FORMS:
+                sinks[form].write(filing[form])
+        for entry in ZipCatalog.from_dirs([self.TEST_DIR], self.tmp.name).members():
+            with ZipCatalog.open(entry) as f:
+                filing = parser.parse(f, self.FORMS)
+            for form in self.FORMS:
+                sinks[form].write(filing[form])
+        for sink in sinks.values():
+            sink.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def testFiling(self):
+        store = FilingStore(self.database)
+        self.assertEqual(store.forms, ['990', 'BondIssue'])
+
+        filing = store.filing('042103545', 2019)
+        self.assertEqual(len(filing['990']), 1)
+        self.assertEqual(filing['990'][0]['totalassets'], '5201949007')
+        self.assertEqual([row['cusip'] for row in filing['BondIssue']][:1], ['57583RL45'])
+        self.assertEqual(len(filing['BondIssue']), 5)
+
+        self.assertEqual(len(store.filing('042103545', taxperiodend='2010-05-31')['BondIssue']), 3)
+        self.assertEqual(store.filing('000000000'), {'990': [], 'BondIssue': []})
+        self.assertEqual([taxyear for taxyear, _ in store.periods('042103545')], ['2009', '2019'])
+        store.close()
+
+    def testMissing(self):
+        with self.assertRaises(FileNotFoundError):
+            FilingStore(os.path.join(self.tmp.name, 'missing.sqlite'))
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testFiling']
+    unittest.main()